@@ -0,0 +1,252 @@
+"""Stage and end-to-end benchmarks on synthetic amplicon data.
+
+Usage:
+    python -m benchmarks.run_benchmarks --scales small,medium --output results.json
+    # Record a local baseline, e.g. before a change, then compare against it
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --update-baseline
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+
+Every scale generates SAMPLES samples with benchmarks.synthetic (or reuses
+them from --data-dir) and times each stage on them, keeping the best of
+--repeat runs. Stage benchmarks run on the first sample in this process;
+end_to_end and report cover all samples. Timings only compare between runs
+on the same machine, so baselines are recorded locally where they are
+checked and never committed.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+
+import click
+import numpy as np
+
+from .synthetic import SyntheticSpec, load_primers, write_sample
+
+logger = logging.getLogger(__name__)
+
+# Read pairs per sample at each scale
+SCALES = {'small': 10000, 'medium': 100000, 'large': 1000000}
+SAMPLES = 3
+BATCH_SIZE = 50000
+# Stages faster than this are too noisy to flag as regressions
+MIN_REGRESSION_S = 0.05
+
+
+def best_of(func: Callable[[], int], repeat: int) -> Dict:
+    """Best wall time of repeat calls of func, which returns the items it processed."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = func()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'seconds': best,
+        'items': items,
+        'items_per_s': items / best if best > 0 else 0.0,
+        'runs': times
+    }
+
+
+def generate(data_dir: Path, reads: int, primers: List[str]) -> Path:
+    """Generate (once) the samples of one scale into data_dir/<reads>."""
+    directory = data_dir / str(reads)
+    for i in range(SAMPLES):
+        sample_id = f"sample{i + 1}"
+        if not (directory / f"{sample_id}_R2.fastq.gz").exists():
+            write_sample(directory, sample_id, SyntheticSpec(n_reads=reads, seed=i), primers)
+    return directory
+
+
+def _read_batches(path: Path) -> List[Tuple[List[bytes], List[bytes]]]:
+    from src.fastq_reader import FastqReader
+    return [([r.seq for r in batch], [r.qual for r in batch])
+            for batch in FastqReader(path).batches(BATCH_SIZE)]
+
+
+def run_scale(reads: int, data_dir: Path, config: Dict, repeat: int,
+              max_workers: Optional[int]) -> Dict[str, Dict]:
+    """Timings of every stage at one scale."""
+    from src.fastq_reader import FastqReader
+    from src.quality_filter import QualityFilter
+    from src.read_merger import ReadMerger
+    from src.primer_analyzer import PrimerAnalyzer
+    from src.length_analyzer import LengthAccumulator, LengthAnalyzer
+    from src.sample_summary import dimer_scan_length, histogram_length
+    from src.batch_processor import BatchProcessor
+
+    input_dir = generate(data_dir, reads, load_primers(config['primer_file']))
+    r1_path, r2_path = input_dir / 'sample1_R1.fastq.gz', input_dir / 'sample1_R2.fastq.gz'
+    r1, r2 = _read_batches(r1_path), _read_batches(r2_path)
+    timings = {}
+
+    def parse():
+        return sum(len(batch) for path in (r1_path, r2_path)
+                   for batch in FastqReader(path).batches(BATCH_SIZE))
+    timings['parse'] = best_of(parse, repeat)
+
+    quality_filter = QualityFilter(config['quality_threshold'])
+
+    def filter_pairs():
+        for (_, q1), (_, q2) in zip(r1, r2):
+            quality_filter.filter_pairs(q1, q2)
+        return reads
+    timings['quality_filter'] = best_of(filter_pairs, repeat)
+
+    merger = ReadMerger(config['merge_min_overlap'], config['merge_max_mismatch_rate'])
+
+    def merge():
+        # Every pair, not only those passing the quality filter, so the work
+        # does not depend on the quality threshold
+        for (s1, q1), (s2, q2) in zip(r1, r2):
+            for pair in zip(s1, q1, s2, q2):
+                merger.merge(*pair)
+        return reads
+    timings['merge'] = best_of(merge, repeat)
+
+    def primer_dimer():
+        # A fresh analyzer per run, so repeats do not hit the dimer cache
+        analyzer = PrimerAnalyzer(config['primer_file'], dimer_scan_length(config),
+                                  cache_size=config['dimer_cache_size'])
+        for sequences, _ in r1:
+            analyzer.detect_primer_dimers_batch(sequences)
+        return reads
+    timings['primer_dimer'] = best_of(primer_dimer, repeat)
+
+    def length_analysis():
+        accumulator = LengthAccumulator(histogram_length(config))
+        for sequences, _ in r1:
+            accumulator.update(sequences)
+        LengthAnalyzer(config['expected_length'], config['length_tolerance']).analyze_histogram(accumulator)
+        return reads
+    timings['length_analysis'] = best_of(length_analysis, repeat)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        processor = BatchProcessor(input_dir, output_dir, max_workers=max_workers,
+                                   batch_size=BATCH_SIZE, force=True)
+        samples = processor.find_sample_pairs()
+        results = []
+
+        def end_to_end():
+            results[:] = processor.process_samples(samples, config)
+            return reads * len(samples)
+        timings['end_to_end'] = best_of(end_to_end, repeat)
+        timings['report'] = best_of(lambda: _report(output_dir, results, config), repeat)
+    return timings
+
+
+def _report(output_dir: str, results: List[Dict], config: Dict) -> int:
+    from src.config import Config
+    from src.visualizer import Visualizer
+    from src.report_generator import ReportGenerator
+
+    fields = {k: v for k, v in config.items() if k != 'primer_file'}
+    plots = Visualizer.from_config(output_dir, Config(**fields)).create_visualizations(results)
+    report = ReportGenerator(output_dir)
+    report.generate_summary_csv(results)
+    report.generate_detailed_report(results, config)
+    report.generate_html_report(results, config, plots)
+    return len(results)
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Stages slower than baseline by more than tolerance (a fraction) and MIN_REGRESSION_S."""
+    regressions = []
+    for scale, stages in results['results'].items():
+        for name, timing in stages.items():
+            reference = baseline.get('results', {}).get(scale, {}).get(name)
+            if reference is None:
+                continue
+            slower = timing['seconds'] - reference['seconds']
+            if timing['seconds'] > reference['seconds'] * (1 + tolerance) and slower > MIN_REGRESSION_S:
+                regressions.append(f"{scale}/{name}: {timing['seconds']:.3f} s vs "
+                                   f"{reference['seconds']:.3f} s baseline "
+                                   f"(+{slower / reference['seconds']:.0%})")
+    return regressions
+
+
+def _meta(repeat: int, max_workers: Optional[int]) -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'max_workers': max_workers,
+        'repeat': repeat,
+        'samples': SAMPLES,
+        'batch_size': BATCH_SIZE
+    }
+
+
+def _print_table(results: Dict):
+    for scale, stages in results['results'].items():
+        click.echo(f"{scale} ({SCALES[scale]:,} read pairs x {SAMPLES} samples)")
+        for name, timing in stages.items():
+            click.echo(f"  {name:<16} {timing['seconds']:9.3f} s {timing['items_per_s']:14,.0f} items/s")
+
+
+@click.command()
+@click.option('--scales', default='small,medium', show_default=True,
+              help=f"Comma-separated scales out of {', '.join(SCALES)}")
+@click.option('--repeat', default=3, show_default=True, help='Runs per stage; the best is kept')
+@click.option('--primers', default='primers.fasta', show_default=True, help='Primer FASTA file')
+@click.option('--max-workers', type=int, default=None, help='Workers for end_to_end')
+@click.option('--data-dir', default=None, help='Keep generated data here and reuse it')
+@click.option('--output', default='benchmark_results.json', show_default=True, help='Results JSON')
+@click.option('--baseline', default=None, help='Baseline JSON to compare against')
+@click.option('--tolerance', default=0.5, show_default=True,
+              help='Allowed slowdown against the baseline, as a fraction')
+@click.option('--update-baseline', is_flag=True, help='Write the results to --baseline')
+def main(scales: str, repeat: int, primers: str, max_workers: Optional[int], data_dir: Optional[str],
+         output: str, baseline: Optional[str], tolerance: float, update_baseline: bool):
+    """Time every pipeline stage and optionally check for regressions."""
+    logging.basicConfig(level=logging.WARNING)
+    names = [s.strip() for s in scales.split(',') if s.strip()]
+    unknown = set(names) - set(SCALES)
+    if unknown:
+        raise click.BadParameter(f"unknown scales {sorted(unknown)}", param_hint='--scales')
+    if update_baseline and not baseline:
+        raise click.UsageError("--update-baseline needs --baseline")
+
+    from src.config import Config
+    config = {**vars(Config()), 'primer_file': primers}
+    results = {'meta': _meta(repeat, max_workers), 'results': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(data_dir) if data_dir else Path(tmp)
+        for name in names:
+            results['results'][name] = run_scale(SCALES[name], root, config, repeat, max_workers)
+
+    _print_table(results)
+    Path(output).write_text(json.dumps(results, indent=2))
+    if not baseline:
+        return
+    if update_baseline:
+        Path(baseline).write_text(json.dumps(results, indent=2))
+        click.echo(f"Baseline written to {baseline}")
+        return
+
+    regressions = compare(results, json.loads(Path(baseline).read_text()), tolerance)
+    if regressions:
+        click.echo("Regressions against the baseline:")
+        for line in regressions:
+            click.echo(f"  {line}")
+        sys.exit(1)
+    click.echo("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Deterministic synthetic paired-end amplicon FASTQ generator.
+
+Usage:
+    python -m benchmarks.synthetic --output-dir data/ --samples 3 --reads 100000
+"""
+from typing import Dict, List, Sequence, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+import gzip
+
+import click
+import numpy as np
+
+_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+_COMPLEMENT = bytes.maketrans(b'ACGTN', b'TGCAN')
+
+
+@dataclass
+class SyntheticSpec:
+    """What to simulate.
+
+    Each pair is either a primer dimer (forward primer directly joined to the
+    reverse-complemented reverse primer, with up to dimer_spacer random bases
+    in between) or an amplicon whose insert length is drawn from
+    length_mix, given as (length, weight) pairs. R1 reads the fragment
+    forward and R2 reads its reverse complement, both truncated to
+    read_length. Phred scores fall linearly from quality_start to quality_end
+    along the read with Gaussian noise of quality_sd, and bases are
+    substituted at the error rate their score implies.
+    """
+    n_reads: int = 10000
+    read_length: int = 250
+    length_mix: Tuple[Tuple[int, float], ...] = ((400, 0.85), (250, 0.1), (600, 0.05))
+    dimer_fraction: float = 0.05
+    dimer_spacer: int = 6
+    quality_start: float = 37.0
+    quality_end: float = 30.0
+    quality_sd: float = 3.0
+    seed: int = 0
+
+
+def load_primers(primer_file: str) -> List[str]:
+    """Primer sequences in file order, read like PrimerAnalyzer does."""
+    from Bio import SeqIO
+    return [str(record.seq) for record in SeqIO.parse(primer_file, 'fasta')]
+
+
+def reverse_complement(sequence: bytes) -> bytes:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+def generate_pairs(spec: SyntheticSpec, primers: Sequence[str]) -> Tuple[List[Tuple[bytes, bytes]],
+                                                                         List[Tuple[bytes, bytes]]]:
+    """(R1 records, R2 records) as (sequence, quality) bytes, identical for identical specs."""
+    rng = np.random.default_rng(spec.seed)
+    forward = primers[0].encode('ascii')
+    reverse_rc = reverse_complement(primers[1 % len(primers)].encode('ascii'))
+
+    lengths, weights = zip(*spec.length_mix)
+    weights = np.asarray(weights, dtype=np.float64) / sum(weights)
+    is_dimer = rng.random(spec.n_reads) < spec.dimer_fraction
+    insert_lengths = np.where(
+        is_dimer,
+        rng.integers(0, spec.dimer_spacer + 1, spec.n_reads),
+        np.asarray(lengths)[rng.choice(len(lengths), spec.n_reads, p=weights)]
+        - len(forward) - len(reverse_rc)
+    ).clip(0)
+    random_bases = _BASES[rng.integers(0, 4, int(insert_lengths.sum()))].tobytes()
+
+    fragments = []
+    offset = 0
+    for length in insert_lengths.tolist():
+        fragments.append(forward + random_bases[offset:offset + length] + reverse_rc)
+        offset += length
+
+    r1 = _sequence([fragment[:spec.read_length] for fragment in fragments], spec, rng)
+    r2 = _sequence([reverse_complement(fragment)[:spec.read_length] for fragment in fragments],
+                   spec, rng)
+    return r1, r2
+
+
+def _sequence(reads: List[bytes], spec: SyntheticSpec, rng: np.random.Generator) -> List[Tuple[bytes, bytes]]:
+    """Attach qualities to reads and introduce the substitution errors they imply."""
+    read_lengths = np.fromiter(map(len, reads), dtype=np.int64, count=len(reads))
+    starts = np.cumsum(read_lengths) - read_lengths
+    positions = np.arange(int(read_lengths.sum())) - np.repeat(starts, read_lengths)
+
+    slope = (spec.quality_end - spec.quality_start) / max(spec.read_length - 1, 1)
+    phred = spec.quality_start + slope * positions + rng.normal(0, spec.quality_sd, len(positions))
+    phred = np.rint(phred).clip(2, 41).astype(np.uint8)
+
+    bases = np.frombuffer(b''.join(reads), dtype=np.uint8).copy()
+    errors = rng.random(len(bases)) < 10 ** (-phred.astype(np.float64) / 10)
+    bases[errors] = _BASES[rng.integers(0, 4, int(errors.sum()))]
+
+    bases, quals = bases.tobytes(), (phred + 33).tobytes()
+    return [(bases[start:end], quals[start:end])
+            for start, end in zip(starts.tolist(), (starts + read_lengths).tolist())]
+
+
+def write_fastq(path: Path, records: List[Tuple[bytes, bytes]], name: str, read: int,
+                compresslevel: int = 1):
+    """Write records as FASTQ, gzipped when path ends in .gz."""
+    path = Path(path)
+    lines = b''.join(
+        b'@%s:%d %d:N:0:1\n%s\n+\n%s\n' % (name.encode(), i, read, seq, qual)
+        for i, (seq, qual) in enumerate(records)
+    )
+    if path.suffix == '.gz':
+        # mtime=0 keeps the gzip header, and so the file, deterministic
+        with open(path, 'wb') as raw, \
+                gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=compresslevel, mtime=0) as handle:
+            handle.write(lines)
+    else:
+        path.write_bytes(lines)
+
+
+def write_sample(output_dir: Path, sample_id: str, spec: SyntheticSpec, primers: Sequence[str],
+                 suffix: str = '.fastq.gz', compresslevel: int = 1) -> Dict[str, Path]:
+    """Write <sample_id>_R1/_R2 files as BatchProcessor expects them.
+
+    Random inserts compress slowly, so gzip level 1 is the default; the
+    decompression cost being benchmarked hardly depends on the level.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    r1, r2 = generate_pairs(spec, primers)
+    paths = {}
+    for read, records in ((1, r1), (2, r2)):
+        paths[f'R{read}'] = output_dir / f"{sample_id}_R{read}{suffix}"
+        write_fastq(paths[f'R{read}'], records, f"SYN:{sample_id}", read, compresslevel)
+    return paths
+
+
+@click.command()
+@click.option('--output-dir', required=True, help='Directory for the generated FASTQ files')
+@click.option('--primers', default='primers.fasta', show_default=True, help='Primer FASTA file')
+@click.option('--samples', default=3, show_default=True, help='Number of samples')
+@click.option('--reads', default=10000, show_default=True, help='Read pairs per sample')
+@click.option('--read-length', default=250, show_default=True)
+@click.option('--dimer-fraction', default=0.05, show_default=True)
+@click.option('--seed', default=0, show_default=True, help='Seed of the first sample')
+@click.option('--compresslevel', default=1, show_default=True, help='gzip compression level')
+@click.option('--plain', is_flag=True, help='Write uncompressed .fastq files')
+def main(output_dir: str, primers: str, samples: int, reads: int, read_length: int,
+         dimer_fraction: float, seed: int, compresslevel: int, plain: bool):
+    """Generate paired FASTQ files for sample1..sampleN."""
+    primer_seqs = load_primers(primers)
+    for i in range(samples):
+        spec = SyntheticSpec(n_reads=reads, read_length=read_length,
+                             dimer_fraction=dimer_fraction, seed=seed + i)
+        write_sample(Path(output_dir), f"sample{i + 1}", spec, primer_seqs,
+                     '.fastq' if plain else '.fastq.gz', compresslevel)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ setup(
     entry_points={
         'console_scripts': [
             'analyze_amplicons=src.cli:main',
+            'screen_primer_dimers=src.cli:screen_dimers',
         ],
     },
     author="Anurag Trivedi",
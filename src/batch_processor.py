@@ -1,14 +1,27 @@
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from typing import List, Dict, Tuple, Generator
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Tuple, Generator
 import logging
 from pathlib import Path
 import os
 import re
+import sys
+import time
 from dataclasses import dataclass
-import pandas as pd
-from tqdm import tqdm
-from Bio import SeqIO
-import gzip
+from collections import Counter
+import numpy as np
+
+from .fastq_reader import FastqReader, DEFAULT_BLOCK_SIZE, DEFAULT_PREFETCH_BLOCKS
+from .primer_analyzer import PrimerAnalyzer
+from .length_analyzer import LengthAccumulator
+from .dimer_pairs import DimerPairAccumulator
+from .reference_index import ReferenceIndex
+from .quality_filter import phred_stats
+from .sample_summary import SampleSummary, MAX_PHRED, quality_histogram, dimer_scan_length, histogram_length
+from .result_cache import ResultCache
+from .scheduler import SampleScheduler, compressed_size, max_batches_in_flight, split_chunk_size
+from . import progress, instrumentation
+from .progress import ThroughputMonitor, ReaderProgress
+from .instrumentation import StageRecorder
 
 
 logger = logging.getLogger(__name__)
@@ -28,11 +41,21 @@ class BatchProcessor:
                  input_dir: str, 
                  output_dir: str, 
                  max_workers: int = None,
-                 batch_size: int = 1000000):
+                 batch_size: int = 1000000,
+                 split_samples: bool = False,
+                 force: bool = False,
+                 max_memory_mb: float = None,
+                 profile_dir: str = None):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.max_workers = max_workers or os.cpu_count()
         self.batch_size = batch_size
+        self.split_samples = split_samples
+        self.force = force
+        self.max_memory_mb = max_memory_mb
+        self.profile_dir = profile_dir
+        # Run-level statistics for the detailed report, filled by process_samples
+        self.run_stats: Dict[str, Dict] = {}
         
     def find_sample_pairs(self) -> List[SamplePair]:
         """Find and validate all sample pairs in the input directory."""
@@ -61,81 +84,430 @@ class BatchProcessor:
         
         return sample_pairs
 
-    def _read_fastq(self, file_path: Path) -> Generator:
-        """Read FASTQ file and yield sequences."""
-        if str(file_path).endswith('.gz'):
-            handle = gzip.open(str(file_path), 'rt')
-        else:
-            handle = open(str(file_path), 'rt')
-            
-        try:
-            for record in SeqIO.parse(handle, 'fastq'):
-                yield str(record.seq)
-        finally:
-            handle.close()
+    def _read_fastq_batches(self, file_path: Path, config: Dict, batch_size: int = None) -> Generator:
+        """Read FASTQ file and yield (sequences, qualities) lists of at most batch_size reads.
+
+        The file is decompressed by a reader thread up to reader_prefetch_blocks
+        blocks ahead, overlapping with the analysis of the previous batches.
+        Every batch is added to the run's shared progress counters.
+        """
+        reader = FastqReader(file_path, engine=config.get('fastq_engine', 'native'),
+                             prefetch=config.get('reader_prefetch_blocks', DEFAULT_PREFETCH_BLOCKS))
+        reader_progress = ReaderProgress(reader)
+        for batch in reader.batches(batch_size or self.batch_size):
+            reader_progress.update(len(batch))
+            yield [record.seq for record in batch], [record.qual for record in batch]
+
+    def _read_fastq_chunks(self, file_path: Path, config: Dict, chunk_bytes: int) -> Generator:
+        """Read FASTQ file and yield unparsed chunks of whole records of about chunk_bytes.
+
+        Like _read_fastq_batches, but only decompressing and cutting at record
+        boundaries, so parsing is left to whoever analyses the chunk.
+        """
+        reader = FastqReader(file_path, block_size=min(DEFAULT_BLOCK_SIZE, chunk_bytes),
+                             prefetch=config.get('reader_prefetch_blocks', DEFAULT_PREFETCH_BLOCKS))
+        reader_progress = ReaderProgress(reader)
+        for text, records in reader.chunks(chunk_bytes):
+            reader_progress.update(records)
+            yield text
 
     def process_samples(self, sample_pairs: List[SamplePair], config: Dict) -> List[Dict]:
-        """Process multiple samples in parallel with progress tracking."""
+        """Process multiple samples in parallel with progress tracking.
+
+        Samples whose summary in output_dir was built from the same inputs are
+        re-evaluated from it instead of being read again, unless force is set.
+        """
         if len(sample_pairs) < 3:
             raise ValueError(f"Found only {len(sample_pairs)} valid sample pairs. Minimum 3 required.")
 
+        cache = ResultCache(self.output_dir, config.get('cache_content_hash', False))
+        results, pending = [], []
+        for pair in sample_pairs:
+            summary = None if self.force else cache.get(pair, config)
+            if summary is not None:
+                results.append(summary.result(config))
+            else:
+                pending.append(pair)
+        if results:
+            logger.info(f"Reusing cached results for {len(results)} samples, processing {len(pending)}")
+        cache.discard(pending)
+
+        if pending:
+            # Only R1 is read, so progress runs over the R1 files
+            total_bytes = sum(os.path.getsize(pair.r1_path) for pair in pending)
+            instrumentation.enable_profiling(self.profile_dir, role='main')
+            with ThroughputMonitor(total_bytes, len(pending)) as monitor, instrumentation.profiled():
+                if self.split_samples:
+                    results += self._process_samples_chunked(pending, config, cache, monitor)
+                else:
+                    results += self._process_samples_parallel(pending, config, cache, monitor)
+            instrumentation.enable_profiling(None)
+            self.run_stats['throughput'] = monitor.summary()
+            self.run_stats['performance'] = self._performance(results)
+            self._log_throughput(self.run_stats['throughput'])
+        
+        if not results:
+            raise ValueError("No samples were successfully processed")
+        return results
+
+    def _process_samples_parallel(self, sample_pairs: List[SamplePair], config: Dict,
+                                  cache: ResultCache, monitor: ThroughputMonitor) -> List[Dict]:
+        """Process one sample per worker, recording each in the cache as it completes.
+
+        Samples are submitted largest first and only while their estimated
+        memory fits in max_memory_mb (see SampleScheduler).
+        """
         results = []
-        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(self._process_single_sample, pair, config): pair
-                for pair in sample_pairs
-            }
-            
-            for future in tqdm(as_completed(futures), total=len(sample_pairs), desc="Processing samples"):
-                sample = futures[future]
+        scheduler = SampleScheduler(sample_pairs, self.max_workers, self.batch_size, self.max_memory_mb)
+        futures = {}
+        with self._executor(monitor, config) as executor:
+            while scheduler.pending or futures:
+                for pair in scheduler.admit():
+                    futures[executor.submit(self._process_single_sample, pair)] = pair
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    sample = futures.pop(future)
+                    scheduler.release(sample)
+                    monitor.sample_done()
+                    try:
+                        result = future.result()
+                        if result:  # Only append if we got valid results
+                            results.append(result)
+                            cache.put(sample, config)
+                            self._log_sample_time(result, scheduler.estimates.get(sample.sample_id))
+                    except Exception as e:
+                        logger.error(f"Error processing sample {sample.sample_id}: {str(e)}")
+        return results
+
+    def _process_samples_chunked(self, sample_pairs: List[SamplePair], config: Dict,
+                                 cache: ResultCache, monitor: ThroughputMonitor) -> List[Dict]:
+        """Process samples one at a time, spreading each sample's batches over all workers."""
+        results = []
+        sample_pairs = sorted(sample_pairs, key=compressed_size, reverse=True)
+        with self._executor(monitor, config) as executor:
+            for sample in sample_pairs:
                 try:
-                    result = future.result()
-                    if result:  # Only append if we got valid results
-                        results.append(result)
+                    results.append(self._process_sample_chunked(sample, config, executor))
+                    cache.put(sample, config)
+                    self._log_sample_time(results[-1])
                 except Exception as e:
                     logger.error(f"Error processing sample {sample.sample_id}: {str(e)}")
-        
-        if not results:
-            raise ValueError("No samples were successfully processed")
+                monitor.sample_done()
         return results
 
-    def _process_single_sample(self, sample: SamplePair, config: Dict) -> Dict:
-        """Process a single sample."""
-        total_reads = 0
-        sequences = []
+    def _executor(self, monitor: ThroughputMonitor, config: Dict) -> ProcessPoolExecutor:
+        """Worker pool whose processes report into the monitor's shared counters.
+
+        Each worker receives config, compiles the primer set and loads the
+        reference index once, in the initializer, so tasks only carry the
+        sample or batch. Loading here first lets forked workers inherit the
+        tables instead of rebuilding them, and builds a missing index once.
+        """
+        _load_worker_config(config)
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                   initargs=(monitor.counters, self.profile_dir, config))
+
+    @staticmethod
+    def _performance(results: List[Dict]) -> Dict:
+        """Stage timings summed over all processed samples, plus each sample's own.
+
+        Cached samples were not processed in this run and carry no timings.
+        """
+        stages = StageRecorder()
+        samples = {}
+        for result in results:
+            if 'performance' not in result:
+                continue
+            stages.merge(StageRecorder.from_dict(result['performance']))
+            samples[result['sample_id']] = {
+                'wall_time_s': result['wall_time_s'],
+                'peak_memory_mb': result['peak_memory_mb'],
+                'stages': result['performance']
+            }
+        return {'stages': stages.as_dict(), 'samples': samples}
+
+    def _process_sample_chunked(self, sample: SamplePair, config: Dict,
+                                executor: ProcessPoolExecutor) -> Dict:
+        """Read one sample in this process and analyse its chunks in parallel.
+
+        This process only decompresses the file and cuts it into chunks of
+        whole records; the workers parse and analyse them. At most two chunks
+        per worker are in flight, fewer if their memory would exceed
+        max_memory_mb (or SPLIT_MEMORY_MB without one), so memory stays
+        bounded while the reader keeps every worker busy. Files for the
+        biopython engine can only be split by parsing them here.
+        """
+        start = time.perf_counter()
+        tally = SampleTally.empty(config)
+        pending = set()
+        chunk_bytes, chunk_reads = split_chunk_size(sample, self.batch_size)
+        max_pending = max_batches_in_flight(chunk_bytes, self.max_workers, self.max_memory_mb)
         
-        # Read R1 file
-        for seq in self._read_fastq(sample.r1_path):
-            sequences.append(seq)
-            total_reads += 1
+        with instrumentation.recording(tally.performance):
+            if config.get('fastq_engine', 'native') == 'native':
+                tasks = ((self._analyze_chunk, text, str(sample.r1_path))
+                         for text in self._read_fastq_chunks(sample.r1_path, config, chunk_bytes))
+            else:
+                tasks = ((self._analyze_batch, sequences, quals)
+                         for sequences, quals in self._read_fastq_batches(sample.r1_path, config, chunk_reads))
+            for task, *args in tasks:
+                pending.add(executor.submit(task, *args))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        tally.merge(future.result())
             
-        # Process sequences in batches
-        primer_dimers = 0
-        short_count = 0
-        long_count = 0
-        valid_count = 0
-        
-        for seq in sequences:
-            length = len(seq)
+            for future in as_completed(pending):
+                tally.merge(future.result())
             
-            # Count primer dimers
-            if length <= config['max_dimer_length']:
-                primer_dimers += 1
-                
-            # Categorize by length
-            if length < (config['expected_length'] - config['length_tolerance']):
-                short_count += 1
-            elif length > (config['expected_length'] + config['length_tolerance']):
-                long_count += 1
-            else:
-                valid_count += 1
+            result = self._build_result(sample.sample_id, tally, config, self.output_dir)
+        result['wall_time_s'] = time.perf_counter() - start
+        return result
+
+    def _process_single_sample(self, sample: SamplePair, config: Dict = None) -> Dict:
+        """Process a single sample in one streaming pass over batch_size-read batches.
+
+        Without config, the worker's config from the pool initializer is used.
+        """
+        config = _worker_config if config is None else config
+        start = time.perf_counter()
+        tally = SampleTally.empty(config)
+        with instrumentation.profiled(), instrumentation.recording(tally.performance):
+            primer_analyzer = self._load_primer_analyzer(config)
+            reference_index = ReferenceIndex.for_config(config)
+            
+            for sequences, quals in self._read_fastq_batches(sample.r1_path, config):
+                self._count_batch(sequences, quals, config, tally, primer_analyzer, reference_index)
+            self._record_cache_stats(tally, primer_analyzer)
+            tally.peak_memory_mb = _peak_rss_mb()
+            
+            result = self._build_result(sample.sample_id, tally, config, self.output_dir)
+        result['wall_time_s'] = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _log_throughput(stats: Dict):
+        logger.info(f"Processed {stats['reads']:,} reads in {stats['elapsed_s']:.1f} s: "
+                    f"{stats['reads_per_s']:,.0f} reads/s, "
+                    f"{stats['bytes_per_s'] / 1e6:,.1f} MB/s decompressed, "
+                    f"{stats['compressed_bytes_per_s'] / 1e6:,.1f} MB/s compressed")
+
+    @staticmethod
+    def _log_sample_time(result: Dict, estimated_memory_mb: float = None):
+        estimate = f", estimated {estimated_memory_mb:.0f} MB" if estimated_memory_mb is not None else ""
+        logger.info(f"Sample {result['sample_id']}: {result['wall_time_s']:.1f} s, "
+                    f"worker peak RSS {result['peak_memory_mb']:.0f} MB{estimate}")
+
+    @staticmethod
+    def _load_primer_analyzer(config: Dict):
+        """PrimerAnalyzer for the configured primer file, or None for length-only dimer calls.
+
+        Analyzers are cheap: the compiled primer set is shared within the process.
+        """
+        if not config.get('primer_file'):
+            return None
+        return PrimerAnalyzer(config['primer_file'], dimer_scan_length(config),
+                              cache_size=config.get('dimer_cache_size', 100000))
+
+    @staticmethod
+    def _record_cache_stats(tally: 'SampleTally', primer_analyzer: PrimerAnalyzer,
+                            since: Tuple[int, int] = (0, 0)):
+        """Record the analyzer's dimer cache hits and misses since the (hits, misses) of since."""
+        if primer_analyzer is not None:
+            tally.counts['dimer_cache_hits'] = primer_analyzer.cache_hits - since[0]
+            tally.counts['dimer_cache_misses'] = primer_analyzer.cache_misses - since[1]
+
+    @staticmethod
+    def _count_batch(sequences: List[bytes], quals: List[bytes], config: Dict,
+                     tally: 'SampleTally', primer_analyzer: PrimerAnalyzer = None,
+                     reference_index: ReferenceIndex = None):
+        """Add the lengths, qualities, dimer candidates and reference targets of one batch to tally.
+
+        Dimer candidates are collected for all reads up to the dimer scan length
+        so that max_dimer_length can be re-evaluated later. Without a primer
+        analyzer every such read is a candidate. With a reference index every
+        read is assigned to a target or counted as unmapped. With
+        config['dereplicate'] each unique sequence in the batch is analysed
+        once and weighted by its count.
+        """
+        tally.counts['total_reads'] += len(sequences)
+        with instrumentation.stage('quality_stats', items=len(quals)):
+            min_quality, quality_sum, read_lengths = phred_stats(quals)
+            tally.min_quality += quality_histogram(min_quality)
+            tally.mean_quality += quality_histogram(quality_sum // np.maximum(read_lengths, 1))
+        
+        weights = None
+        if config.get('dereplicate'):
+            with instrumentation.stage('dereplicate', items=len(sequences)):
+                unique = Counter(sequences)
+                sequences = list(unique)
+                weights = np.fromiter(unique.values(), dtype=np.int64, count=len(sequences))
+        tally.lengths.update(sequences, weights)
         
-        return {
-            'sample_id': sample.sample_id,
-            'total_reads': total_reads,
-            'primer_dimer_count': primer_dimers,
-            'primer_dimer_percentage': (primer_dimers / total_reads * 100) if total_reads > 0 else 0,
-            'short_offtarget_count': short_count,
-            'long_offtarget_count': long_count,
-            'valid_amplicon_count': valid_count
-        }
\ No newline at end of file
+        if reference_index is not None:
+            with instrumentation.stage('reference_mapping', items=len(sequences)):
+                targets = reference_index.classify_batch(sequences, config.get('reference_min_hits', 3))
+            # Slot 0 counts unmapped reads
+            tally.target_counts += np.bincount(targets + 1, weights=weights,
+                                               minlength=len(tally.target_counts)).astype(np.int64)
+        
+        # Collect primer-dimer candidates, attributed to primer pairs when verified
+        if primer_analyzer is not None:
+            pairs = primer_analyzer.primer_dimer_pairs_batch(sequences)
+            dimers = pairs[:, 0] >= 0
+        else:
+            dimers = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences)) \
+                <= tally.dimer_lengths.max_length
+        candidates = [seq for seq, is_dimer in zip(sequences, dimers) if is_dimer]
+        candidate_weights = None if weights is None else weights[dimers]
+        tally.dimer_lengths.update(candidates, candidate_weights)
+        if primer_analyzer is not None:
+            tally.dimer_pairs.update(pairs[dimers],
+                                     np.fromiter(map(len, candidates), dtype=np.int64, count=len(candidates)),
+                                     candidate_weights)
+
+    @staticmethod
+    def _analyze_chunk(text: bytes, path: str, config: Dict = None) -> 'SampleTally':
+        """Parse and count one chunk of FASTQ text from path; the worker task in chunked mode."""
+        config = _worker_config if config is None else config
+        tally = SampleTally.empty(config)
+        with instrumentation.profiled(), instrumentation.recording(tally.performance):
+            records = FastqReader(path).parse(text)
+        sequences, quals = [record.seq for record in records], [record.qual for record in records]
+        del records, text
+        return BatchProcessor._analyze_batch(sequences, quals, config, tally)
+
+    @staticmethod
+    def _analyze_batch(sequences: List[bytes], quals: List[bytes], config: Dict = None,
+                       tally: 'SampleTally' = None) -> 'SampleTally':
+        """Count one batch from scratch; used as the worker task in chunked mode.
+
+        Without config, the worker's config from the pool initializer is used,
+        along with the worker's primer analyzer, so its dimer cache carries
+        over from one batch to the next.
+        """
+        config = _worker_config if config is None else config
+        tally = SampleTally.empty(config) if tally is None else tally
+        with instrumentation.profiled(), instrumentation.recording(tally.performance):
+            primer_analyzer = _worker_analyzer if config is _worker_config \
+                else BatchProcessor._load_primer_analyzer(config)
+            since = (primer_analyzer.cache_hits, primer_analyzer.cache_misses) if primer_analyzer else (0, 0)
+            BatchProcessor._count_batch(sequences, quals, config, tally, primer_analyzer,
+                                        ReferenceIndex.for_config(config))
+            BatchProcessor._record_cache_stats(tally, primer_analyzer, since)
+        tally.peak_memory_mb = _peak_rss_mb()
+        return tally
+
+    @staticmethod
+    def _build_result(sample_id: str, tally: 'SampleTally', config: Dict,
+                      output_dir: Path = None) -> Dict:
+        """Derive the result metrics from the sample summary, saving it to output_dir."""
+        with tally.performance.stage('summary'):
+            reference_index = ReferenceIndex.for_config(config)
+            summary = SampleSummary(
+                sample_id=sample_id,
+                total_reads=tally.counts['total_reads'],
+                length_histogram=tally.lengths.histogram,
+                min_quality_histogram=tally.min_quality,
+                mean_quality_histogram=tally.mean_quality,
+                dimer_length_histogram=tally.dimer_lengths.histogram,
+                dimer_scan_length=tally.dimer_lengths.max_length,
+                primer_verified=bool(config.get('primer_file')),
+                primer_names=PrimerAnalyzer.compile_primers(config['primer_file']).names
+                if config.get('primer_file') else [],
+                dimer_pairs=tally.dimer_pairs.as_array(),
+                target_names=reference_index.names if reference_index else [],
+                target_amplicon=reference_index.amplicon if reference_index else np.zeros(0, dtype=bool),
+                target_counts=tally.target_counts[1:]
+            )
+            if output_dir is not None:
+                summary.save(output_dir)
+            result = summary.result(config)
+        
+        result['peak_memory_mb'] = tally.peak_memory_mb
+        result['performance'] = tally.performance.as_dict()
+        if 'dimer_cache_hits' in tally.counts:
+            result['dimer_cache_hits'] = tally.counts['dimer_cache_hits']
+            result['dimer_cache_misses'] = tally.counts['dimer_cache_misses']
+        return result
+
+
+@dataclass
+class SampleTally:
+    """Mergeable per-sample state built up batch by batch.
+
+    Memory is O(histogram_length + reference targets) per sample,
+    independent of read count.
+    """
+    counts: Dict[str, int]
+    lengths: LengthAccumulator
+    min_quality: np.ndarray
+    mean_quality: np.ndarray
+    dimer_lengths: LengthAccumulator
+    dimer_pairs: DimerPairAccumulator
+    target_counts: np.ndarray
+    performance: StageRecorder
+    # Highest peak RSS of the processes that analysed the sample
+    peak_memory_mb: float = 0.0
+    
+    @classmethod
+    def empty(cls, config: Dict) -> 'SampleTally':
+        reference_index = ReferenceIndex.for_config(config)
+        return cls(
+            counts={'total_reads': 0},
+            lengths=LengthAccumulator(histogram_length(config)),
+            min_quality=np.zeros(MAX_PHRED + 1, dtype=np.int64),
+            mean_quality=np.zeros(MAX_PHRED + 1, dtype=np.int64),
+            dimer_lengths=LengthAccumulator(dimer_scan_length(config)),
+            dimer_pairs=DimerPairAccumulator(),
+            # Unmapped reads, then reads per reference target
+            target_counts=np.zeros(len(reference_index.names) + 1 if reference_index else 1, dtype=np.int64),
+            performance=StageRecorder()
+        )
+    
+    def merge(self, other: 'SampleTally') -> 'SampleTally':
+        for key, value in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+        self.lengths.merge(other.lengths)
+        self.min_quality += other.min_quality
+        self.mean_quality += other.mean_quality
+        self.dimer_lengths.merge(other.dimer_lengths)
+        self.dimer_pairs.merge(other.dimer_pairs)
+        self.target_counts += other.target_counts
+        self.performance.merge(other.performance)
+        self.peak_memory_mb = max(self.peak_memory_mb, other.peak_memory_mb)
+        return self
+
+
+# Config of the run in a worker process and the primer analyzer its batches
+# share, set by the pool initializer
+_worker_config: Optional[Dict] = None
+_worker_analyzer: Optional[PrimerAnalyzer] = None
+
+
+def _load_worker_config(config: Dict):
+    """Keep config and its primer analyzer for the tasks of this process and load its reference index."""
+    global _worker_config, _worker_analyzer
+    _worker_config = config
+    _worker_analyzer = BatchProcessor._load_primer_analyzer(config)
+    ReferenceIndex.for_config(config)
+
+
+def _init_worker(counters, profile_dir: str = None, config: Dict = None):
+    """Pool initializer: shared progress counters, optional per-worker cProfile and the run config."""
+    progress.attach(counters)
+    instrumentation.enable_profiling(profile_dir)
+    if config is not None:
+        _load_worker_config(config)
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB (0 where unavailable)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -1,53 +1,84 @@
 # src/cli.py
 import click
+import csv
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Iterable, Iterator, Tuple
 import sys
 
 from .config import Config
 from .fastq_processor import FastqProcessor
 from .primer_analyzer import PrimerAnalyzer
-from .length_analyzer import LengthAnalyzer
-from .visualizer import Visualizer
-from .report_generator import ReportGenerator
+from .length_analyzer import LengthAnalyzer, LengthAccumulator
+from .dimer_pairs import DimerPairAccumulator
+from .dimer_screen import SCREEN_CACHE_DIR, load_observed_pairs, screen_primers
+from .dereplicator import Dereplicator
+from .read_merger import ReadMerger
 from .batch_processor import BatchProcessor
+from .sample_summary import SampleSummary, SUMMARY_DIR, histogram_length
+from . import instrumentation
+# Visualizer and ReportGenerator pull in matplotlib, seaborn and pandas; they
+# are imported where reports are generated so --help and workers stay light.
+
+PROFILE_DIR = 'profiles'
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AmpliconAnalyzer:
+    DIMER_BATCH_SIZE = 100000
+
     def __init__(self, config: Config, output_dir: str):
+        from .visualizer import Visualizer
+        from .report_generator import ReportGenerator
         self.config = config
         self.output_dir = output_dir
-        self.visualizer = Visualizer(output_dir)
+        self.visualizer = Visualizer.from_config(output_dir, config)
         self.report_generator = ReportGenerator(output_dir)
         
     def analyze_sample(self, r1_path: str, r2_path: str, primer_file: str) -> dict:
-        fastq_proc = FastqProcessor(r1_path, r2_path, self.config.quality_threshold)
-        primer_anal = PrimerAnalyzer(primer_file, self.config.max_dimer_length)
+        merger = ReadMerger(self.config.merge_min_overlap, self.config.merge_max_mismatch_rate)
+        fastq_proc = FastqProcessor(r1_path, r2_path, self.config.quality_threshold,
+                                    engine=self.config.fastq_engine, merger=merger,
+                                    prefetch=self.config.reader_prefetch_blocks)
+        primer_anal = PrimerAnalyzer(primer_file, self.config.max_dimer_length,
+                                     cache_size=self.config.dimer_cache_size)
         length_anal = LengthAnalyzer(self.config.expected_length, self.config.length_tolerance)
         
         if not fastq_proc.validate_files():
             raise ValueError("Invalid FASTQ files")
+        
+        # Each unique sequence is analysed once and weighted by its count
+        dereplicator = None
+        reads = ((seq, 1) for seq, quality in fastq_proc.process_reads())
+        if self.config.dereplicate:
+            dereplicator = Dereplicator(self.config.dereplication_memory_mb)
+            dereplicator.update(seq for seq, quality in fastq_proc.process_reads())
+            reads = dereplicator.items()
             
-        sequences = []
-        lengths = []
-        primer_dimers = 0
+        lengths = LengthAccumulator(histogram_length(vars(self.config)))
+        dimer_pairs = DimerPairAccumulator()
         
-        for seq, quality in fastq_proc.process_reads():
-            sequences.append(seq)
-            lengths.append(len(seq))
-            if primer_anal.detect_primer_dimers(seq):
-                primer_dimers += 1
-                
-        length_dist = length_anal.analyze_distribution(sequences)
+        try:
+            for batch in _batched(reads, self.DIMER_BATCH_SIZE):
+                sequences, counts = zip(*batch)
+                pairs = primer_anal.primer_dimer_pairs_batch(sequences)
+                dimer_mask = pairs[:, 0] >= 0
+                dimer_pairs.update(pairs[dimer_mask],
+                                   [len(seq) for seq, is_dimer in zip(sequences, dimer_mask) if is_dimer],
+                                   [count for count, is_dimer in zip(counts, dimer_mask) if is_dimer])
+                lengths.update(sequences, counts)
+        finally:
+            if dereplicator is not None:
+                dereplicator.close()
         
+        length_dist = length_anal.analyze_histogram(lengths)
         sample_id = Path(r1_path).stem.split('_')[0]
-        total_reads = len(sequences)
+        total_reads = lengths.total
+        primer_dimers = dimer_pairs.total
         
         self.visualizer.plot_length_distribution(
-            lengths, sample_id, self.config.max_dimer_length,
+            lengths.histogram, sample_id, self.config.max_dimer_length,
             self.config.expected_length, self.config.length_tolerance
         )
         
@@ -58,55 +89,149 @@ class AmpliconAnalyzer:
             'primer_dimer_percentage': (primer_dimers / total_reads) * 100,
             'short_offtarget_count': length_dist.get('short', 0),
             'long_offtarget_count': length_dist.get('long', 0),
-            'valid_amplicon_count': length_dist.get('valid', 0)
+            'valid_amplicon_count': length_dist.get('valid', 0),
+            'merged_pairs': fastq_proc.merge_stats['merged_pairs'],
+            'unmerged_pairs': fastq_proc.merge_stats['unmerged_pairs'],
+            'dimer_cache_hits': primer_anal.cache_hits,
+            'dimer_cache_misses': primer_anal.cache_misses,
+            'histograms': {'length': lengths.histogram},
+            'dimer_pairs': {**dimer_pairs.matrix(), 'primers': primer_anal.primer_names}
         }
 
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_batch(input_dir: str, output: str, max_workers: int, batch_size: int,
+              split_samples: bool, config_dict: Dict, force: bool = False,
+              max_memory: float = None, profile: bool = False) -> Tuple[List[Dict], Dict]:
+    """Analyse all sample pairs in input_dir; sample summaries are written to output.
+
+    Samples already summarised in output from the same inputs are reused unless
+    force is set. Returns the per-sample results and the run statistics
+    (throughput, performance) for the detailed report. With profile, every
+    process dumps cProfile stats to <output>/profiles/.
+    """
+    # Initialize batch processor
+    processor = BatchProcessor(
+        input_dir=input_dir,
+        output_dir=output,
+        max_workers=max_workers,
+        batch_size=batch_size,
+        split_samples=split_samples,
+        force=force,
+        max_memory_mb=max_memory,
+        profile_dir=str(Path(output) / PROFILE_DIR) if profile else None
+    )
+    
+    # Find and validate sample pairs
+    logger.info("Scanning for sample pairs...")
+    sample_pairs = processor.find_sample_pairs()
+    logger.info(f"Found {len(sample_pairs)} valid sample pairs")
+    
+    # Process samples
+    results = processor.process_samples(sample_pairs, config_dict)
+    return results, processor.run_stats
+
+
+def reevaluate_summaries(output: str, config_dict: Dict) -> List[Dict]:
+    """Recompute per-sample metrics for config_dict from saved sample summaries.
+
+    Samples whose summary cannot be re-evaluated for config_dict, such as a
+    valid range beyond their length histogram, are logged and left out.
+    """
+    summaries = SampleSummary.load_all(output)
+    if not summaries:
+        raise ValueError(f"No sample summaries found in {Path(output) / SUMMARY_DIR}")
+    logger.info(f"Re-evaluating {len(summaries)} sample summaries")
+    results = []
+    for summary in summaries:
+        try:
+            results.append(summary.result(config_dict))
+        except ValueError as e:
+            logger.error(f"Error re-evaluating sample {summary.sample_id}: {str(e)}")
+    return results
+
+
 @click.command()
-@click.option('--input-dir', required=True, help='Directory containing FASTQ files')
-@click.option('--primers', required=True, help='Primer FASTA file')
+@click.option('--input-dir', help='Directory containing FASTQ files')
+@click.option('--primers', help='Primer FASTA file')
 @click.option('--config', required=True, help='Configuration file')
 @click.option('--output', required=True, help='Output directory')
 @click.option('--max-workers', type=int, help='Maximum number of parallel processes')
 @click.option('--batch-size', type=int, default=1000000, help='Number of reads to process in each batch')
-def main(input_dir: str, primers: str, config: str, output: str, max_workers: int, batch_size: int):
+@click.option('--max-memory', type=float,
+              help='Memory budget in MB; limits how many samples are processed at once')
+@click.option('--split-samples', is_flag=True,
+              help='Process samples one at a time, splitting each FASTQ pair across all workers')
+@click.option('--reference',
+              help='FASTA of the expected amplicons; reads are mapped to them (overrides config)')
+@click.option('--genome-reference',
+              help='FASTA of larger genome regions that off-target reads are mapped to (overrides config)')
+@click.option('--fastq-engine', type=click.Choice(['native', 'biopython']),
+              help='FASTQ parser (overrides config; use biopython for malformed or wrapped files)')
+@click.option('--reevaluate', is_flag=True,
+              help='Recompute metrics for a new config from the sample summaries in --output '
+                   'instead of re-reading FASTQ files; the valid range must lie within the '
+                   'length histogram of the original run (see histogram_max_length)')
+@click.option('--force', is_flag=True,
+              help='Reprocess all samples, ignoring cached results in --output')
+@click.option('--profile', is_flag=True,
+              help='Write cProfile stats of the main process and every worker to --output/profiles')
+def main(input_dir: str, primers: str, config: str, output: str, max_workers: int, batch_size: int,
+         max_memory: float, split_samples: bool, reference: str, genome_reference: str,
+         fastq_engine: str, reevaluate: bool, force: bool, profile: bool):
     """Process multiple samples with parallel processing and memory optimization."""
+    if not reevaluate and not (input_dir and primers):
+        raise click.UsageError("--input-dir and --primers are required unless --reevaluate is given")
+    
     try:
         # Load configuration
         config_data = Config.from_file(config)
+        if fastq_engine:
+            config_data.fastq_engine = fastq_engine
+        if reference:
+            config_data.reference_file = reference
+        if genome_reference:
+            config_data.genome_reference_file = genome_reference
         config_dict = {
             **vars(config_data),
             'primer_file': primers
         }
         
-        # Initialize batch processor
-        processor = BatchProcessor(
-            input_dir=input_dir,
-            output_dir=output,
-            max_workers=max_workers,
-            batch_size=batch_size
-        )
-        
-        # Find and validate sample pairs
-        logger.info("Scanning for sample pairs...")
-        sample_pairs = processor.find_sample_pairs()
-        logger.info(f"Found {len(sample_pairs)} valid sample pairs")
-        
-        # Process samples
-        results = processor.process_samples(sample_pairs, config_dict)
+        run_stats = {}
+        if reevaluate:
+            results = reevaluate_summaries(output, config_dict)
+        else:
+            results, run_stats = run_batch(input_dir, output, max_workers, batch_size, split_samples,
+                                           config_dict, force, max_memory, profile)
         
         if results:
             # Generate reports
             logger.info("Generating reports...")
-            visualizer = Visualizer(output)
+            from .visualizer import Visualizer
+            from .report_generator import ReportGenerator
+            visualizer = Visualizer.from_config(output, config_data)
             report_gen = ReportGenerator(output)
             
             # Create visualizations
-            visualizer.create_visualizations(results)
+            plots = visualizer.create_visualizations(results)
             
             # Generate reports
             report_gen.generate_summary_csv(results)
-            report_gen.generate_detailed_report(results, config_dict)
-            report_gen.generate_html_report(results, config_dict)
+            report_gen.generate_dimer_pair_report(results)
+            report_gen.generate_target_report(results)
+            # Stages timed in this process so far: plots and CSV reports
+            run_stats.setdefault('performance', {})['main_process'] = instrumentation.active().as_dict()
+            report_gen.generate_detailed_report(results, config_dict, run_stats)
+            report_gen.generate_html_report(results, config_dict, plots)
             
             logger.info(f"Successfully processed {len(results)} samples")
         else:
@@ -116,6 +241,49 @@ def main(input_dir: str, primers: str, config: str, output: str, max_workers: in
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         sys.exit(1)
+
+
+@click.command()
+@click.option('--primers', required=True, help='Primer FASTA file')
+@click.option('--output', required=True, help='Output directory')
+@click.option('--observed',
+              help='dimer_pairs.csv of an analysis run, or its output directory, to cross-reference')
+@click.option('--min-three-prime', type=int, default=4, show_default=True,
+              help="Shortest 3'-anchored complementary run for a pair to be reported")
+@click.option('--no-cache', is_flag=True,
+              help='Recompute the screen even if this primer set was screened into --output before')
+def screen_dimers(primers: str, output: str, observed: str, min_three_prime: int, no_cache: bool):
+    """Predict which primer pairs of a primer set are likely to form dimers."""
+    try:
+        primer_seqs = PrimerAnalyzer.compile_primers(primers).primers
+        cache_dir = None if no_cache else Path(output) / SCREEN_CACHE_DIR
+        screen = screen_primers(primer_seqs, cache_dir)
+        
+        observed_pairs = None
+        if observed:
+            observed_path = Path(observed)
+            if observed_path.is_dir():
+                observed_path = observed_path / 'dimer_pairs.csv'
+            observed_pairs = load_observed_pairs(observed_path)
+        rows = screen.table(min_three_prime, observed_pairs)
+        
+        output_path = Path(output) / 'dimer_screen.csv'
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        fields = ['primer_a', 'primer_b', 'three_prime_run', 'complementary_bases']
+        if observed_pairs is not None:
+            fields.append('observed_dimer_reads')
+        with open(output_path, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
         
+        n = len(primer_seqs)
+        logger.info(f"{sum(row['three_prime_run'] >= min_three_prime for row in rows)} of "
+                    f"{n * (n + 1) // 2} primer pairs have a 3' complementary run of at least "
+                    f"{min_three_prime} bases; written to {output_path}")
+    except Exception as e:
+        logger.error(f"Dimer screen failed: {str(e)}")
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
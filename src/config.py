@@ -1,14 +1,33 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Optional
 import json
-import yaml
 
 @dataclass
 class Config:
     max_dimer_length: int = 100
+    dimer_scan_length: Optional[int] = None
     length_tolerance: int = 50
     quality_threshold: int = 30
     expected_length: int = 400
+    histogram_max_length: int = 1000
+    fastq_engine: str = 'native'
+    reader_prefetch_blocks: int = 4
+    dimer_cache_size: int = 100000
+    dereplicate: bool = False
+    dereplication_memory_mb: int = 1024
+    merge_min_overlap: int = 10
+    merge_max_mismatch_rate: float = 0.1
+    cache_content_hash: bool = False
+    reference_file: Optional[str] = None
+    genome_reference_file: Optional[str] = None
+    reference_index: Optional[str] = None
+    reference_kmer: int = 15
+    reference_window: int = 10
+    reference_min_hits: int = 3
+    plot_format: str = 'png'
+    plot_dpi: int = 300
+    plot_grid_page_size: int = 24
+    plot_workers: Optional[int] = None
     
     @classmethod
     def from_file(cls, path: str) -> 'Config':
@@ -16,6 +35,7 @@ class Config:
             with open(path) as f:
                 data = json.load(f)
         elif path.endswith('.yaml') or path.endswith('.yml'):
+            import yaml
             with open(path) as f:
                 data = yaml.safe_load(f)
         else:
@@ -0,0 +1,114 @@
+from typing import Iterable, Iterator, List, Tuple, Union
+from collections import Counter
+from pathlib import Path
+import heapq
+import logging
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry cost of a dict slot plus str object header, in bytes
+ENTRY_OVERHEAD = 120
+
+
+class Dereplicator:
+    """Collapse a stream of reads into a unique sequence -> count table.
+
+    When the in-memory table exceeds memory_limit_mb it is written to disk as
+    a sorted run and cleared; items() then merges the runs back into one
+    sorted stream of (sequence, count) pairs. Sequences may be str or bytes,
+    and come back as the type they were given as.
+    """
+
+    def __init__(self, memory_limit_mb: float = 1024, spill_dir: str = None):
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self.counts: Counter = Counter()
+        self.total_reads = 0
+        self._estimated_bytes = 0
+        self._runs: List[Path] = []
+        self._tmpdir: Path = None
+        # Whether spilled sequences were str, to decode them when merging
+        self._text = False
+
+    def __enter__(self) -> 'Dereplicator':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, sequences: Iterable[str], chunk_size: int = 100000):
+        chunk = []
+        for sequence in sequences:
+            chunk.append(sequence)
+            if len(chunk) >= chunk_size:
+                self._add_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._add_chunk(chunk)
+
+    def _add_chunk(self, chunk: List[str]):
+        before = len(self.counts)
+        self.counts.update(chunk)
+        self.total_reads += len(chunk)
+        new_entries = len(self.counts) - before
+        average_length = sum(map(len, chunk)) / len(chunk)
+        self._estimated_bytes += int(new_entries * (average_length + ENTRY_OVERHEAD))
+        if self._estimated_bytes > self.memory_limit:
+            self._spill()
+
+    def _spill(self):
+        if self._tmpdir is None:
+            self._tmpdir = Path(tempfile.mkdtemp(prefix='derep_', dir=self.spill_dir))
+        path = self._tmpdir / f"run_{len(self._runs):04d}.tsv"
+        # Runs are written as ASCII bytes, which sort like the str sequences
+        with open(path, 'wb') as handle:
+            for sequence in sorted(self.counts):
+                self._text = isinstance(sequence, str)
+                encoded = sequence.encode('ascii') if self._text else sequence
+                handle.write(b"%s\t%d\n" % (encoded, self.counts[sequence]))
+        logger.debug(f"Spilled {len(self.counts)} unique sequences to {path}")
+        self._runs.append(path)
+        self.counts = Counter()
+        self._estimated_bytes = 0
+
+    @property
+    def unique_count(self) -> int:
+        """Number of unique sequences; only exact while nothing has been spilled."""
+        return len(self.counts)
+
+    def items(self) -> Iterator[Tuple[Union[str, bytes], int]]:
+        """Yield (sequence, count) pairs, each sequence exactly once."""
+        if not self._runs:
+            yield from self.counts.items()
+            return
+
+        if self.counts:
+            self._spill()
+        handles = [open(path, 'rb') for path in self._runs]
+        decode = bytes.decode if self._text else None
+        try:
+            current, total = None, 0
+            for sequence, count in heapq.merge(*(map(_parse_run_line, h) for h in handles)):
+                if sequence != current:
+                    if current is not None:
+                        yield decode(current) if decode else current, total
+                    current, total = sequence, 0
+                total += count
+            if current is not None:
+                yield decode(current) if decode else current, total
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def close(self):
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        self._runs = []
+
+
+def _parse_run_line(line: bytes) -> Tuple[bytes, int]:
+    sequence, count = line.rstrip(b'\n').split(b'\t')
+    return sequence, int(count)
@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# Bit layout of a packed (forward primer, reverse primer, read length) key
+_LENGTH_BITS = 20
+_PRIMER_BITS = 21
+_LENGTH_MASK = (1 << _LENGTH_BITS) - 1
+_PRIMER_MASK = (1 << _PRIMER_BITS) - 1
+
+
+class DimerPairAccumulator:
+    """Sparse counts of primer-dimer reads per (forward primer, reverse primer, read length).
+
+    Only combinations that occur are stored, as sorted packed int64 keys with
+    their counts, so memory follows the number of distinct observed pairs
+    rather than the square of the panel size. Like LengthAccumulator it is
+    updated batch by batch and merged across workers; keeping the read length
+    lets the matrix be re-evaluated for any max_dimer_length.
+    """
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, pairs: np.ndarray, lengths: np.ndarray, counts: Sequence[int] = None):
+        """Add dimer reads given as (forward, reverse) primer indices and read lengths."""
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        if not len(pairs):
+            return
+        keys = (pairs[:, 0] << (_PRIMER_BITS + _LENGTH_BITS)) | (pairs[:, 1] << _LENGTH_BITS) \
+            | np.asarray(lengths, dtype=np.int64)
+        weights = np.ones(len(keys), dtype=np.int64) if counts is None \
+            else np.asarray(counts, dtype=np.int64)
+        self._add(keys, weights)
+
+    def merge(self, other: 'DimerPairAccumulator') -> 'DimerPairAccumulator':
+        self._add(other.keys, other.counts)
+        return self
+
+    def _add(self, keys: np.ndarray, counts: np.ndarray):
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(keys)).astype(np.int64)
+        self.keys = keys
+
+    def as_array(self) -> np.ndarray:
+        """(forward, reverse, length, count) rows, the form stored in sample summaries."""
+        return np.column_stack([
+            self.keys >> (_PRIMER_BITS + _LENGTH_BITS),
+            (self.keys >> _LENGTH_BITS) & _PRIMER_MASK,
+            self.keys & _LENGTH_MASK,
+            self.counts
+        ]).astype(np.int64).reshape(-1, 4)
+
+    @classmethod
+    def from_array(cls, rows: np.ndarray) -> 'DimerPairAccumulator':
+        accumulator = cls()
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1, 4)
+        accumulator.update(rows[:, :2], rows[:, 2], rows[:, 3])
+        return accumulator
+
+    def matrix(self, max_length: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Sparse primer x primer counts over dimer reads up to max_length, in COO form."""
+        rows = self.as_array()
+        if max_length is not None:
+            rows = rows[rows[:, 2] <= max_length]
+        pair_keys, inverse = np.unique(rows[:, 0] * (_PRIMER_MASK + 1) + rows[:, 1], return_inverse=True)
+        counts = np.bincount(inverse, weights=rows[:, 3], minlength=len(pair_keys)).astype(np.int64)
+        return {
+            'forward': pair_keys // (_PRIMER_MASK + 1),
+            'reverse': pair_keys % (_PRIMER_MASK + 1),
+            'count': counts
+        }
+
+
+def dimer_pair_table(results: List[Dict]) -> List[Dict]:
+    """Long-format rows (sample, forward primer, reverse primer, count) of all samples' pair matrices."""
+    rows = []
+    for result in results:
+        pairs = result.get('dimer_pairs')
+        if not pairs:
+            continue
+        names = pairs['primers']
+        for forward, reverse, count in zip(pairs['forward'].tolist(), pairs['reverse'].tolist(),
+                                           pairs['count'].tolist()):
+            rows.append({
+                'sample_id': result['sample_id'],
+                'forward_primer': names[forward],
+                'reverse_primer': names[reverse],
+                'count': count
+            })
+    return rows
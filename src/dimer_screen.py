@@ -0,0 +1,188 @@
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+import csv
+import hashlib
+import json
+import logging
+import numpy as np
+
+from .primer_matcher import reverse_complement
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Bump when the scores computed for a primer set change
+SCREEN_VERSION = 1
+SCREEN_CACHE_DIR = 'dimer_screen'
+# Primers are held as one uint64 bitmask per base; longer primers are
+# screened on their 3'-most MAX_SCREEN_LENGTH bases
+MAX_SCREEN_LENGTH = 64
+# Primer pairs per vectorised block
+_BLOCK_SIZE = 1 << 20
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+@dataclass
+class DimerScreen:
+    """Predicted dimerization scores of every pair of primers in a set.
+
+    Both scores come from ungapped antiparallel alignments of one primer
+    against the other at every offset, counting only A-T and C-G pairs.
+    three_prime[i, j] is the longest complementary run that includes the
+    3'-terminal base of primer i or primer j: a duplex a polymerase can
+    extend. complementarity[i, j] is the most complementary bases at any
+    single offset. Both matrices are symmetric and include self-dimers on
+    the diagonal.
+    """
+    names: List[str]
+    three_prime: np.ndarray
+    complementarity: np.ndarray
+
+    @classmethod
+    @instrumentation.timed('dimer_screen')
+    def compute(cls, primers: Dict[str, str]) -> 'DimerScreen':
+        names = list(primers)
+        sequences = [_screened_sequence(name, seq) for name, seq in primers.items()]
+        forward = _base_masks(sequences)
+        reverse = _base_masks([reverse_complement(seq) for seq in sequences])
+        max_length = max(map(len, sequences), default=0)
+
+        # Ordered pairs: anchored[i, j] only covers the 3' end of primer j,
+        # that of primer i being anchored[j, i]
+        n = len(names)
+        anchored = np.zeros((n, n), dtype=np.uint8)
+        complementarity = np.zeros((n, n), dtype=np.uint8)
+        rows_per_block = max(1, _BLOCK_SIZE // max(n, 1))
+        for start in range(0, n, rows_per_block):
+            block = slice(start, start + rows_per_block)
+            for offset in range(1 - max_length, max_length):
+                # Primer i at the given offset along the reverse complement of
+                # primer j, whose first base is primer j's 3' end
+                shifted = forward[:, block] >> np.uint64(offset) if offset >= 0 \
+                    else forward[:, block] << np.uint64(-offset)
+                paired = np.zeros((shifted.shape[1], n), dtype=np.uint64)
+                for base in range(4):
+                    paired |= shifted[base][:, None] & reverse[base][None, :]
+                np.maximum(complementarity[block], _popcount(paired), out=complementarity[block])
+                if offset >= 0:
+                    np.maximum(anchored[block], _trailing_ones(paired), out=anchored[block])
+        return cls(names, np.maximum(anchored, anchored.T), np.maximum(complementarity, complementarity.T))
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.npz')
+        np.savez_compressed(tmp_path, names=np.array(self.names, dtype=str),
+                            three_prime=self.three_prime, complementarity=self.complementarity)
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'DimerScreen':
+        with np.load(path) as data:
+            return cls(names=data['names'].tolist(), three_prime=data['three_prime'],
+                       complementarity=data['complementarity'])
+
+    def table(self, min_three_prime: int = 0,
+              observed: Optional[Dict[Tuple[str, str], int]] = None) -> List[Dict]:
+        """Rows of the primer pairs with a 3' run of at least min_three_prime, riskiest first.
+
+        With observed dimer read counts per primer pair, every pair is given
+        its count, and pairs observed in a run are listed whatever their score.
+        """
+        first, second = np.triu_indices(len(self.names))
+        three_prime = self.three_prime[first, second]
+        keep = three_prime >= min_three_prime
+        counts = None
+        if observed is not None:
+            index = {name: i for i, name in enumerate(self.names)}
+            flat = {}
+            for (a, b), count in observed.items():
+                if a in index and b in index:
+                    i, j = sorted((index[a], index[b]))
+                    flat[i, j] = flat.get((i, j), 0) + count
+            counts = np.array([flat.get(pair, 0) for pair in zip(first.tolist(), second.tolist())],
+                              dtype=np.int64)
+            keep |= counts > 0
+
+        complementarity = self.complementarity[first, second]
+        order = np.lexsort((-complementarity[keep].astype(np.int64), -three_prime[keep].astype(np.int64)))
+        rows = []
+        for k in np.flatnonzero(keep)[order].tolist():
+            row = {
+                'primer_a': self.names[first[k]],
+                'primer_b': self.names[second[k]],
+                'three_prime_run': int(three_prime[k]),
+                'complementary_bases': int(complementarity[k])
+            }
+            if counts is not None:
+                row['observed_dimer_reads'] = int(counts[k])
+            rows.append(row)
+        return rows
+
+
+def primer_set_digest(primers: Dict[str, str]) -> str:
+    """Hash of the primer names and sequences, independent of the file they came from."""
+    content = json.dumps({'version': SCREEN_VERSION, 'primers': list(primers.items())})
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def screen_primers(primers: Dict[str, str], cache_dir: Optional[str] = None) -> DimerScreen:
+    """DimerScreen of primers, reused from cache_dir when the same set was screened before."""
+    if cache_dir is None:
+        return DimerScreen.compute(primers)
+    path = Path(cache_dir) / f"{primer_set_digest(primers)}.npz"
+    try:
+        screen = DimerScreen.load(path)
+        logger.info(f"Using cached dimer screen {path}")
+        return screen
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Cached dimer screen {path} is unusable, recomputing: {str(e)}")
+    screen = DimerScreen.compute(primers)
+    screen.save(path)
+    return screen
+
+
+def load_observed_pairs(path: str) -> Dict[Tuple[str, str], int]:
+    """Dimer read counts per (forward, reverse) primer pair, summed over the samples of a dimer_pairs.csv."""
+    counts = {}
+    with open(path, newline='') as handle:
+        for row in csv.DictReader(handle):
+            pair = (row['forward_primer'], row['reverse_primer'])
+            counts[pair] = counts.get(pair, 0) + int(row['count'])
+    return counts
+
+
+def _screened_sequence(name: str, sequence: str) -> str:
+    sequence = sequence.upper()
+    if len(sequence) > MAX_SCREEN_LENGTH:
+        logger.warning(f"Primer {name} is longer than {MAX_SCREEN_LENGTH} bases; "
+                       f"screening its 3'-most {MAX_SCREEN_LENGTH}")
+        sequence = sequence[-MAX_SCREEN_LENGTH:]
+    return sequence
+
+
+def _base_masks(sequences: List[str]) -> np.ndarray:
+    """(4, n) uint64 masks; bit k of masks[b, i] is set when sequences[i][k] is base b of ACGT."""
+    masks = np.zeros((4, len(sequences)), dtype=np.uint64)
+    for i, sequence in enumerate(sequences):
+        for base, char in enumerate('ACGT'):
+            masks[base, i] = sum(1 << k for k, c in enumerate(sequence) if c == char)
+    return masks
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.uint8)
+    return _BYTE_POPCOUNT[values[..., None].view(np.uint8)].sum(axis=-1, dtype=np.uint8)
+
+
+def _trailing_ones(values: np.ndarray) -> np.ndarray:
+    """Number of consecutive set bits from bit 0 of each value."""
+    # Lowest clear bit as a power of two, or 0 when all 64 bits are set
+    lowest_clear = ~values & (values + np.uint64(1))
+    exponent = np.frexp(lowest_clear.astype(np.float64))[1] - 1
+    return np.where(lowest_clear == 0, 64, exponent).astype(np.uint8)
@@ -1,47 +1,75 @@
-from typing import Generator, Tuple, List
-from Bio import SeqIO
-import gzip
+from typing import Generator, Tuple, List, Optional
 from pathlib import Path
 import logging
+import numpy as np
+
+from .fastq_reader import FastqReader, FastqRecord, DEFAULT_PREFETCH_BLOCKS
+from .quality_filter import QualityFilter
+from .read_merger import ReadMerger
+from . import instrumentation
 
 logger = logging.getLogger(__name__)
 
 class FastqProcessor:
-    def __init__(self, r1_path: str, r2_path: str, quality_threshold: int):
+    def __init__(self, r1_path: str, r2_path: str, quality_threshold: int,
+                 engine: str = 'native', batch_size: int = 50000,
+                 merger: ReadMerger = None, prefetch: int = DEFAULT_PREFETCH_BLOCKS):
         self.r1_path = Path(r1_path)
         self.r2_path = Path(r2_path)
         self.quality_threshold = quality_threshold
+        self.engine = engine
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.quality_filter = QualityFilter(quality_threshold)
+        self.merger = merger or ReadMerger()
+        self.merge_stats = {'merged_pairs': 0, 'unmerged_pairs': 0}
         
     def validate_files(self) -> bool:
         if not self.r1_path.exists() or not self.r2_path.exists():
             return False
         try:
-            self._open_fastq(self.r1_path).__next__()
-            self._open_fastq(self.r2_path).__next__()
+            next(iter(self._open_fastq(self.r1_path)))
+            next(iter(self._open_fastq(self.r2_path)))
             return True
         except Exception as e:
             logger.error(f"File validation failed: {str(e)}")
             return False
     
-    def _open_fastq(self, path: Path):
-        if str(path).endswith('.gz'):
-            return SeqIO.parse(gzip.open(path, 'rt'), 'fastq')
-        return SeqIO.parse(path, 'fastq')
+    def _open_fastq(self, path: Path, prefetch: int = 0) -> FastqReader:
+        return FastqReader(path, engine=self.engine, prefetch=prefetch)
     
     def process_reads(self) -> Generator[Tuple[str, float], None, None]:
-        r1_parser = self._open_fastq(self.r1_path)
-        r2_parser = self._open_fastq(self.r2_path)
+        """Yield (merged sequence, mean pair quality) for quality-passing pairs that merge.
+
+        Pairs without an acceptable overlap are counted in merge_stats instead.
+        R1 and R2 are decompressed by their own reader threads, overlapping
+        with each other and with the filtering and merging of earlier batches.
+        """
+        r1_batches = self._open_fastq(self.r1_path, self.prefetch).batches(self.batch_size)
+        r2_batches = self._open_fastq(self.r2_path, self.prefetch).batches(self.batch_size)
         
-        for r1, r2 in zip(r1_parser, r2_parser):
-            if self._check_quality(r1) and self._check_quality(r2):
-                merged_seq = self._merge_reads(r1, r2)
-                avg_quality = (sum(r1.letter_annotations["phred_quality"]) + 
-                             sum(r2.letter_annotations["phred_quality"])) / (len(r1) + len(r2))
-                yield merged_seq, avg_quality
+        for r1_batch, r2_batch in zip(r1_batches, r2_batches):
+            n_pairs = min(len(r1_batch), len(r2_batch))
+            with instrumentation.stage('quality_filter', items=n_pairs):
+                passed, avg_quality = self.quality_filter.filter_pairs(
+                    [r.qual for r in r1_batch[:n_pairs]], [r.qual for r in r2_batch[:n_pairs]]
+                )
+                passed = np.flatnonzero(passed).tolist()
+            with instrumentation.stage('merge', items=len(passed)):
+                merged = [(self._merge_reads(r1_batch[i], r2_batch[i]), float(avg_quality[i]))
+                          for i in passed]
+            
+            for merged_seq, quality in merged:
+                if merged_seq is None:
+                    self.merge_stats['unmerged_pairs'] += 1
+                    continue
+                self.merge_stats['merged_pairs'] += 1
+                yield merged_seq, quality
                 
-    def _check_quality(self, record) -> bool:
-        return min(record.letter_annotations["phred_quality"]) >= self.quality_threshold
-        
-    def _merge_reads(self, r1, r2) -> str:
-        return str(r1.seq + r2.seq)
+    def _merge_reads(self, r1: FastqRecord, r2: FastqRecord) -> Optional[str]:
+        """Overlap-merged insert sequence, or None for pairs that do not overlap."""
+        merged = self.merger.merge(r1.seq, r1.qual, r2.seq, r2.qual)
+        if merged is None:
+            return None
+        return merged[0].decode('ascii')
     
\ No newline at end of file
@@ -0,0 +1,269 @@
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+from itertools import repeat
+from pathlib import Path
+import gzip
+import io
+import logging
+import queue
+import threading
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+FASTQ_ENGINES = ('native', 'biopython')
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+# Blocks a reader thread may decompress ahead of the parser
+DEFAULT_PREFETCH_BLOCKS = 4
+PHRED_OFFSET = 33
+
+
+class FastqFormatError(ValueError):
+    """Raised when the native parser meets input it cannot split into 4-line records."""
+
+
+class FastqRecord(NamedTuple):
+    name: bytes
+    seq: bytes
+    qual: bytes
+
+
+class FastqReader:
+    """Streaming FASTQ reader yielding lightweight (name, seq, qual) bytes records.
+
+    The 'native' engine reads large binary blocks and splits 4-line records
+    directly on bytes. The 'biopython' engine goes through SeqIO and is kept
+    as a fallback for files the native parser rejects (e.g. wrapped FASTQ).
+    bytes_read and compressed_bytes_read count the decompressed and on-disk
+    bytes consumed so far.
+
+    With prefetch > 0 the native engine decompresses in a background thread,
+    at most prefetch blocks ahead of the parser, so that inflation (which
+    releases the GIL) overlaps with parsing and analysis of earlier blocks.
+    """
+
+    def __init__(self, path, engine: str = 'native', block_size: int = DEFAULT_BLOCK_SIZE,
+                 prefetch: int = 0):
+        if engine not in FASTQ_ENGINES:
+            raise ValueError(f"Unknown FASTQ engine '{engine}', expected one of {FASTQ_ENGINES}")
+        self.path = Path(path)
+        self.engine = engine
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self.bytes_read = 0
+        self.compressed_bytes_read = 0
+
+    def __iter__(self) -> Iterator[FastqRecord]:
+        for block in self._record_blocks():
+            yield from block
+
+    def batches(self, batch_size: int) -> Iterator[List[FastqRecord]]:
+        """Yield lists of at most batch_size records."""
+        pending: List[FastqRecord] = []
+        for block in self._record_blocks():
+            pending.extend(block)
+            while len(pending) >= batch_size:
+                yield pending[:batch_size]
+                pending = pending[batch_size:]
+        if pending:
+            yield pending
+
+    def chunks(self, chunk_bytes: int) -> Iterator[Tuple[bytes, int]]:
+        """Yield (text, records) chunks of about chunk_bytes of FASTQ text each, cut between records.
+
+        Chunks are only decompressed and cut at a record boundary, found by
+        counting lines, not parsed; parse() turns one into records. This lets
+        one process read a file while others parse and analyse its chunks.
+        Native engine only.
+        """
+        if self.engine != 'native':
+            raise ValueError("Raw FASTQ chunks need the 'native' engine")
+        pending: List[bytes] = []
+        pending_bytes = pending_lines = 0
+        blocks = self._data_blocks(instrumentation.active())
+        if self.prefetch > 0:
+            blocks = prefetched(blocks, self.prefetch, name=f"read-{self.path.name}")
+        for data, compressed_offset in blocks:
+            self.bytes_read += len(data)
+            self.compressed_bytes_read = compressed_offset
+            pending.append(data)
+            pending_bytes += len(data)
+            pending_lines += data.count(b'\n')
+            if pending_bytes < chunk_bytes or pending_lines < 4:
+                continue
+            text = b''.join(pending)
+            records = pending_lines // 4
+            # The chunk ends after line records * 4, at most 3 lines before the last newline
+            end = len(text)
+            for _ in range(pending_lines - records * 4 + 1):
+                end = text.rfind(b'\n', 0, end)
+            yield text[:end + 1], records
+            pending = [text[end + 1:]]
+            pending_bytes = len(pending[0])
+            pending_lines -= records * 4
+
+        text = b''.join(pending).rstrip(b'\r\n')
+        if text:
+            text += b'\n'
+            lines = text.count(b'\n')
+            if lines % 4:
+                raise FastqFormatError(f"Truncated FASTQ record at end of {self.path}")
+            yield text, lines // 4
+
+    def parse(self, text: bytes) -> List[FastqRecord]:
+        """Records of a chunk of whole FASTQ records, as yielded by chunks()."""
+        with instrumentation.stage('parse') as span:
+            records, rest = self._parse_block(text)
+            span.items = len(records)
+        if rest.strip():
+            raise FastqFormatError(f"FASTQ chunk of {self.path} does not end at a record boundary")
+        return records
+
+    def _open(self):
+        if str(self.path).endswith('.gz'):
+            return gzip.open(self.path, 'rb')
+        return open(self.path, 'rb')
+
+    def _record_blocks(self) -> Iterator[List[FastqRecord]]:
+        if self.engine == 'biopython':
+            yield from self._biopython_blocks()
+            return
+
+        rest = b''
+        blocks = self._data_blocks(instrumentation.active())
+        if self.prefetch > 0:
+            blocks = prefetched(blocks, self.prefetch, name=f"read-{self.path.name}")
+        for data, compressed_offset in blocks:
+            self.bytes_read += len(data)
+            self.compressed_bytes_read = compressed_offset
+            with instrumentation.stage('parse') as span:
+                records, rest = self._parse_block(rest + data)
+                span.items = len(records)
+            if records:
+                yield records
+
+        if rest.strip():
+            records, rest = self._parse_block(rest + b'\n')
+            if rest.strip():
+                raise FastqFormatError(f"Truncated FASTQ record at end of {self.path}")
+            yield records
+
+    def _data_blocks(self, recorder: instrumentation.StageRecorder) -> Iterator[Tuple[bytes, int]]:
+        """Decompressed blocks of up to block_size bytes with the on-disk offset after each.
+
+        Decompression is timed in recorder rather than the active one, since
+        this may run in a reader thread.
+        """
+        with self._open() as handle:
+            # GzipFile wraps the on-disk file as fileobj
+            raw = getattr(handle, 'fileobj', handle)
+            while True:
+                with recorder.stage('decompress') as span:
+                    data = handle.read(self.block_size)
+                    span.items = len(data)
+                if not data:
+                    return
+                yield data, raw.tell()
+
+    def _parse_block(self, data: bytes) -> Tuple[List[FastqRecord], bytes]:
+        if b'\r' in data:
+            data = data.replace(b'\r\n', b'\n')
+        lines = data.split(b'\n')
+        end = (len(lines) - 1) // 4 * 4
+        rest = b'\n'.join(lines[end:])
+
+        headers = lines[0:end:4]
+        seqs = lines[1:end:4]
+        separators = lines[2:end:4]
+        quals = lines[3:end:4]
+
+        if not all(map(bytes.startswith, headers, repeat(b'@'))) or \
+           not all(map(bytes.startswith, separators, repeat(b'+'))):
+            raise FastqFormatError(
+                f"Malformed FASTQ record in {self.path}; "
+                "try the 'biopython' engine for wrapped or non-standard files"
+            )
+        if list(map(len, seqs)) != list(map(len, quals)):
+            raise FastqFormatError(f"Sequence and quality lengths differ in {self.path}")
+
+        # The read ID, without the description after the first whitespace, as SeqIO's record.id
+        names = [(header[1:].split(None, 1) or [b''])[0] for header in headers]
+        return list(map(FastqRecord, names, seqs, quals)), rest
+
+    def _biopython_blocks(self) -> Iterator[List[FastqRecord]]:
+        from Bio import SeqIO
+
+        binary = self._open()
+        # Positions in the decompressed and on-disk streams, read ahead of
+        # SeqIO by at most the text buffer
+        raw = getattr(binary, 'fileobj', binary)
+        handle = io.TextIOWrapper(binary)
+        try:
+            block: List[FastqRecord] = []
+            for record in SeqIO.parse(handle, 'fastq'):
+                qual = bytes(q + PHRED_OFFSET for q in record.letter_annotations["phred_quality"])
+                block.append(FastqRecord(record.id.encode(), str(record.seq).encode(), qual))
+                if len(block) >= 10000:
+                    self.bytes_read, self.compressed_bytes_read = binary.tell(), raw.tell()
+                    yield block
+                    block = []
+            self.bytes_read, self.compressed_bytes_read = binary.tell(), raw.tell()
+            if block:
+                yield block
+        finally:
+            handle.close()
+
+
+class _Failure(NamedTuple):
+    error: BaseException
+
+
+_END = object()
+
+
+def prefetched(items: Iterable, depth: int, name: str = 'prefetch') -> Iterator:
+    """Iterate items in a background thread, at most depth items ahead of the consumer.
+
+    The bounded queue is the backpressure: the producer blocks while depth
+    items are waiting. Time the consumer spends waiting is recorded as the
+    read_wait stage. Exceptions raised by the producer are re-raised in the
+    consumer, and closing the returned generator early stops the producer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            with instrumentation.stage('read_wait'):
+                item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,159 @@
+from typing import Callable, Dict, Iterator, Optional
+from contextlib import contextmanager
+from functools import wraps
+from dataclasses import dataclass
+from pathlib import Path
+import cProfile
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageStats:
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    items: int = 0
+    calls: int = 0
+
+    def merge(self, other: 'StageStats') -> 'StageStats':
+        self.wall_s += other.wall_s
+        self.cpu_s += other.cpu_s
+        self.items += other.items
+        self.calls += other.calls
+        return self
+
+
+class Span:
+    """Handle yielded by StageRecorder.stage; set items once the count is known."""
+    __slots__ = ('items',)
+
+    def __init__(self, items: int):
+        self.items = items
+
+
+class StageRecorder:
+    """Wall time, CPU time and items processed per pipeline stage.
+
+    Recorders are mergeable like the other per-sample tallies, so stages
+    timed in different worker processes add up; merged times are therefore
+    summed over processes, not elapsed time. CPU time is that of the
+    recording process only.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0) -> Iterator[Span]:
+        span = Span(items)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            stats = self.stages.setdefault(name, StageStats())
+            stats.merge(StageStats(time.perf_counter() - wall, time.process_time() - cpu,
+                                   span.items, 1))
+
+    @classmethod
+    def from_dict(cls, stages: Dict[str, Dict]) -> 'StageRecorder':
+        """Inverse of as_dict, for recorders returned inside result dicts."""
+        recorder = cls()
+        for name, stats in stages.items():
+            recorder.stages[name] = StageStats(stats['wall_s'], stats['cpu_s'],
+                                               stats['items'], stats['calls'])
+        return recorder
+
+    def merge(self, other: 'StageRecorder') -> 'StageRecorder':
+        for name, stats in other.stages.items():
+            self.stages.setdefault(name, StageStats()).merge(stats)
+        return self
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                'wall_s': stats.wall_s,
+                'cpu_s': stats.cpu_s,
+                'items': stats.items,
+                'calls': stats.calls,
+                'items_per_s': stats.items / stats.wall_s if stats.wall_s > 0 else 0.0
+            }
+            for name, stats in sorted(self.stages.items(), key=lambda kv: -kv[1].wall_s)
+        }
+
+
+# Recorder that stage() reports to in this process; replaced per sample by recording()
+_active = StageRecorder()
+
+
+def active() -> StageRecorder:
+    return _active
+
+
+@contextmanager
+def recording(recorder: StageRecorder) -> Iterator[StageRecorder]:
+    """Send stage() timings in this process to recorder for the duration of the block."""
+    global _active
+    previous, _active = _active, recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+def stage(name: str, items: int = 0):
+    """Time a block as one call of stage name in the active recorder."""
+    return _active.stage(name, items)
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function as stage name."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# cProfile state of this process, set up by enable_profiling()
+_profiler: Optional[cProfile.Profile] = None
+_profile_path: Optional[Path] = None
+
+
+def enable_profiling(profile_dir: Optional[str], role: str = 'worker'):
+    """Profile the profiled() blocks of this process into <profile_dir>/<role>_<pid>.prof.
+
+    Used as part of the worker initializer; a None profile_dir disables profiling.
+    """
+    global _profiler, _profile_path
+    if _profiler is not None:
+        # A forked worker inherits the parent's profiler, possibly still enabled
+        _profiler.disable()
+    if profile_dir is None:
+        _profiler = _profile_path = None
+        return
+    Path(profile_dir).mkdir(parents=True, exist_ok=True)
+    _profiler = cProfile.Profile()
+    _profile_path = Path(profile_dir) / f"{role}_{os.getpid()}.prof"
+
+
+@contextmanager
+def profiled() -> Iterator[None]:
+    """Profile the block if profiling is enabled, dumping the cumulative stats afterwards.
+
+    Stats are written after every block rather than at process exit, since
+    pool workers are not guaranteed to run exit handlers.
+    """
+    if _profiler is None:
+        yield
+        return
+    _profiler.enable()
+    try:
+        yield
+    finally:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
@@ -1,6 +1,9 @@
-from typing import Dict, List
+from typing import Dict, List, Sequence
 from collections import defaultdict
 import logging
+import numpy as np
+
+from . import instrumentation
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +23,90 @@ class LengthAnalyzer:
             return 'long'
         return 'valid'
         
-    def analyze_distribution(self, sequences: List[str]) -> Dict[str, int]:
+    def analyze_distribution(self, sequences: List[str], counts: List[int] = None) -> Dict[str, int]:
+        """Count sequences per length category, optionally weighted by per-sequence counts."""
         distribution = defaultdict(int)
-        for seq in sequences:
-            category = self.categorize_sequence(seq)
-            distribution[category] += 1
-        return dict(distribution)
\ No newline at end of file
+        if counts is None:
+            for seq in sequences:
+                category = self.categorize_sequence(seq)
+                distribution[category] += 1
+        else:
+            for seq, count in zip(sequences, counts):
+                distribution[self.categorize_sequence(seq)] += count
+        return dict(distribution)
+
+    def analyze_histogram(self, accumulator: 'LengthAccumulator') -> Dict[str, int]:
+        """Length categories from a LengthAccumulator instead of individual sequences."""
+        return accumulator.categorize(self.expected_length, self.tolerance)
+
+
+class LengthAccumulator:
+    """Streaming read-length histogram that can be merged across workers.
+
+    Lengths 0..max_length get one bin each; longer reads share a final
+    overflow bin, so memory is O(max_length) regardless of read count.
+    """
+
+    def __init__(self, max_length: int = 1000):
+        self.max_length = max_length
+        self.histogram = np.zeros(max_length + 2, dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self.histogram.sum())
+
+    @property
+    def overflow(self) -> int:
+        return int(self.histogram[-1])
+
+    def update(self, batch: Sequence, counts: Sequence[int] = None):
+        """Add a batch of sequences (or plain lengths), optionally weighted by counts."""
+        with instrumentation.stage('length_histogram', items=len(batch)):
+            self._update(batch, counts)
+
+    def _update(self, batch: Sequence, counts: Sequence[int] = None):
+        if len(batch) and isinstance(batch[0], (str, bytes)):
+            lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        else:
+            lengths = np.asarray(batch, dtype=np.int64)
+        bins = np.minimum(lengths, self.max_length + 1)
+        if counts is None:
+            self.histogram += np.bincount(bins, minlength=len(self.histogram))
+        else:
+            weights = np.asarray(counts, dtype=np.float64)
+            self.histogram += np.rint(
+                np.bincount(bins, weights=weights, minlength=len(self.histogram))
+            ).astype(np.int64)
+
+    def merge(self, other: 'LengthAccumulator') -> 'LengthAccumulator':
+        if other.max_length != self.max_length:
+            raise ValueError("Cannot merge length histograms with different max_length")
+        self.histogram += other.histogram
+        return self
+
+    def count_at_most(self, length: int) -> int:
+        """Reads of length <= length."""
+        if length > self.max_length:
+            raise ValueError(f"Length {length} lies beyond the histogram range ({self.max_length})")
+        return int(self.histogram[:max(length, -1) + 1].sum())
+
+    def categorize(self, expected_length: int, tolerance: int) -> Dict[str, int]:
+        """Short/valid/long counts, same boundaries as LengthAnalyzer.categorize_sequence."""
+        min_length = max(expected_length - tolerance, 0)
+        max_length = expected_length + tolerance
+        if max_length > self.max_length:
+            raise ValueError(
+                f"Valid range up to {max_length} bp exceeds the histogram range ({self.max_length})"
+            )
+        short = int(self.histogram[:min_length].sum())
+        valid = int(self.histogram[min_length:max_length + 1].sum())
+        return {'short': short, 'valid': valid, 'long': self.total - short - valid}
+
+    def percentile(self, q: float) -> int:
+        """Length at the q-th percentile; max_length + 1 stands for the overflow bin."""
+        total = self.total
+        if not total:
+            return 0
+        cumulative = np.cumsum(self.histogram)
+        # At least one read, so low percentiles fall on the first non-empty bin
+        return int(np.searchsorted(cumulative, max(q / 100 * total, 1), side='left'))
@@ -1,16 +1,50 @@
-from typing import List, Dict, Tuple
-from Bio import SeqIO
-from Bio.Seq import Seq
+from typing import List, Dict, Optional, Tuple, Sequence, Union
+from collections import OrderedDict
+from pathlib import Path
 import logging
+import os
+import numpy as np
+
+from .primer_matcher import PrimerMatcher
+from . import instrumentation
 
 logger = logging.getLogger(__name__)
 
 class PrimerAnalyzer:
-    def __init__(self, primer_file: str, max_dimer_length: int):
-        self.primers = self._load_primers(primer_file)
+    # Compiled primer sets of this process keyed on file identity, shared by
+    # all analyzers so that each primer file is parsed and compiled only once
+    _compiled: Dict[Tuple[str, int, int], PrimerMatcher] = {}
+
+    def __init__(self, primer_file: str, max_dimer_length: int, max_errors: int = 2,
+                 cache_size: int = 100000):
+        self.matcher = self.compile_primers(primer_file)
+        self.primers = self.matcher.primers
+        self.primer_names = self.matcher.names
         self.max_dimer_length = max_dimer_length
+        self.max_errors = max_errors
+        
+        # LRU cache of dimer primer pairs keyed on the exact read sequence
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: OrderedDict = OrderedDict()
         
-    def _load_primers(self, primer_file: str) -> Dict[str, str]:
+    @classmethod
+    def compile_primers(cls, primer_file: str) -> PrimerMatcher:
+        """PrimerMatcher for primer_file, loaded once per process and file version."""
+        try:
+            stat = os.stat(primer_file)
+        except OSError as e:
+            logger.error(f"Failed to load primers: {str(e)}")
+            raise
+        key = (str(Path(primer_file).resolve()), stat.st_mtime_ns, stat.st_size)
+        if key not in cls._compiled:
+            cls._compiled[key] = PrimerMatcher(cls._load_primers(primer_file))
+        return cls._compiled[key]
+
+    @staticmethod
+    def _load_primers(primer_file: str) -> Dict[str, str]:
+        from Bio import SeqIO
         primers = {}
         try:
             for record in SeqIO.parse(primer_file, "fasta"):
@@ -21,18 +55,84 @@ class PrimerAnalyzer:
             raise
             
     def detect_primer_dimers(self, sequence: str) -> bool:
+        """True if some primer matches the read forward and some primer (possibly the same) reverse-complemented."""
+        return self.primer_dimer_pair(sequence) is not None
+
+    def primer_dimer_pair(self, sequence: Union[str, bytes]) -> Optional[Tuple[str, str]]:
+        """Names of the (forward, reverse-complemented) primers forming the dimer, or None."""
+        forward, reverse = self._detect_one(sequence)
+        if forward < 0:
+            return None
+        return self.primer_names[forward], self.primer_names[reverse]
+
+    def detect_primer_dimers_batch(self, sequences: Sequence[Union[str, bytes]]) -> np.ndarray:
+        """Vectorised detect_primer_dimers over a batch; returns one boolean per read."""
+        return self.primer_dimer_pairs_batch(sequences)[:, 0] >= 0
+
+    def primer_dimer_pairs_batch(self, sequences: Sequence[Union[str, bytes]]) -> np.ndarray:
+        """(forward, reverse-complemented) indices into primer_names per read, -1 for non-dimers."""
+        with instrumentation.stage('primer_matching', items=len(sequences)):
+            return self._detect_batch(sequences)
+
+    def _detect_one(self, sequence: Union[str, bytes]) -> Tuple[int, int]:
         if len(sequence) > self.max_dimer_length:
-            return False
-            
-        for primer_name, primer_seq in self.primers.items():
-            rc_primer = str(Seq(primer_seq).reverse_complement())
-            if self._find_primer_match(sequence, primer_seq) and \
-               self._find_primer_match(sequence, rc_primer):
-                return True
-        return False
+            return -1, -1
+        if not self.cache_size:
+            return self.matcher.dimer_indices(sequence, self.max_errors)
+        cached = self._cache.get(sequence)
+        if cached is not None:
+            self._cache.move_to_end(sequence)
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+        pair = self.matcher.dimer_indices(sequence, self.max_errors)
+        self._remember(sequence, pair)
+        return pair
+
+    def _detect_batch(self, sequences: Sequence[Union[str, bytes]]) -> np.ndarray:
+        if not self.cache_size:
+            return self.matcher.dimer_pairs_batch(sequences, self.max_dimer_length, self.max_errors)
+        
+        result = np.full((len(sequences), 2), -1, dtype=np.int64)
+        pending: Dict[Union[str, bytes], List[int]] = {}
+        for i, sequence in enumerate(sequences):
+            if len(sequence) > self.max_dimer_length:
+                continue
+            cached = self._cache.get(sequence)
+            if cached is not None:
+                self._cache.move_to_end(sequence)
+                self.cache_hits += 1
+                result[i] = cached
+            elif sequence in pending:
+                self.cache_hits += 1
+                pending[sequence].append(i)
+            else:
+                self.cache_misses += 1
+                pending[sequence] = [i]
+        
+        if pending:
+            unique = list(pending)
+            pairs = self.matcher.dimer_pairs_batch(unique, self.max_dimer_length, self.max_errors)
+            for sequence, pair in zip(unique, map(tuple, pairs.tolist())):
+                result[pending[sequence]] = pair
+                self._remember(sequence, pair)
+        return result
+
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size
+        }
+
+    def _remember(self, sequence: Union[str, bytes], pair: Tuple[int, int]):
+        self._cache[sequence] = pair
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
         
     def _find_primer_match(self, sequence: str, primer: str, max_errors: int = 2) -> bool:
-        # Simple implementation allowing for mismatches
+        # Reference implementation; detection goes through the compiled PrimerMatcher
         for i in range(len(sequence) - len(primer) + 1):
             errors = sum(1 for x, y in zip(sequence[i:i+len(primer)], primer) if x != y)
             if errors <= max_errors:
@@ -0,0 +1,321 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_COMPLEMENT = str.maketrans(
+    'ACGTUMRWSYKVHDBNacgtumrwsykvhdbn',
+    'TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn'
+)
+
+
+# Seed k-mers are packed 2 bits per base into int64 codes
+MAX_SEED_LENGTH = 31
+# Up to this seed length, seeds are looked up in a table over all 4^k codes
+MAX_TABLE_SEED_LENGTH = 10
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+_BASE_CODES[np.frombuffer(b'ACGT', dtype=np.uint8)] = np.arange(4)
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+def _bit_table(char: int) -> bytes:
+    return bytes(49 if i == char else 48 for i in range(256))
+
+
+class CompiledPattern:
+    """A primer compiled for bit-parallel Hamming matching.
+
+    Read positions are held as one integer bitmask per base (bit i set when
+    read[i] is that base), so all windows of a read are compared against one
+    primer position with a shift and an AND. Saturating mismatch counters are
+    kept as bit planes, one per allowed error. This is the per-read path;
+    batches of reads are searched through a SeedIndex instead.
+    """
+
+    __slots__ = ('pattern', 'length', 'positions', '_seeds')
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.length = len(pattern)
+        self.positions: List[Tuple[int, int]] = [
+            (char, offset) for offset, char in enumerate(pattern.encode('ascii'))
+        ]
+        self._seeds: Dict[int, List[bytes]] = {}
+
+    def seeded(self, read: bytes, max_errors: int) -> bool:
+        """False if the read cannot match, as it contains none of the pattern's exact seeds.
+
+        A window with at most max_errors mismatches matches at least one of
+        max_errors + 1 disjoint segments of the pattern exactly, and bytes
+        searches for those are far cheaper than the bit-parallel scan.
+        """
+        if max_errors not in self._seeds:
+            k = self.length // (max_errors + 1)
+            pattern = self.pattern.encode('ascii')
+            self._seeds[max_errors] = [pattern[i:i + k] for i in range(0, (max_errors + 1) * k, k)] if k else []
+        seeds = self._seeds[max_errors]
+        return not seeds or any(seed in read for seed in seeds)
+
+    def matches(self, masks: Dict[int, int], read_length: int, max_errors: int) -> bool:
+        """True if any window of the encoded read has at most max_errors mismatches."""
+        return self.mismatches(masks, read_length, max_errors) is not None
+
+    def mismatches(self, masks: Dict[int, int], read_length: int, max_errors: int) -> Optional[int]:
+        """Fewest mismatches of any window of the encoded read, or None if all have more than max_errors."""
+        if read_length < self.length:
+            return None
+        valid = (1 << (read_length - self.length + 1)) - 1
+        # levels[e] marks windows that already have more than e mismatches
+        levels = [0] * (max_errors + 1)
+        for char, offset in self.positions:
+            mismatches = valid & ~(masks.get(char, 0) >> offset)
+            if not mismatches:
+                continue
+            for e in range(max_errors, 0, -1):
+                levels[e] |= levels[e - 1] & mismatches
+            levels[0] |= mismatches
+            if levels[max_errors] == valid:
+                return None
+        return next(e for e, level in enumerate(levels) if level != valid)
+
+
+class SeedIndex:
+    """Pigeonhole k-mer seed index over a set of patterns for Hamming matching.
+
+    A pattern matching a read window with at most max_errors mismatches has
+    at least one of max_errors + 1 disjoint segments matching exactly, so each
+    pattern is indexed by that many exact k-mer seeds (k is the shortest
+    pattern length divided by max_errors + 1). Scanning a batch of reads is
+    then one pass over their k-mers with a sorted-array lookup, after which
+    only the seeded windows are verified. Cost depends on the number of seed
+    hits rather than on the number of patterns.
+    """
+
+    def __init__(self, patterns: List[bytes], max_errors: int):
+        self.max_errors = max_errors
+        self.lengths = np.array([len(p) for p in patterns], dtype=np.int64)
+        seeded = self.lengths[self.lengths > max_errors]
+        self.k = min(int(seeded.min()) // (max_errors + 1), MAX_SEED_LENGTH) if len(seeded) else 0
+        self.matrix = np.zeros((len(patterns), int(self.lengths.max(initial=0))), dtype=np.uint8)
+        for i, pattern in enumerate(patterns):
+            self.matrix[i, :len(pattern)] = np.frombuffer(pattern, dtype=np.uint8)
+
+        seeds = []
+        for i, pattern in enumerate(patterns):
+            if self.k == 0 or len(pattern) <= max_errors:
+                continue
+            for offset in range(0, (max_errors + 1) * self.k, self.k):
+                code = kmer_codes(self.matrix[i:i + 1, offset:offset + self.k], self.k)[0]
+                # Seeds with bases other than ACGT can never match exactly; by the
+                # pigeonhole argument another segment of the pattern then will
+                if code[0] >= 0:
+                    seeds.append((int(code[0]), i, offset))
+        seeds.sort()
+        self.seed_codes = np.array([code for code, _, _ in seeds], dtype=np.int64)
+        self.seed_patterns = np.array([i for _, i, _ in seeds], dtype=np.int64)
+        self.seed_offsets = np.array([offset for _, _, offset in seeds], dtype=np.int64)
+        # Seeds with code c are seed_codes[table[c]:table[c + 1]]
+        self.table = None
+        if 0 < self.k <= MAX_TABLE_SEED_LENGTH:
+            self.table = np.searchsorted(self.seed_codes, np.arange(4 ** self.k + 1))
+        # Patterns of at most max_errors bases match every window of their length
+        self.trivial = np.flatnonzero(self.lengths <= max_errors)
+
+    def search(self, matrix: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(read, pattern, mismatches) of every pattern matching each read of a zero-padded matrix.
+
+        A pattern matching a read at several windows, or a window seeded by
+        several segments, is reported more than once.
+        """
+        reads, patterns, starts = self._seed_hits(matrix, lengths)
+        for pattern in self.trivial:
+            # Every window is a candidate; only the mismatch count is needed
+            trivial_reads, trivial_starts = np.nonzero(
+                np.arange(matrix.shape[1]) <= (lengths - self.lengths[pattern])[:, None]
+            )
+            reads = np.concatenate([reads, trivial_reads])
+            patterns = np.concatenate([patterns, np.full(len(trivial_reads), pattern)])
+            starts = np.concatenate([starts, trivial_starts])
+
+        in_read = (starts >= 0) & (starts + self.lengths[patterns] <= lengths[reads])
+        reads, patterns, starts = reads[in_read], patterns[in_read], starts[in_read]
+        mismatches = self._mismatches(matrix, reads, patterns, starts)
+        keep = mismatches <= self.max_errors
+        return reads[keep], patterns[keep], mismatches[keep]
+
+    def _seed_hits(self, matrix: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        empty = np.zeros(0, dtype=np.int64)
+        if self.k == 0 or matrix.shape[1] < self.k or not len(self.seed_codes):
+            return empty, empty, empty
+        codes = kmer_codes(matrix, self.k)
+        if self.table is not None:
+            first = self.table[codes]
+            counts = self.table[codes + 1] - first
+            counts[codes < 0] = 0
+            rows, cols = np.nonzero(counts)
+            first, counts = first[rows, cols], counts[rows, cols]
+        else:
+            rows, cols = np.nonzero(codes >= 0)
+            values = codes[rows, cols]
+            first = np.searchsorted(self.seed_codes, values, side='left')
+            counts = np.searchsorted(self.seed_codes, values, side='right') - first
+        hits = np.repeat(first, counts) + np.arange(int(counts.sum())) \
+            - np.repeat(np.cumsum(counts) - counts, counts)
+        reads = np.repeat(rows, counts)
+        starts = np.repeat(cols, counts) - self.seed_offsets[hits]
+        return reads, self.seed_patterns[hits], starts
+
+    def _mismatches(self, matrix: np.ndarray, reads: np.ndarray, patterns: np.ndarray,
+                    starts: np.ndarray) -> np.ndarray:
+        width = self.matrix.shape[1]
+        padded = np.pad(matrix, ((0, 0), (0, width)))
+        windows = padded[reads[:, None], starts[:, None] + np.arange(width)]
+        in_pattern = np.arange(width) < self.lengths[patterns][:, None]
+        return ((windows != self.matrix[patterns]) & in_pattern).sum(axis=1)
+
+
+class PrimerMatcher:
+    """Forward and reverse-complement patterns for a primer set, compiled once.
+
+    A read is a primer dimer when some primer i matches it forward and some
+    primer j (possibly i itself) matches it reverse-complemented, each with at
+    most max_errors mismatches. Single reads are scanned primer by primer
+    with the bit-parallel CompiledPatterns; for batches all 2 x n patterns
+    are searched at once through a SeedIndex per max_errors, built on first
+    use. Both pick the same pair.
+    """
+
+    def __init__(self, primers: Dict[str, str]):
+        self.primers = dict(primers)
+        self.names = list(self.primers)
+        self.patterns: List[Tuple[str, CompiledPattern, CompiledPattern]] = [
+            (name, CompiledPattern(seq), CompiledPattern(reverse_complement(seq)))
+            for name, seq in primers.items()
+        ]
+        alphabet = {char for _, fwd, rc in self.patterns
+                    for pattern in (fwd, rc) for char, _ in pattern.positions}
+        self._tables = {char: _bit_table(char) for char in alphabet}
+        self._indexes: Dict[int, SeedIndex] = {}
+
+    def index(self, max_errors: int) -> SeedIndex:
+        """Seed index over all patterns, forward primer i at 2i and its reverse complement at 2i + 1."""
+        if max_errors not in self._indexes:
+            patterns = [pattern.pattern.encode('ascii') for _, fwd, rc in self.patterns for pattern in (fwd, rc)]
+            self._indexes[max_errors] = SeedIndex(patterns, max_errors)
+        return self._indexes[max_errors]
+
+    def encode(self, sequence: Union[str, bytes]) -> Dict[int, int]:
+        """Per-base position bitmasks of a read, for the bases used by the primers."""
+        if isinstance(sequence, str):
+            sequence = sequence.encode('ascii')
+        if not sequence:
+            return {}
+        return {char: int(sequence.translate(table)[::-1], 2)
+                for char, table in self._tables.items()}
+
+    def has_dimer(self, sequence: Union[str, bytes], max_errors: int) -> bool:
+        """True if some primer matches the read forward and some primer reverse-complemented."""
+        return self.dimer_pair(sequence, max_errors) is not None
+
+    def dimer_pair(self, sequence: Union[str, bytes], max_errors: int) -> Optional[Tuple[str, str]]:
+        """Names of the (forward, reverse-complemented) primers forming a dimer in the read, or None."""
+        forward, reverse = self.dimer_indices(sequence, max_errors)
+        if forward < 0:
+            return None
+        return self.names[forward], self.names[reverse]
+
+    def dimer_indices(self, sequence: Union[str, bytes], max_errors: int) -> Tuple[int, int]:
+        """(forward, reverse-complemented) primer indices of the dimer in one read, (-1, -1) for none.
+
+        Scalar counterpart of dimer_pairs_batch, without its per-call matrix
+        setup: patterns are prefiltered by their seeds, and only the read of
+        a seeded pattern is encoded for the bit-parallel scan.
+        """
+        read = sequence.encode('ascii') if isinstance(sequence, str) else sequence
+        masks = None
+        pair = []
+        for side in (1, 2):
+            best = None
+            for i, patterns in enumerate(self.patterns):
+                if not patterns[side].seeded(read, max_errors):
+                    continue
+                if masks is None:
+                    masks = self.encode(read)
+                errors = patterns[side].mismatches(masks, len(read), max_errors)
+                if errors is not None and (best is None or errors < best[0]):
+                    best = (errors, i)
+                    if not errors:
+                        break
+            if best is None:
+                return -1, -1
+            pair.append(best[1])
+        return pair[0], pair[1]
+
+    def has_dimer_batch(self, sequences: Sequence[Union[str, bytes]], max_length: int,
+                        max_errors: int, chunk_size: int = 4096) -> np.ndarray:
+        """Boolean mask of has_dimer() over reads no longer than max_length."""
+        return self.dimer_pairs_batch(sequences, max_length, max_errors, chunk_size)[:, 0] >= 0
+
+    def dimer_pairs_batch(self, sequences: Sequence[Union[str, bytes]], max_length: int,
+                          max_errors: int, chunk_size: int = 4096) -> np.ndarray:
+        """(forward, reverse-complemented) primer indices of the dimer in each read, -1 for none.
+
+        Reads longer than max_length are not scanned. Where several primers
+        match, each side takes the one with the fewest mismatches, ties going
+        to the primer listed first. Reads are packed into zero-padded uint8
+        matrices of chunk_size reads, which bounds the memory of the seed hits.
+        """
+        reads = [seq.encode('ascii') if isinstance(seq, str) else seq for seq in sequences]
+        lengths = np.fromiter(map(len, reads), dtype=np.int64, count=len(reads))
+        result = np.full((len(reads), 2), -1, dtype=np.int64)
+        candidates = np.flatnonzero((lengths <= max_length) & (lengths > 0))
+        index = self.index(max_errors)
+
+        for start in range(0, len(candidates), chunk_size):
+            rows = candidates[start:start + chunk_size]
+            matrix = encode_matrix([reads[i] for i in rows], lengths[rows])
+            hits, patterns, mismatches = index.search(matrix, lengths[rows])
+            best = np.full((len(rows), 2), -1, dtype=np.int64)
+            for orientation in (0, 1):
+                side = patterns % 2 == orientation
+                primers = patterns[side] // 2
+                order = np.lexsort((primers, mismatches[side], hits[side]))
+                found, first = np.unique(hits[side][order], return_index=True)
+                best[found, orientation] = primers[order][first]
+            is_dimer = (best >= 0).all(axis=1)
+            result[rows[is_dimer]] = best[is_dimer]
+        return result
+
+
+def kmer_codes(matrix: np.ndarray, k: int) -> np.ndarray:
+    """2-bit codes of every k-base window of a uint8 read matrix, -1 for windows with other bytes."""
+    dtype = np.int32 if k <= 15 else np.int64
+    n_windows = matrix.shape[1] - k + 1
+    if n_windows <= 0:
+        return np.zeros((len(matrix), 0), dtype=dtype)
+    bases = _BASE_CODES[matrix]
+    codes = np.zeros((len(matrix), n_windows), dtype=dtype)
+    for offset in range(k):
+        codes <<= 2
+        codes |= bases[:, offset:offset + n_windows] & 3
+    # Windows containing a byte other than ACGT (N, padding) have no code
+    others = np.zeros((len(matrix), matrix.shape[1] + 1), dtype=np.int32)
+    np.cumsum(bases > 3, axis=1, out=others[:, 1:])
+    codes[others[:, k:] - others[:, :n_windows] > 0] = -1
+    return codes
+
+
+def encode_matrix(reads: List[bytes], lengths: np.ndarray) -> np.ndarray:
+    """Pack reads into a zero-padded (reads x max length) uint8 matrix."""
+    matrix = np.zeros((len(reads), int(lengths.max(initial=0))), dtype=np.uint8)
+    if not len(reads):
+        return matrix
+    rows = np.repeat(np.arange(len(reads)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    cols = np.arange(int(lengths.sum())) - np.repeat(starts, lengths)
+    matrix[rows, cols] = np.frombuffer(b''.join(reads), dtype=np.uint8)
+    return matrix
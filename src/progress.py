@@ -0,0 +1,119 @@
+from typing import Dict, Optional
+import multiprocessing
+import threading
+import time
+import logging
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Slots of the shared counter array
+READS, BYTES, COMPRESSED_BYTES = range(3)
+
+# Counters of the current run in this process: set in the main process by
+# ThroughputMonitor and in workers by the pool initializer
+_counters = None
+
+
+def attach(counters):
+    """Worker initializer: report progress into the run's shared counters."""
+    global _counters
+    _counters = counters
+
+
+def add(reads: int, nbytes: int, compressed_bytes: int):
+    """Add one batch to the shared counters; a no-op outside a monitored run."""
+    if _counters is None:
+        return
+    with _counters.get_lock():
+        _counters[READS] += reads
+        _counters[BYTES] += nbytes
+        _counters[COMPRESSED_BYTES] += compressed_bytes
+
+
+class ReaderProgress:
+    """Reports the growth of a FastqReader's counters batch by batch."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._bytes = 0
+        self._compressed_bytes = 0
+
+    def update(self, reads: int):
+        add(reads, self.reader.bytes_read - self._bytes,
+            self.reader.compressed_bytes_read - self._compressed_bytes)
+        self._bytes = self.reader.bytes_read
+        self._compressed_bytes = self.reader.compressed_bytes_read
+
+
+class ThroughputMonitor:
+    """Read-level progress bar fed by counters shared with all worker processes.
+
+    Workers add reads, decompressed bytes and compressed bytes after every
+    batch; a background thread refreshes the bar from them. The bar runs over
+    the compressed size of the input that will be read, so its ETA follows
+    the actual decompression progress rather than the number of finished
+    samples.
+    """
+
+    def __init__(self, total_compressed_bytes: int, total_samples: int, interval: float = 0.5):
+        self.counters = multiprocessing.Array('q', 3)
+        self.total_compressed_bytes = total_compressed_bytes
+        self.total_samples = total_samples
+        self.samples_done = 0
+        self.interval = interval
+        self._bar: Optional[tqdm] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start = self._end = None
+
+    def __enter__(self) -> 'ThroughputMonitor':
+        attach(self.counters)
+        self._start = time.perf_counter()
+        self._bar = tqdm(total=self.total_compressed_bytes, unit='B', unit_scale=True,
+                         desc="Processing samples")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._end = time.perf_counter()
+        self._refresh()
+        self._bar.close()
+        attach(None)
+
+    def sample_done(self):
+        self.samples_done += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._refresh()
+
+    def _refresh(self):
+        stats = self.summary()
+        self._bar.n = min(stats['compressed_bytes'], self.total_compressed_bytes)
+        self._bar.set_postfix_str(
+            f"samples {self.samples_done}/{self.total_samples}, "
+            f"{stats['reads']:,} reads, {stats['reads_per_s']:,.0f} reads/s, "
+            f"{stats['bytes_per_s'] / 1e6:,.1f} MB/s decompressed"
+        )
+
+    def summary(self) -> Dict:
+        """Totals and rates so far, or for the whole run once it has finished."""
+        with self.counters.get_lock():
+            reads, nbytes, compressed = self.counters[:]
+        elapsed = (self._end or time.perf_counter()) - self._start
+        rate = 1 / elapsed if elapsed > 0 else 0.0
+        return {
+            'samples': self.samples_done,
+            'reads': reads,
+            'bytes_decompressed': nbytes,
+            'compressed_bytes': compressed,
+            'elapsed_s': elapsed,
+            'reads_per_s': reads * rate,
+            'bytes_per_s': nbytes * rate,
+            'compressed_bytes_per_s': compressed * rate
+        }
@@ -0,0 +1,45 @@
+from typing import Sequence, Tuple
+import logging
+import numpy as np
+
+from .fastq_reader import PHRED_OFFSET
+
+logger = logging.getLogger(__name__)
+
+
+def phred_stats(quals: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-read minimum Phred score, Phred sum and length for a batch of Phred+33 strings.
+
+    All quality strings are concatenated into one uint8 buffer and reduced per
+    read with reduceat, so the whole batch costs a handful of NumPy calls.
+    Empty reads get a minimum of -1 so they never pass a threshold.
+    """
+    lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    buffer = np.frombuffer(b''.join(quals), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+    
+    mins = np.full(len(quals), -1, dtype=np.int64)
+    sums = np.zeros(len(quals), dtype=np.int64)
+    nonempty = lengths > 0
+    if nonempty.any():
+        offsets = starts[nonempty]
+        mins[nonempty] = np.minimum.reduceat(buffer, offsets).astype(np.int64) - PHRED_OFFSET
+        sums[nonempty] = np.add.reduceat(buffer, offsets, dtype=np.int64) - PHRED_OFFSET * lengths[nonempty]
+    return mins, sums, lengths
+
+
+class QualityFilter:
+    """Vectorised paired-read quality filter on raw Phred+33 bytes."""
+
+    def __init__(self, quality_threshold: int):
+        self.quality_threshold = quality_threshold
+
+    def filter_pairs(self, r1_quals: Sequence[bytes],
+                     r2_quals: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pass mask (both mates reach the threshold at every base) and mean pair quality."""
+        r1_min, r1_sum, r1_len = phred_stats(r1_quals)
+        r2_min, r2_sum, r2_len = phred_stats(r2_quals)
+        passed = (r1_min >= self.quality_threshold) & (r2_min >= self.quality_threshold)
+        n_bases = r1_len + r2_len
+        avg_quality = np.divide(r1_sum + r2_sum, n_bases, out=np.zeros(len(n_bases)), where=n_bases > 0)
+        return passed, avg_quality
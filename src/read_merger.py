@@ -0,0 +1,106 @@
+from typing import Optional, Set, Tuple
+import logging
+
+from .fastq_reader import PHRED_OFFSET
+
+logger = logging.getLogger(__name__)
+
+_COMPLEMENT = bytes.maketrans(b'ACGTNacgtn', b'TGCANtgcan')
+_MIN_MERGED_QUALITY = 2
+
+
+def count_mismatches(a: bytes, b: bytes) -> int:
+    """Number of differing positions between two equal-length byte strings.
+
+    Both strings are XORed as big integers; every non-zero byte is folded
+    onto its lowest bit and the bits are counted, so the comparison runs in
+    C regardless of length.
+    """
+    diff = int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+    diff |= diff >> 4
+    diff |= diff >> 2
+    diff |= diff >> 1
+    return (diff & int.from_bytes(b'\x01' * len(a), 'big')).bit_count()
+
+
+class ReadMerger:
+    """Overlap-based paired-end merger.
+
+    R2 is reverse-complemented and placed at offset s relative to R1, so the
+    insert spans R1[0] .. R2rc[-1]. Candidate offsets come from exact k-mer
+    seeds (every seed_length bases of either read, located with bytes.find),
+    so only plausible overlaps are scored. Among overlaps of at least
+    min_overlap bases with a mismatch rate up to max_mismatch_rate the lowest
+    mismatch rate wins, ties going to the longer overlap. Disagreeing bases
+    take the base with the higher quality.
+    """
+
+    def __init__(self, min_overlap: int = 10, max_mismatch_rate: float = 0.1,
+                 seed_length: int = 8):
+        self.min_overlap = min_overlap
+        self.max_mismatch_rate = max_mismatch_rate
+        self.seed_length = min(seed_length, min_overlap)
+
+    def merge(self, r1_seq: bytes, r1_qual: bytes,
+              r2_seq: bytes, r2_qual: bytes) -> Optional[Tuple[bytes, bytes]]:
+        """Merged (sequence, quality) of a read pair, or None if no acceptable overlap exists."""
+        r2_seq = r2_seq.translate(_COMPLEMENT)[::-1]
+        r2_qual = r2_qual[::-1]
+        offset = self._best_offset(r1_seq, r2_seq)
+        if offset is None:
+            return None
+        return self._build(r1_seq, r1_qual, r2_seq, r2_qual, offset)
+
+    def _best_offset(self, r1: bytes, r2: bytes) -> Optional[int]:
+        best = None
+        best_key = None
+        for offset in self._candidate_offsets(r1, r2):
+            start = max(0, offset)
+            end = min(len(r1), offset + len(r2))
+            overlap = end - start
+            if overlap < self.min_overlap:
+                continue
+            mismatches = count_mismatches(r1[start:end], r2[start - offset:end - offset])
+            rate = mismatches / overlap
+            if rate > self.max_mismatch_rate:
+                continue
+            key = (rate, -overlap)
+            if best_key is None or key < best_key:
+                best, best_key = offset, key
+        return best
+
+    def _candidate_offsets(self, r1: bytes, r2: bytes) -> Set[int]:
+        k = self.seed_length
+        offsets = set()
+        for target, query, sign in ((r1, r2, 1), (r2, r1, -1)):
+            for start in range(0, len(query) - k + 1, k):
+                seed = query[start:start + k]
+                pos = target.find(seed)
+                while pos != -1:
+                    offsets.add(sign * (pos - start))
+                    pos = target.find(seed, pos + 1)
+        return offsets
+
+    def _build(self, r1_seq: bytes, r1_qual: bytes, r2_seq: bytes, r2_qual: bytes,
+               offset: int) -> Tuple[bytes, bytes]:
+        start = max(0, offset)
+        end = min(len(r1_seq), offset + len(r2_seq))
+        seq1, qual1 = r1_seq[start:end], r1_qual[start:end]
+        seq2, qual2 = r2_seq[start - offset:end - offset], r2_qual[start - offset:end - offset]
+
+        if seq1 == seq2:
+            overlap_seq, overlap_qual = seq1, bytes(map(max, qual1, qual2))
+        else:
+            merged_seq = bytearray(seq1)
+            merged_qual = bytearray(map(max, qual1, qual2))
+            for i, (b1, b2) in enumerate(zip(seq1, seq2)):
+                if b1 != b2:
+                    q1, q2 = qual1[i], qual2[i]
+                    merged_seq[i] = b1 if q1 >= q2 else b2
+                    merged_qual[i] = max(abs(q1 - q2), _MIN_MERGED_QUALITY) + PHRED_OFFSET
+            overlap_seq, overlap_qual = bytes(merged_seq), bytes(merged_qual)
+
+        # Only R1 covers the insert before the overlap, only R2 after it
+        tail = end - offset
+        return (r1_seq[:start] + overlap_seq + r2_seq[tail:],
+                r1_qual[:start] + overlap_qual + r2_qual[tail:])
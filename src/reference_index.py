@@ -0,0 +1,257 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import json
+import logging
+import os
+import numpy as np
+
+from .primer_matcher import encode_matrix, kmer_codes
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Bump when the minimizer scheme or the saved layout changes
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.minimizers.npz'
+MAX_KMER = 31
+# Long reference sequences are minimized in pieces of this many bases
+_PIECE_BASES = 1 << 16
+_NO_HASH = np.iinfo(np.uint64).max
+
+
+class ReferenceIndex:
+    """Minimizer index of the expected amplicons and, optionally, larger genome regions.
+
+    Every k-mer is taken on its canonical strand and hashed, and the smallest
+    hash of each window of consecutive k-mers is a minimizer. The index holds
+    every distinct (minimizer, target) pair as arrays sorted by minimizer, so
+    a batch of reads is looked up with one searchsorted. Each distinct
+    minimizer of a read is a vote for every target containing it; the read is
+    assigned to the target with most votes if it has at least min_hits.
+    Amplicons win ties, as the genome regions containing them get the same
+    votes for on-target reads.
+    """
+
+    # Indexes loaded in this process, keyed on their source files and parameters
+    _loaded: Dict[str, 'ReferenceIndex'] = {}
+
+    def __init__(self, names: List[str], amplicon: np.ndarray, keys: np.ndarray, targets: np.ndarray,
+                 kmer: int, window: int, source: str = ''):
+        self.names = names
+        self.amplicon = amplicon
+        self.keys = keys
+        self.targets = targets
+        self.kmer = kmer
+        self.window = window
+        self.source = source
+        # Distinct minimizers with where their entries start and how many there are
+        self._distinct, self._first = np.unique(keys, return_index=True)
+        self._hits = np.diff(np.append(self._first, len(keys)))
+
+    @classmethod
+    def build(cls, amplicon_file: str, genome_file: Optional[str] = None, kmer: int = 15,
+              window: int = 10, source: str = '') -> 'ReferenceIndex':
+        """Index the records of amplicon_file as amplicons and those of genome_file as genome regions."""
+        if not 0 < kmer <= MAX_KMER or window < 1:
+            raise ValueError(f"Invalid minimizer parameters k={kmer}, w={window}; need 0 < k <= {MAX_KMER}, w >= 1")
+        names, amplicon, keys, targets = [], [], [], []
+        for path, is_amplicon in ((amplicon_file, True), (genome_file, False)):
+            if not path:
+                continue
+            for name, sequence in _load_fasta(path):
+                hashes = np.unique(np.concatenate([_sequence_minimizers(sequence, kmer, window),
+                                                   _end_minimizers(sequence, kmer, window)]))
+                keys.append(hashes)
+                targets.append(np.full(len(hashes), len(names), dtype=np.int32))
+                names.append(name)
+                amplicon.append(is_amplicon)
+        if not names:
+            raise ValueError(f"No reference sequences found in {amplicon_file}")
+        keys, targets = np.concatenate(keys), np.concatenate(targets)
+        order = np.lexsort((targets, keys))
+        logger.info(f"Indexed {len(names)} reference sequences: {len(keys):,} minimizers")
+        return cls(names, np.array(amplicon, dtype=bool), keys[order], targets[order], kmer, window, source)
+
+    @classmethod
+    def for_config(cls, config: Dict) -> Optional['ReferenceIndex']:
+        """The index of config's reference files, or None without reference_file.
+
+        Indexes are built once and saved to reference_index (default: next to
+        reference_file), then loaded from there by later runs as long as the
+        reference files (path, size and mtime) and parameters are unchanged.
+        Within a process each index is loaded once.
+        """
+        if not config.get('reference_file'):
+            return None
+        kmer, window = config.get('reference_kmer', 15), config.get('reference_window', 10)
+        files = [config['reference_file'], config.get('genome_reference_file')]
+        source = json.dumps({
+            'version': INDEX_VERSION,
+            'files': [_file_stamp(path) if path else None for path in files],
+            'kmer': kmer,
+            'window': window
+        }, sort_keys=True)
+        if source not in cls._loaded:
+            path = Path(config.get('reference_index') or f"{config['reference_file']}{INDEX_SUFFIX}")
+            cls._loaded[source] = cls._load_or_build(path, source, *files, kmer, window)
+        return cls._loaded[source]
+
+    @classmethod
+    def _load_or_build(cls, path: Path, source: str, amplicon_file: str, genome_file: Optional[str],
+                       kmer: int, window: int) -> 'ReferenceIndex':
+        try:
+            index = cls.load(path)
+            if index.source == source:
+                logger.info(f"Loaded reference index {path}")
+                return index
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Reference index {path} is unusable, rebuilding: {str(e)}")
+        with instrumentation.stage('reference_index'):
+            index = cls.build(amplicon_file, genome_file, kmer, window, source)
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.warning(f"Could not save reference index to {path}: {str(e)}")
+        return index
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        # Written under a temporary name first so concurrent runs never load a partial index
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, names=np.array(self.names, dtype=str), amplicon=self.amplicon,
+                 keys=self.keys, targets=self.targets, kmer=np.array(self.kmer),
+                 window=np.array(self.window), source=np.array(self.source))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'ReferenceIndex':
+        with np.load(path) as data:
+            return cls(data['names'].tolist(), data['amplicon'], data['keys'], data['targets'],
+                       int(data['kmer']), int(data['window']), str(data['source']))
+
+    def classify_batch(self, sequences: Sequence[Union[str, bytes]], min_hits: int = 3,
+                       chunk_size: int = 8192) -> np.ndarray:
+        """Index of the target each read is assigned to, -1 for unmapped reads."""
+        assigned = np.full(len(sequences), -1, dtype=np.int64)
+        n_targets = len(self.names)
+        for start in range(0, len(sequences), chunk_size):
+            reads = [s.encode('ascii') if isinstance(s, str) else s
+                     for s in sequences[start:start + chunk_size]]
+            matrix = encode_matrix(reads, np.fromiter(map(len, reads), dtype=np.int64, count=len(reads)))
+            rows, hashes = _read_minimizers(matrix, self.kmer, self.window)
+
+            # Every (read, target) pair sharing a minimizer, one per shared minimizer
+            found = np.minimum(np.searchsorted(self._distinct, hashes), len(self._distinct) - 1)
+            hits = np.where(self._distinct[found] == hashes, self._hits[found], 0)
+            first = self._first[found]
+            total = int(hits.sum())
+            if not total:
+                continue
+            ends = np.cumsum(hits)
+            positions = np.arange(total) - np.repeat(ends - hits, hits) + np.repeat(first, hits)
+            pairs, votes = np.unique(np.repeat(rows, hits) * n_targets + self.targets[positions],
+                                     return_counts=True)
+            read, target = np.divmod(pairs, n_targets)
+
+            # Best target per read: most votes, then amplicons, then the lowest index
+            order = np.lexsort((target, ~self.amplicon[target], -votes, read))
+            best = order[np.r_[True, read[order][1:] != read[order][:-1]]]
+            best = best[votes[best] >= min_hits]
+            assigned[start + read[best]] = target[best]
+        return assigned
+
+
+def _load_fasta(path: str) -> List[Tuple[str, bytes]]:
+    from Bio import SeqIO
+    return [(record.id, str(record.seq).upper().encode('ascii')) for record in SeqIO.parse(path, 'fasta')]
+
+
+def _file_stamp(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def _sequence_minimizers(sequence: bytes, kmer: int, window: int) -> np.ndarray:
+    """Minimizer hashes of one, possibly chromosome-sized, sequence."""
+    # Overlapping pieces, so every window of k-mers lies entirely in some piece
+    overlap = kmer + window - 2
+    step = _PIECE_BASES - overlap
+    pieces = [sequence[start:start + _PIECE_BASES]
+              for start in range(0, max(len(sequence) - overlap, 1), step)]
+    matrix = encode_matrix(pieces, np.fromiter(map(len, pieces), dtype=np.int64, count=len(pieces)))
+    return _read_minimizers(matrix, kmer, window)[1]
+
+
+def _end_minimizers(sequence: bytes, kmer: int, window: int) -> np.ndarray:
+    """Minimizers of the partial windows at both ends of a sequence.
+
+    A read starting at the start of an amplicon shares its first windows with
+    it, but a genome region containing the amplicon also has windows reaching
+    past the amplicon's ends. Their minimizers inside the amplicon are always
+    minimizers of some first or last partial window of the amplicon, so
+    indexing those keeps amplicons from losing votes to the region.
+    """
+    edge = kmer + window - 2
+    hashes = _kmer_hashes(encode_matrix([sequence[:edge], sequence[-edge:]],
+                                        np.full(2, min(edge, len(sequence)), dtype=np.int64)), kmer)
+    ends = np.concatenate([np.minimum.accumulate(hashes[0]), np.minimum.accumulate(hashes[1][::-1])])
+    return ends[ends != _NO_HASH]
+
+
+def _kmer_hashes(matrix: np.ndarray, kmer: int) -> np.ndarray:
+    """Hashes of the canonical k-mers of every row of a uint8 sequence matrix, _NO_HASH for non-ACGT k-mers."""
+    codes = kmer_codes(matrix, kmer)
+    forward = codes.astype(np.uint64)
+    hashes = _hash(np.minimum(forward, _reverse_complement(forward, kmer)))
+    hashes[codes < 0] = _NO_HASH
+    return hashes
+
+
+def _read_minimizers(matrix: np.ndarray, kmer: int, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, hash) of the distinct minimizers of every row of a uint8 sequence matrix.
+
+    Rows shorter than a full window of k-mers get the minimizer of the k-mers they have.
+    """
+    hashes = _kmer_hashes(matrix, kmer)
+    if not hashes.shape[1]:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+    minimizers = _sliding_min(hashes, min(window, hashes.shape[1]))
+    minimizers.sort(axis=1)
+    keep = minimizers != _NO_HASH
+    keep[:, 1:] &= minimizers[:, 1:] != minimizers[:, :-1]
+    rows, cols = np.nonzero(keep)
+    return rows, minimizers[rows, cols]
+
+
+def _sliding_min(values: np.ndarray, window: int) -> np.ndarray:
+    """Minimum of every window of consecutive columns, from minima over doubling spans."""
+    span = 1
+    while span * 2 <= window:
+        values = np.minimum(values[:, :-span], values[:, span:])
+        span *= 2
+    if span == window:
+        return values
+    # Two overlapping spans cover each window
+    return np.minimum(values[:, :values.shape[1] - window + span], values[:, window - span:])
+
+
+def _reverse_complement(codes: np.ndarray, kmer: int) -> np.ndarray:
+    """2-bit codes of the reverse complements of k-mer codes."""
+    codes = codes ^ np.uint64((1 << (2 * kmer)) - 1)
+    # Reverse the 2-bit groups of each 64-bit word, then drop the unused low bits
+    pairs, nibbles = np.uint64(0x3333333333333333), np.uint64(0x0F0F0F0F0F0F0F0F)
+    codes = ((codes >> np.uint64(2)) & pairs) | ((codes & pairs) << np.uint64(2))
+    codes = ((codes >> np.uint64(4)) & nibbles) | ((codes & nibbles) << np.uint64(4))
+    return codes.byteswap() >> np.uint64(64 - 2 * kmer)
+
+
+def _hash(codes: np.ndarray) -> np.ndarray:
+    """Invertible 64-bit mix (splitmix64), so minimizers do not favour low-complexity k-mers."""
+    codes = codes ^ (codes >> np.uint64(30))
+    codes *= np.uint64(0xBF58476D1CE4E5B9)
+    codes ^= codes >> np.uint64(27)
+    codes *= np.uint64(0x94D049BB133111EB)
+    return codes ^ (codes >> np.uint64(31))
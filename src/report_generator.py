@@ -62,11 +62,14 @@
 # src/report_generator.py
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 from pathlib import Path
 import json
-from .visualizer import Visualizer  # Add this import
+import os
+
+from . import instrumentation
+from .dimer_pairs import dimer_pair_table
 
 logger = logging.getLogger(__name__)
 
@@ -74,10 +77,11 @@ class ReportGenerator:
     def __init__(self, output_dir: str):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.visualizer = Visualizer(str(self.output_dir / 'plots'))
         
+    @instrumentation.timed('report_csv')
     def generate_summary_csv(self, results: List[Dict]):
         """Generate summary CSV with multi-sample support."""
+        results = self._tabular(results)
         df = pd.DataFrame(results)
         output_path = self.output_dir / 'summary_statistics.csv'
         df.to_csv(output_path, index=False)
@@ -89,9 +93,13 @@ class ReportGenerator:
             sample_path = self.output_dir / f"{sample_id}_statistics.csv"
             sample_df.to_csv(sample_path, index=False)
             
-    def generate_detailed_report(self, results: List[Dict], config: Dict):
-        """Generate detailed report with multi-sample support."""
-        converted_results = self._convert_to_serializable(results)
+    @instrumentation.timed('report_json')
+    def generate_detailed_report(self, results: List[Dict], config: Dict, run_stats: Dict = None):
+        """Generate detailed report with multi-sample support.
+
+        run_stats holds run-level sections such as 'throughput', added to the report as is.
+        """
+        converted_results = self._convert_to_serializable(self._tabular(results))
         
         # Calculate per-sample statistics
         sample_stats = {}
@@ -110,11 +118,79 @@ class ReportGenerator:
             'configuration': config,
             'methods_description': self._get_methods_description()
         }
+        cache_stats = self._calculate_cache_stats(converted_results)
+        if cache_stats:
+            report['primer_dimer_cache'] = cache_stats
+        for section, stats in (run_stats or {}).items():
+            report[section] = self._convert_to_serializable(stats)
         
         output_path = self.output_dir / 'detailed_report.json'
         with open(output_path, 'w') as f:
             json.dump(report, f, indent=2)
             
+    @instrumentation.timed('report_dimer_pairs')
+    def generate_dimer_pair_report(self, results: List[Dict]) -> List[Path]:
+        """Write each sample's primer-pair dimer counts as sparse CSV and NPZ files.
+
+        dimer_pairs.csv has one row per sample and observed (forward, reverse)
+        primer pair. dimer_pairs.npz holds the same counts in coordinate form:
+        index arrays sample, forward and reverse into the samples and primers
+        arrays, and count. Samples analysed without primers have no pairs.
+        """
+        rows = dimer_pair_table(results)
+        if not rows:
+            return []
+        csv_path = self.output_dir / 'dimer_pairs.csv'
+        pd.DataFrame(rows, columns=['sample_id', 'forward_primer', 'reverse_primer', 'count']) \
+            .sort_values(['sample_id', 'count'], ascending=[True, False]).to_csv(csv_path, index=False)
+        
+        samples = sorted({row['sample_id'] for row in rows})
+        primers = sorted({row[key] for row in rows for key in ('forward_primer', 'reverse_primer')})
+        sample_index = {sample: i for i, sample in enumerate(samples)}
+        primer_index = {primer: i for i, primer in enumerate(primers)}
+        npz_path = self.output_dir / 'dimer_pairs.npz'
+        np.savez_compressed(
+            npz_path,
+            samples=np.array(samples, dtype=str),
+            primers=np.array(primers, dtype=str),
+            sample=np.array([sample_index[row['sample_id']] for row in rows], dtype=np.int64),
+            forward=np.array([primer_index[row['forward_primer']] for row in rows], dtype=np.int64),
+            reverse=np.array([primer_index[row['reverse_primer']] for row in rows], dtype=np.int64),
+            count=np.array([row['count'] for row in rows], dtype=np.int64)
+        )
+        return [csv_path, npz_path]
+            
+    @instrumentation.timed('report_targets')
+    def generate_target_report(self, results: List[Dict]) -> Optional[Path]:
+        """Write the reads assigned to each reference target per sample to target_counts.csv.
+
+        Every expected amplicon is listed, so amplicons without reads show up
+        as dropouts; genome regions are listed where reads mapped to them.
+        Samples analysed without a reference have no rows.
+        """
+        rows = []
+        for result in results:
+            targets = result.get('target_counts')
+            if not targets:
+                continue
+            total_reads = result['total_reads']
+            for name, is_amplicon, count in zip(targets['targets'], np.asarray(targets['amplicon']).tolist(),
+                                                np.asarray(targets['count']).tolist()):
+                if is_amplicon or count:
+                    rows.append({
+                        'sample_id': result['sample_id'],
+                        'target': name,
+                        'role': 'amplicon' if is_amplicon else 'genome',
+                        'count': count,
+                        'percentage': (count / total_reads * 100) if total_reads > 0 else 0
+                    })
+        if not rows:
+            return None
+        output_path = self.output_dir / 'target_counts.csv'
+        pd.DataFrame(rows).sort_values(['sample_id', 'count'], ascending=[True, False]) \
+            .to_csv(output_path, index=False)
+        return output_path
+            
     # def generate_html_report(self, results: List[Dict], config: Dict):
     #     """Generate an HTML report with embedded visualizations."""
     #     template = """
@@ -189,52 +265,53 @@ class ReportGenerator:
     #     with open(self.output_dir / 'report.html', 'w') as f:
     #         f.write(html_content)
 
-    def generate_html_report(self, results: List[Dict], config: Dict):
-        """Generate an HTML report with embedded visualizations."""
+    @instrumentation.timed('report_html')
+    def generate_html_report(self, results: List[Dict], config: Dict, plots: List[Path] = None):
+        """Generate an HTML report embedding the given plot files."""
         template = """<!DOCTYPE html>
 <html>
 <head>
     <title>Amplicon Analysis Report</title>
     <style>
-        body {
+        body {{
             font-family: Arial, sans-serif;
             margin: 20px;
             line-height: 1.6;
-        }
-        .section {
+        }}
+        .section {{
             margin-bottom: 30px;
             padding: 20px;
             background-color: #f8f9fa;
             border-radius: 5px;
-        }
-        .plot {
+        }}
+        .plot {{
             margin: 20px 0;
             padding: 15px;
             background-color: white;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        table {
+        }}
+        table {{
             border-collapse: collapse;
             width: 100%;
             margin: 10px 0;
-        }
-        th, td {
+        }}
+        th, td {{
             border: 1px solid #ddd;
             padding: 12px;
             text-align: left;
-        }
-        th {
+        }}
+        th {{
             background-color: #f2f2f2;
-        }
-        h1, h2, h3 {
+        }}
+        h1, h2, h3 {{
             color: #333;
-        }
-        img {
+        }}
+        img {{
             max-width: 100%;
             height: auto;
             display: block;
             margin: 10px auto;
-        }
+        }}
     </style>
 </head>
 <body>
@@ -247,25 +324,7 @@ class ReportGenerator:
     
     <div class="section">
         <h2>Visualizations</h2>
-        <div class="plot">
-            <h3>Length Distributions</h3>
-            <img src="plots/length_distributions_grid.png" alt="Length Distributions">
-        </div>
-        
-        <div class="plot">
-            <h3>Primer Dimer Comparison</h3>
-            <img src="plots/primer_dimer_comparison.png" alt="Primer Dimer Comparison">
-        </div>
-        
-        <div class="plot">
-            <h3>Quality Metrics Heatmap</h3>
-            <img src="plots/metrics_heatmap.png" alt="Quality Metrics Heatmap">
-        </div>
-        
-        <div class="plot">
-            <h3>Summary Dashboard</h3>
-            <img src="plots/summary_dashboard.png" alt="Summary Dashboard">
-        </div>
+{plot_sections}
     </div>
     
     <div class="section">
@@ -277,7 +336,7 @@ class ReportGenerator:
         
         try:
             # Create summary table
-            df = pd.DataFrame(results)
+            df = pd.DataFrame(self._tabular(results))
             summary_table = df.to_html(classes='summary-table', border=1)
             
             # Create config table
@@ -285,9 +344,13 @@ class ReportGenerator:
             config_df.columns = ['Value']
             config_table = config_df.to_html(classes='config-table', border=1)
             
+            # Create plot sections
+            plot_sections = '\n'.join(self._plot_section(path) for path in plots or [])
+            
             # Generate HTML
             html_content = template.format(
                 summary_table=summary_table,
+                plot_sections=plot_sections,
                 config_table=config_table
             )
             
@@ -299,6 +362,21 @@ class ReportGenerator:
             logger.error(f"Error generating HTML report: {str(e)}")
             raise    
             
+    def _plot_section(self, path: Path) -> str:
+        source = Path(os.path.relpath(path, self.output_dir)).as_posix()
+        title = Path(path).stem.replace('_', ' ').title()
+        return f"""        <div class="plot">
+            <h3>{title}</h3>
+            <img src="{source}" alt="{title}">
+        </div>"""
+
+    def _tabular(self, results: List[Dict]) -> List[Dict]:
+        """Results without per-sample histograms and other non-scalar fields."""
+        return [
+            {k: v for k, v in result.items() if not isinstance(v, (dict, list, np.ndarray))}
+            for result in results
+        ]
+
     def _convert_to_serializable(self, data):
         if isinstance(data, (np.int64, np.int32)):
             return int(data)
@@ -318,8 +396,22 @@ class ReportGenerator:
             'average_primer_dimer_rate': float(df['primer_dimer_percentage'].mean()),
             'average_valid_rate': float((df['valid_amplicon_count'] / df['total_reads']).mean() * 100)
         }
+        if 'peak_memory_mb' in df:
+            stats['max_worker_peak_memory_mb'] = float(df['peak_memory_mb'].max())
         return stats
 
+    def _calculate_cache_stats(self, results: List[Dict]) -> Dict:
+        """Aggregate primer-dimer cache counters, if the samples reported any."""
+        hits = sum(r.get('dimer_cache_hits', 0) for r in results)
+        misses = sum(r.get('dimer_cache_misses', 0) for r in results)
+        if not hits and not misses:
+            return {}
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) * 100
+        }
+
     def _get_methods_description(self) -> str:
         return """Analysis performed using Amplicon Analyzer:
 - Primer dimer detection: Sequences below threshold checked for primer matches
@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, Optional
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+
+from .sample_summary import SampleSummary, SUMMARY_DIR, SUMMARY_SUFFIX, dimer_scan_length, histogram_length
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'result_cache.json'
+# Bump when the content of saved sample summaries changes
+CACHE_VERSION = 3
+_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class ResultCache:
+    """Index of the sample summaries in an output directory and the inputs they came from.
+
+    Each entry maps a sample id to a key over its R1/R2 path, size and mtime
+    (optionally a content hash), the primer set, the reference files and the
+    config fields that shape the summary histograms. Fields only used by SampleSummary.evaluate,
+    such as expected_length or quality_threshold, are not part of the key, so
+    a cached summary is re-evaluated for them instead of re-reading the reads.
+    """
+
+    def __init__(self, output_dir: str, hash_content: bool = False):
+        self.directory = Path(output_dir) / SUMMARY_DIR
+        self.path = self.directory / CACHE_FILE
+        self.hash_content = hash_content
+        self._digests: Dict[tuple, str] = {}
+        self.entries: Dict[str, str] = self._load()
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable result cache {self.path}: {str(e)}")
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def key(self, sample, config: Dict) -> str:
+        """Cache key of a SamplePair analysed with config."""
+        inputs = {
+            'version': CACHE_VERSION,
+            'r1': self._file_key(sample.r1_path),
+            'r2': self._file_key(sample.r2_path),
+            'primers': _file_digest(config['primer_file']) if config.get('primer_file') else None,
+            'histogram_length': histogram_length(config),
+            'dimer_scan_length': dimer_scan_length(config),
+            'reference': self._reference_key(config)
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _reference_key(self, config: Dict) -> Optional[Dict]:
+        """Reference files and mapping parameters, which shape the target counts."""
+        if not config.get('reference_file'):
+            return None
+        return {
+            'amplicons': self._digest(config['reference_file']),
+            'genome': self._digest(config['genome_reference_file'])
+            if config.get('genome_reference_file') else None,
+            'kmer': config.get('reference_kmer', 15),
+            'window': config.get('reference_window', 10),
+            'min_hits': config.get('reference_min_hits', 3)
+        }
+
+    def _file_key(self, path: Path) -> Dict:
+        stat = os.stat(path)
+        key = {'path': str(Path(path).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if self.hash_content:
+            key['sha256'] = self._digest(path)
+        return key
+
+    def _digest(self, path) -> str:
+        """Content hash of path, computed once per path, size and mtime."""
+        stat = os.stat(path)
+        stamp = (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+        if stamp not in self._digests:
+            self._digests[stamp] = _file_digest(path)
+        return self._digests[stamp]
+
+    def get(self, sample, config: Dict) -> Optional[SampleSummary]:
+        """The saved summary of sample if it was built from the same inputs, else None."""
+        if self.entries.get(sample.sample_id) != self.key(sample, config):
+            return None
+        path = self.directory / f"{sample.sample_id}{SUMMARY_SUFFIX}"
+        try:
+            return SampleSummary.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cached summary {path} is unusable, reprocessing: {str(e)}")
+            return None
+
+    def put(self, sample, config: Dict):
+        """Record that the saved summary of sample is up to date."""
+        self.entries[sample.sample_id] = self.key(sample, config)
+        self._write()
+
+    def discard(self, samples: Iterable):
+        """Forget samples whose summaries are about to be overwritten."""
+        removed = [s.sample_id for s in samples if self.entries.pop(s.sample_id, None)]
+        if removed:
+            self._write()
+
+    def _write(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def _file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
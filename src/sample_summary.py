@@ -0,0 +1,192 @@
+from typing import Dict, List
+from dataclasses import dataclass, field
+from pathlib import Path
+import logging
+import numpy as np
+
+from .length_analyzer import LengthAnalyzer, LengthAccumulator
+from .dimer_pairs import DimerPairAccumulator
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_DIR = 'summaries'
+SUMMARY_SUFFIX = '.summary.npz'
+MAX_PHRED = 93
+
+
+def quality_histogram(qualities: np.ndarray) -> np.ndarray:
+    """Histogram of per-read Phred scores, one bin per integer score 0..MAX_PHRED."""
+    scores = np.clip(np.asarray(qualities, dtype=np.int64), 0, MAX_PHRED)
+    return np.bincount(scores, minlength=MAX_PHRED + 1).astype(np.int64)
+
+
+def dimer_scan_length(config: Dict) -> int:
+    """Longest read checked for primer dimers; defaults to max_dimer_length."""
+    return config.get('dimer_scan_length') or config['max_dimer_length']
+
+
+def histogram_length(config: Dict) -> int:
+    """Longest read length given its own histogram bin.
+
+    At least histogram_max_length, and long enough for the valid amplicon
+    range and the dimer scan, so any expected_length can be categorized.
+    """
+    return max(config.get('histogram_max_length', 1000),
+               config['expected_length'] + config['length_tolerance'],
+               dimer_scan_length(config))
+
+
+@dataclass
+class SampleSummary:
+    """Compact per-sample histograms from which all count metrics can be re-derived.
+
+    dimer_length_histogram counts primer-dimer candidates by length for every
+    read up to dimer_scan_length, so max_dimer_length can later be changed up
+    to that length without re-reading the FASTQ files. dimer_pairs holds the
+    sparse (forward primer, reverse primer, length, count) rows of the
+    verified dimers, indexing primer_names. With a reference, target_counts
+    holds the reads assigned to each of target_names, which are expected
+    amplicons where target_amplicon is set and genome regions otherwise.
+    """
+    sample_id: str
+    total_reads: int
+    length_histogram: np.ndarray
+    min_quality_histogram: np.ndarray
+    mean_quality_histogram: np.ndarray
+    dimer_length_histogram: np.ndarray
+    dimer_scan_length: int
+    primer_verified: bool
+    primer_names: List[str] = field(default_factory=list)
+    dimer_pairs: np.ndarray = field(default_factory=lambda: np.zeros((0, 4), dtype=np.int64))
+    target_names: List[str] = field(default_factory=list)
+    target_amplicon: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    target_counts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def evaluate(self, config: Dict) -> Dict:
+        """Per-sample result metrics for config, computed from the histograms alone."""
+        lengths = self._accumulator(self.length_histogram)
+        length_dist = LengthAnalyzer(config['expected_length'], config['length_tolerance']) \
+            .analyze_histogram(lengths)
+
+        max_dimer_length = config['max_dimer_length']
+        if max_dimer_length > self.dimer_scan_length:
+            logger.warning(
+                f"Sample {self.sample_id}: dimer candidates were only scanned up to "
+                f"{self.dimer_scan_length} bp; max_dimer_length {max_dimer_length} is capped"
+            )
+        primer_dimers = self._accumulator(self.dimer_length_histogram) \
+            .count_at_most(self._max_dimer_length(config))
+
+        total_reads = self.total_reads
+        threshold = min(max(config.get('quality_threshold', 0), 0), MAX_PHRED + 1)
+        result = {
+            'sample_id': self.sample_id,
+            'total_reads': total_reads,
+            'primer_dimer_count': primer_dimers,
+            'primer_dimer_percentage': (primer_dimers / total_reads * 100) if total_reads > 0 else 0,
+            'short_offtarget_count': length_dist['short'],
+            'long_offtarget_count': length_dist['long'],
+            'valid_amplicon_count': length_dist['valid'],
+            'reads_passing_quality': int(self.min_quality_histogram[threshold:].sum())
+        }
+        if self.target_names:
+            on_target = int(self.target_counts[self.target_amplicon].sum())
+            off_target = int(self.target_counts[~self.target_amplicon].sum())
+            result.update({
+                'on_target_count': on_target,
+                'on_target_percentage': (on_target / total_reads * 100) if total_reads > 0 else 0,
+                'off_target_mapped_count': off_target,
+                'unmapped_count': total_reads - on_target - off_target
+            })
+        return result
+
+    def result(self, config: Dict) -> Dict:
+        """evaluate() plus the histograms, dimer pair matrix and target counts the reports are drawn from."""
+        result = self.evaluate(config)
+        result['histograms'] = self.histograms()
+        if self.primer_verified:
+            result['dimer_pairs'] = self.dimer_pair_matrix(config)
+        if self.target_names:
+            result['target_counts'] = {
+                'targets': list(self.target_names),
+                'amplicon': self.target_amplicon,
+                'count': self.target_counts
+            }
+        return result
+
+    def dimer_pair_matrix(self, config: Dict) -> Dict:
+        """Sparse primer x primer dimer counts for config's max_dimer_length, with the primer names.
+
+        The counts add up to primer_dimer_count.
+        """
+        matrix = DimerPairAccumulator.from_array(self.dimer_pairs).matrix(self._max_dimer_length(config))
+        matrix['primers'] = list(self.primer_names)
+        return matrix
+
+    def _max_dimer_length(self, config: Dict) -> int:
+        return min(config['max_dimer_length'], self.dimer_scan_length)
+
+    def histograms(self) -> Dict[str, np.ndarray]:
+        return {
+            'length': self.length_histogram,
+            'min_quality': self.min_quality_histogram,
+            'mean_quality': self.mean_quality_histogram,
+            'dimer_length': self.dimer_length_histogram
+        }
+
+    def save(self, output_dir: str) -> Path:
+        directory = Path(output_dir) / SUMMARY_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.sample_id}{SUMMARY_SUFFIX}"
+        np.savez_compressed(
+            path,
+            sample_id=np.array(self.sample_id),
+            total_reads=np.array(self.total_reads),
+            length_histogram=self.length_histogram,
+            min_quality_histogram=self.min_quality_histogram,
+            mean_quality_histogram=self.mean_quality_histogram,
+            dimer_length_histogram=self.dimer_length_histogram,
+            dimer_scan_length=np.array(self.dimer_scan_length),
+            primer_verified=np.array(self.primer_verified),
+            primer_names=np.array(self.primer_names, dtype=str),
+            dimer_pairs=self.dimer_pairs,
+            target_names=np.array(self.target_names, dtype=str),
+            target_amplicon=self.target_amplicon,
+            target_counts=self.target_counts
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'SampleSummary':
+        with np.load(path) as data:
+            return cls(
+                sample_id=str(data['sample_id']),
+                total_reads=int(data['total_reads']),
+                length_histogram=data['length_histogram'],
+                min_quality_histogram=data['min_quality_histogram'],
+                mean_quality_histogram=data['mean_quality_histogram'],
+                dimer_length_histogram=data['dimer_length_histogram'],
+                dimer_scan_length=int(data['dimer_scan_length']),
+                primer_verified=bool(data['primer_verified']),
+                # Summaries written before pair attribution have no pairs
+                primer_names=data['primer_names'].tolist() if 'primer_names' in data else [],
+                dimer_pairs=data['dimer_pairs'] if 'dimer_pairs' in data
+                else np.zeros((0, 4), dtype=np.int64),
+                # Nor those written before reference mapping targets
+                target_names=data['target_names'].tolist() if 'target_names' in data else [],
+                target_amplicon=data['target_amplicon'] if 'target_amplicon' in data
+                else np.zeros(0, dtype=bool),
+                target_counts=data['target_counts'] if 'target_counts' in data
+                else np.zeros(0, dtype=np.int64)
+            )
+
+    @classmethod
+    def load_all(cls, output_dir: str) -> List['SampleSummary']:
+        paths = sorted((Path(output_dir) / SUMMARY_DIR).glob(f"*{SUMMARY_SUFFIX}"))
+        return [cls.load(path) for path in paths]
+
+    @staticmethod
+    def _accumulator(histogram: np.ndarray) -> LengthAccumulator:
+        accumulator = LengthAccumulator(len(histogram) - 2)
+        accumulator.histogram = histogram.astype(np.int64)
+        return accumulator
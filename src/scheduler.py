@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import logging
+import os
+
+from .fastq_reader import FastqReader, FastqFormatError, DEFAULT_BLOCK_SIZE, DEFAULT_PREFETCH_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+# Worker RSS before the first batch: interpreter, numpy and primer tables
+WORKER_BASE_MB = 60
+# Typical gzip compression ratio of FASTQ text
+GZIP_RATIO = 4
+# Peak worker memory per byte of FASTQ text in a batch (records, quality
+# arrays, candidate lists); measured at about 5.6 for 250 bp reads
+BATCH_MEMORY_FACTOR = 6
+# Decompressed blocks queued by the reader thread plus the one being parsed
+READ_AHEAD_MB = (DEFAULT_PREFETCH_BLOCKS + 1) * DEFAULT_BLOCK_SIZE / (1024 * 1024)
+# --split-samples: largest chunk of FASTQ text sent to a worker, and the
+# memory in-flight chunks may take without --max-memory
+SPLIT_CHUNK_MB = 16
+SPLIT_MEMORY_MB = 1024
+# Decompressed text read to size one record
+RECORD_SAMPLE_BYTES = 64 * 1024
+
+
+def compressed_size(sample) -> int:
+    """On-disk size of a sample's R1 and R2 files, the proxy for its processing time."""
+    return os.path.getsize(sample.r1_path) + os.path.getsize(sample.r2_path)
+
+
+def estimate_memory_mb(sample, batch_size: int) -> float:
+    """Estimated peak RSS of a worker streaming sample in batches of batch_size reads.
+
+    Only R1 is read, one batch at a time, so the estimate is the base worker
+    footprint, the reader's read-ahead and one batch, capped at the estimated
+    number of reads in R1.
+    """
+    path = Path(sample.r1_path)
+    record_bytes = _first_record_bytes(path)
+    if not record_bytes:
+        return WORKER_BASE_MB
+    text_bytes = os.path.getsize(path) * (GZIP_RATIO if path.suffix == '.gz' else 1)
+    reads = min(text_bytes / record_bytes, batch_size)
+    read_ahead_mb = min(READ_AHEAD_MB, text_bytes / (1024 * 1024))
+    return WORKER_BASE_MB + read_ahead_mb + reads * record_bytes * BATCH_MEMORY_FACTOR / (1024 * 1024)
+
+
+def _first_record_bytes(path: Path) -> int:
+    """Size of the first record of path as FASTQ text, 0 if it cannot be read natively."""
+    try:
+        record = next(iter(FastqReader(path, block_size=RECORD_SAMPLE_BYTES)))
+    except (StopIteration, FastqFormatError):
+        return 0
+    # Header, sequence, separator and quality lines with their newlines
+    return len(record.name) + 2 * len(record.seq) + 6
+
+
+def split_chunk_size(sample, batch_size: int) -> Tuple[int, int]:
+    """(bytes of FASTQ text, records) per chunk of sample in --split-samples mode.
+
+    About batch_size records, but at most SPLIT_CHUNK_MB, so chunks stay
+    small enough to spread over the workers and bound their memory.
+    """
+    max_bytes = SPLIT_CHUNK_MB * 1024 * 1024
+    record_bytes = _first_record_bytes(Path(sample.r1_path))
+    if not record_bytes:
+        return max_bytes, batch_size
+    records = max(1, min(batch_size, max_bytes // record_bytes))
+    return records * record_bytes, records
+
+
+def max_batches_in_flight(chunk_bytes: int, max_workers: int,
+                          max_memory_mb: Optional[float] = None) -> int:
+    """Chunks of chunk_bytes that may be queued at once in --split-samples mode.
+
+    Two per worker keep every worker busy. Each in-flight chunk counts as
+    the peak memory of analysing it against SPLIT_MEMORY_MB, or under a
+    memory budget against what is left after the base footprint of the
+    workers and the reader's read-ahead; at least one is always allowed.
+    """
+    chunk_mb = chunk_bytes * BATCH_MEMORY_FACTOR / (1024 * 1024)
+    available = SPLIT_MEMORY_MB if max_memory_mb is None \
+        else max_memory_mb - max_workers * WORKER_BASE_MB - READ_AHEAD_MB
+    return max(1, min(max_workers * 2, int(available // chunk_mb)))
+
+
+class SampleScheduler:
+    """Largest-first admission of samples under a worker count and a memory budget.
+
+    Samples are started in order of decreasing compressed size (longest
+    processing time first), so a large sample never starts last and holds up
+    the run. A sample is admitted only while its estimated memory fits in
+    max_memory_mb next to the running ones; when nothing else is running the
+    next sample is always admitted, even if it exceeds the budget on its own.
+    Without max_memory_mb no estimates are made and only max_workers applies.
+    """
+
+    def __init__(self, samples: List, max_workers: int, batch_size: int,
+                 max_memory_mb: Optional[float] = None):
+        self.max_workers = max_workers
+        self.max_memory_mb = max_memory_mb
+        self.pending = sorted(samples, key=compressed_size, reverse=True)
+        self.estimates: Dict[str, float] = {}
+        if max_memory_mb is not None:
+            self.estimates = {sample.sample_id: estimate_memory_mb(sample, batch_size)
+                              for sample in self.pending}
+        self.running: Dict[str, float] = {}
+
+    @property
+    def memory_in_use_mb(self) -> float:
+        return sum(self.running.values())
+
+    def admit(self) -> List:
+        """Remove and return the pending samples that can start now, largest first."""
+        admitted = []
+        for sample in list(self.pending):
+            if len(self.running) >= self.max_workers:
+                break
+            estimate = self.estimates.get(sample.sample_id, 0.0)
+            if self.running and self.max_memory_mb is not None \
+                    and self.memory_in_use_mb + estimate > self.max_memory_mb:
+                continue
+            if self.max_memory_mb is not None and estimate > self.max_memory_mb:
+                logger.warning(f"Sample {sample.sample_id} needs an estimated {estimate:.0f} MB, "
+                               f"more than --max-memory {self.max_memory_mb:.0f} MB; running it alone")
+            self.pending.remove(sample)
+            self.running[sample.sample_id] = estimate
+            admitted.append(sample)
+        return admitted
+
+    def release(self, sample):
+        self.running.pop(sample.sample_id, None)
@@ -32,39 +32,115 @@
 #         plt.close()
 
 # src/visualizer.py
+import matplotlib
+# Reports are rendered headless, also inside worker processes
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
+import os
+
+from . import instrumentation
+from .dimer_pairs import dimer_pair_table
 
 logger = logging.getLogger(__name__)
 
+PLOT_FORMATS = ('png', 'svg', 'none')
+
 class Visualizer:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, dpi: int = 300, plot_format: str = 'png',
+                 grid_page_size: int = 24, workers: Optional[int] = None):
+        if plot_format not in PLOT_FORMATS:
+            raise ValueError(f"Unknown plot format '{plot_format}', expected one of {PLOT_FORMATS}")
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.dpi = dpi
+        self.plot_format = plot_format
+        self.grid_page_size = grid_page_size
+        self.workers = workers
         
         # Set default style
         sns.set_theme(style="whitegrid")
         plt.style.use('default')
+
+    @classmethod
+    def from_config(cls, output_dir: str, config) -> 'Visualizer':
+        return cls(output_dir, dpi=config.plot_dpi, plot_format=config.plot_format,
+                   grid_page_size=config.plot_grid_page_size, workers=config.plot_workers)
+        
+    def create_visualizations(self, results: List[Dict]) -> List[Path]:
+        """Create all visualizations for the analysis and return the written files.
+
+        The figures are independent, so with more than one worker each one
+        (and each page of the length grid) is rendered in its own process.
+        """
+        if self.plot_format == 'none':
+            return []
+        
+        tasks = [('plot_length_distributions_grid', page_results, page)
+                 for page, page_results in self._grid_pages(results)]
+        tasks += [(method, results) for method in (
+            'plot_primer_dimer_comparison', 'plot_sample_metrics_heatmap',
+            'plot_quality_distribution', 'create_summary_dashboard')]
+        if dimer_pair_table(results):
+            tasks.append(('plot_dimer_pair_heatmap', results))
+        workers = min(self.workers or os.cpu_count() or 1, len(tasks))
         
-    def create_visualizations(self, results: List[Dict]):
-        """Create all visualizations for the analysis."""
         try:
-            self.plot_length_distributions_grid(results)
-            self.plot_primer_dimer_comparison(results)
-            self.plot_sample_metrics_heatmap(results)
-            self.plot_quality_distribution(results)
-            self.create_summary_dashboard(results)
+            with instrumentation.stage('plots', items=len(tasks)):
+                if workers > 1:
+                    options = (self.output_dir, self.dpi, self.plot_format, self.grid_page_size)
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(_render, options, method, *args)
+                                   for method, *args in tasks]
+                        return [future.result() for future in futures]
+                return [getattr(self, method)(*args) for method, *args in tasks]
         except Exception as e:
             logger.error(f"Error creating visualizations: {str(e)}")
             raise
 
-    def plot_length_distributions_grid(self, results: List[Dict]):
-        """Create a grid of length distribution plots for all samples."""
+    def _grid_pages(self, results: List[Dict]):
+        """(page number or None, results) per length grid figure."""
+        if len(results) <= self.grid_page_size:
+            return [(None, results)]
+        return [(number, results[start:start + self.grid_page_size])
+                for number, start in enumerate(range(0, len(results), self.grid_page_size), 1)]
+
+    def _save(self, fig, name: str) -> Path:
+        path = self.output_dir / f"{name}.{self.plot_format}"
+        fig.savefig(path, dpi=self.dpi, bbox_inches='tight')
+        plt.close(fig)
+        return path
+
+    def plot_length_distribution(self, length_histogram: np.ndarray, sample_id: str,
+                                 dimer_threshold: int, expected_length: int,
+                                 tolerance: int) -> Optional[Path]:
+        """Plot the read length histogram of one sample with the analysis regions marked."""
+        if self.plot_format == 'none':
+            return None
+        fig, ax = plt.subplots(figsize=(12, 6))
+        self._plot_length_histogram(ax, length_histogram)
+        
+        # Add vertical lines for regions
+        ax.axvline(x=dimer_threshold, color='r', linestyle='--', label='Dimer Threshold')
+        ax.axvline(x=expected_length, color='g', linestyle='-', label='Expected Length')
+        ax.axvspan(expected_length - tolerance, expected_length + tolerance,
+                   alpha=0.2, color='g', label='Valid Range')
+        
+        ax.set_title(f'Read Length Distribution - Sample {sample_id}')
+        ax.set_xlabel('Sequence Length (bp)')
+        ax.set_ylabel('Count')
+        ax.legend()
+        
+        return self._save(fig, f"{sample_id}_length_distribution")
+
+    def plot_length_distributions_grid(self, results: List[Dict], page: Optional[int] = None) -> Path:
+        """Create a grid of length distribution plots for all samples, or for one page of them."""
         n_samples = len(results)
         n_cols = min(3, n_samples)
         n_rows = (n_samples + n_cols - 1) // n_cols
@@ -79,15 +155,8 @@ class Visualizer:
             row = idx // n_cols
             col = idx % n_cols
             
-            # Create dummy length distribution if not present
-            lengths = [100] * result['total_reads']  # Default length for demonstration
-            
-            # Plot distribution
-            sns.histplot(
-                data=lengths,
-                ax=axes[row, col],
-                bins=50
-            )
+            # Plot the pre-binned length histogram
+            self._plot_length_histogram(axes[row, col], result.get('histograms', {}).get('length'))
             
             axes[row, col].set_title(f"Sample: {result['sample_id']}")
             axes[row, col].set_xlabel('Sequence Length (bp)')
@@ -100,10 +169,29 @@ class Visualizer:
             fig.delaxes(axes[row, col])
 
         plt.tight_layout()
-        plt.savefig(self.output_dir / 'length_distributions_grid.png', dpi=300, bbox_inches='tight')
-        plt.close()
+        name = 'length_distributions_grid' if page is None else f'length_distributions_grid_{page:03d}'
+        return self._save(fig, name)
+
+    def _plot_length_histogram(self, ax, histogram: np.ndarray, max_bins: int = 100):
+        """Draw a LengthAccumulator histogram (last bin = overflow) with at most max_bins bars."""
+        if histogram is None or not np.any(histogram):
+            ax.text(0.5, 0.5, 'No length data', ha='center', va='center', transform=ax.transAxes)
+            return
+        
+        counts, overflow = histogram[:-1], int(histogram[-1])
+        occupied = np.flatnonzero(counts)
+        if len(occupied):
+            end = int(occupied[-1]) + 1
+            width = max(1, -(-end // max_bins))
+            n_bins = -(-end // width)
+            padded = np.zeros(n_bins * width, dtype=np.int64)
+            padded[:end] = counts[:end]
+            ax.stairs(padded.reshape(n_bins, width).sum(axis=1), np.arange(n_bins + 1) * width, fill=True)
+        if overflow:
+            ax.text(0.98, 0.95, f'{overflow:,} reads > {len(counts) - 1} bp',
+                    ha='right', va='top', transform=ax.transAxes, fontsize=8)
 
-    def plot_primer_dimer_comparison(self, results: List[Dict]):
+    def plot_primer_dimer_comparison(self, results: List[Dict]) -> Path:
         """Create bar plot comparing primer dimer percentages across samples."""
         plt.figure(figsize=(10, 6))
         
@@ -116,10 +204,9 @@ class Visualizer:
         plt.xticks(rotation=45)
         
         plt.tight_layout()
-        plt.savefig(self.output_dir / 'primer_dimer_comparison.png', dpi=300, bbox_inches='tight')
-        plt.close()
+        return self._save(plt.gcf(), 'primer_dimer_comparison')
 
-    def plot_sample_metrics_heatmap(self, results: List[Dict]):
+    def plot_sample_metrics_heatmap(self, results: List[Dict]) -> Path:
         """Create heatmap of key metrics across samples."""
         metrics = ['primer_dimer_percentage', 'short_offtarget_count', 
                   'long_offtarget_count', 'valid_amplicon_count']
@@ -146,31 +233,58 @@ class Visualizer:
         
         plt.title('Sample Quality Metrics Heatmap')
         plt.tight_layout()
-        plt.savefig(self.output_dir / 'metrics_heatmap.png', dpi=300, bbox_inches='tight')
-        plt.close()
+        return self._save(plt.gcf(), 'metrics_heatmap')
+
+    def plot_dimer_pair_heatmap(self, results: List[Dict], max_primers: int = 40) -> Path:
+        """Heatmap of dimer reads per (forward, reverse) primer pair, summed over samples.
+
+        Large panels are limited to the max_primers primers involved in the
+        most dimers on each axis; the colour scale is logarithmic.
+        """
+        pairs = pd.DataFrame(dimer_pair_table(results),
+                             columns=['sample_id', 'forward_primer', 'reverse_primer', 'count'])
+        matrix = pairs.pivot_table(index='forward_primer', columns='reverse_primer',
+                                   values='count', aggfunc='sum', fill_value=0)
+        matrix = matrix.loc[matrix.sum(axis=1).nlargest(max_primers).index,
+                            matrix.sum(axis=0).nlargest(max_primers).index]
+
+        fig, ax = plt.subplots(figsize=(max(6, 0.3 * matrix.shape[1] + 3),
+                                        max(5, 0.3 * matrix.shape[0] + 2)))
+        sns.heatmap(
+            data=np.log10(matrix + 1),
+            annot=matrix if matrix.size <= 100 else False,
+            fmt='d',
+            cmap='YlOrRd',
+            cbar_kws={'label': 'log10(dimer reads + 1)'},
+            ax=ax
+        )
+        ax.set_title('Primer-Dimer Reads per Primer Pair')
+        ax.set_xlabel('Reverse-complemented primer')
+        ax.set_ylabel('Forward primer')
+        plt.tight_layout()
+        return self._save(fig, 'dimer_pair_heatmap')
 
-    def plot_quality_distribution(self, results: List[Dict]):
-        """Plot quality score distributions across all samples."""
+    def plot_quality_distribution(self, results: List[Dict]) -> Path:
+        """Plot per-read mean quality distributions across all samples."""
         plt.figure(figsize=(10, 6))
         
-        # Create dummy quality scores for demonstration
         for result in results:
-            quality_scores = np.random.normal(30, 5, 1000)  # Dummy quality scores
-            sns.kdeplot(
-                data=quality_scores,
-                label=result['sample_id']
-            )
+            histogram = result.get('histograms', {}).get('mean_quality')
+            if histogram is None or not np.any(histogram):
+                continue
+            plt.plot(np.arange(len(histogram)), histogram / histogram.sum(),
+                     label=result['sample_id'])
         
         plt.title('Quality Score Distribution by Sample')
-        plt.xlabel('Quality Score')
-        plt.ylabel('Density')
-        plt.legend()
+        plt.xlabel('Mean Read Quality (Phred)')
+        plt.ylabel('Fraction of Reads')
+        if plt.gca().get_lines():
+            plt.legend()
         
         plt.tight_layout()
-        plt.savefig(self.output_dir / 'quality_distribution.png', dpi=300, bbox_inches='tight')
-        plt.close()
+        return self._save(plt.gcf(), 'quality_distribution')
 
-    def create_summary_dashboard(self, results: List[Dict]):
+    def create_summary_dashboard(self, results: List[Dict]) -> Path:
         """Create a comprehensive dashboard combining key visualizations."""
         fig = plt.figure(figsize=(15, 10))
         gs = fig.add_gridspec(2, 2)
@@ -192,8 +306,7 @@ class Visualizer:
         self._plot_quality_metrics(results, ax4)
 
         plt.tight_layout()
-        plt.savefig(self.output_dir / 'summary_dashboard.png', dpi=300, bbox_inches='tight')
-        plt.close()
+        return self._save(plt.gcf(), 'summary_dashboard')
 
     # def _plot_summary_stats(self, results: List[Dict], ax):
     #     """Plot summary statistics."""
@@ -275,4 +388,12 @@ class Visualizer:
         # Fix ticklabels warning
         if len(metrics) > 0:
             ax.set_xticks(range(len(metrics)))
-            ax.set_xticklabels(metrics, rotation=45)    
\ No newline at end of file
+            ax.set_xticklabels(metrics, rotation=45)    
+
+
+def _render(options, method: str, *args) -> Path:
+    """Render one figure in a worker process."""
+    output_dir, dpi, plot_format, grid_page_size = options
+    visualizer = Visualizer(output_dir, dpi=dpi, plot_format=plot_format,
+                            grid_page_size=grid_page_size, workers=1)
+    return getattr(visualizer, method)(*args)
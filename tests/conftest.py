@@ -0,0 +1,23 @@
+import gzip
+import pytest
+from src.batch_processor import SamplePair
+
+@pytest.fixture
+def write_sample(tmp_path):
+    """Write a sample's gzipped R1 and R2 FASTQ files to tmp_path and return its SamplePair.
+
+    Reads are given as sequences or as lengths of poly-A reads; qualities
+    default to all 'I'.
+    """
+    def write(sample_id, reads, quals=None, compresslevel=9):
+        seqs = ['A' * read if isinstance(read, int) else read for read in reads]
+        quals = quals or ['I' * len(seq) for seq in seqs]
+        paths = []
+        for read in ('R1', 'R2'):
+            path = tmp_path / f"{sample_id}_{read}.fastq.gz"
+            with gzip.open(path, 'wt', compresslevel=compresslevel) as handle:
+                for i, (seq, qual) in enumerate(zip(seqs, quals)):
+                    handle.write(f"@{i}\n{seq}\n+\n{qual}\n")
+            paths.append(path)
+        return SamplePair(sample_id, *paths)
+    return write
@@ -0,0 +1,119 @@
+from src.batch_processor import BatchProcessor
+from src.report_generator import ReportGenerator
+
+CONFIG = {
+    'max_dimer_length': 100,
+    'expected_length': 400,
+    'length_tolerance': 50
+}
+
+def test_process_samples_streams_in_batches(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 300, 400, 420, 600])
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1, batch_size=2)
+    results = processor.process_samples(processor.find_sample_pairs(), CONFIG)
+
+    assert len(results) == 3
+    for result in results:
+        assert result['total_reads'] == 5
+        assert result['primer_dimer_count'] == 1
+        assert result['short_offtarget_count'] == 2
+        assert result['valid_amplicon_count'] == 2
+        assert result['long_offtarget_count'] == 1
+        assert result['peak_memory_mb'] > 0
+
+def test_split_samples_matches_per_sample_mode(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 300, 400, 420, 600] * 3)
+
+    per_sample = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=2, batch_size=4)
+    chunked = BatchProcessor(str(tmp_path), str(tmp_path / 'out_chunked'), max_workers=2, batch_size=4,
+                             split_samples=True)
+    pairs = per_sample.find_sample_pairs()
+
+    def counts(results):
+        return sorted((r['sample_id'], r['total_reads'], r['primer_dimer_count'],
+                       r['short_offtarget_count'], r['valid_amplicon_count'],
+                       r['long_offtarget_count']) for r in results)
+
+    chunked_results = chunked.process_samples(pairs, CONFIG)
+    assert counts(chunked_results) == counts(per_sample.process_samples(pairs, CONFIG))
+    assert all(r['peak_memory_mb'] > 0 for r in chunked_results)
+
+def test_primer_file_enables_primer_dimer_detection(tmp_path, write_sample):
+    primer_file = tmp_path / 'primers.fasta'
+    primer_file.write_text(">F\nACGTTGCAAGGT\n>R\nTTGACCAGTACG\n")
+    dimer = 'ACGTTGCAAGGT' + 'ACCTTGCAACGT'
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [dimer, 60, 'C' * 400])
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1)
+    results = processor.process_samples(processor.find_sample_pairs(),
+                                        {**CONFIG, 'primer_file': str(primer_file)})
+    assert [r['primer_dimer_count'] for r in results] == [1, 1, 1]
+    for result in results:
+        pairs = result['dimer_pairs']
+        assert pairs['primers'] == ['F', 'R']
+        assert (pairs['forward'].tolist(), pairs['reverse'].tolist(), pairs['count'].tolist()) \
+            == ([0], [0], [1])
+
+def test_dereplication_gives_identical_counts(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 80, 300, 400, 400, 420, 600])
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1, force=True)
+    pairs = processor.find_sample_pairs()
+    keys = ['total_reads', 'primer_dimer_count', 'short_offtarget_count',
+            'valid_amplicon_count', 'long_offtarget_count']
+    plain = processor.process_samples(pairs, CONFIG)
+    derep = processor.process_samples(pairs, {**CONFIG, 'dereplicate': True})
+    assert [[r[k] for k in keys] for r in derep] == [[r[k] for k in keys] for r in plain]
+
+def test_worker_tasks_use_the_initializer_config(tmp_path, monkeypatch):
+    import src.batch_processor as batch_processor
+    (tmp_path / "primers.fasta").write_text(">F\nACGTACGTACGT\n>R\nTGCATGCATGCA\n")
+    config = {**CONFIG, 'primer_file': str(tmp_path / "primers.fasta")}
+    monkeypatch.setattr(batch_processor, '_worker_config', None)
+    monkeypatch.setattr(batch_processor, '_worker_analyzer', None)
+    batch_processor._init_worker(None, None, config)
+
+    sequences = [b"ACGTACGTACGTTGCATGCATGCA", b"A" * 400]
+    tally = BatchProcessor._analyze_batch(sequences, [b"I" * len(s) for s in sequences])
+    assert tally.counts['total_reads'] == 2
+    assert tally.dimer_lengths.total == 1
+    assert tally.counts['dimer_cache_misses'] == 1
+
+    # The worker's analyzer, and its dimer cache, carry over to the next batch
+    tally = BatchProcessor._analyze_batch(sequences, [b"I" * len(s) for s in sequences])
+    assert (tally.counts['dimer_cache_hits'], tally.counts['dimer_cache_misses']) == (1, 0)
+    assert tally.peak_memory_mb > 0
+
+def test_reference_mapping_counts_targets(tmp_path, write_sample):
+    amplicon = 'ACGGTCATGCCTAGGATCCAGTTGCAAGCTTGACGTATCGGCATTAGCCTAGCAATCGGTACCGTTAGCATGCAAT'
+    (tmp_path / 'amplicons.fasta').write_text(f">amp1\n{amplicon}\n>amp2\n{'GATTACA' * 12}\n")
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [amplicon, amplicon, 80])
+
+    config = {**CONFIG, 'reference_file': str(tmp_path / 'amplicons.fasta'),
+              'reference_index': str(tmp_path / 'out' / 'index.npz')}
+    (tmp_path / 'out').mkdir()
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1)
+    results = processor.process_samples(processor.find_sample_pairs(), config)
+    for result in results:
+        assert (result['on_target_count'], result['off_target_mapped_count'], result['unmapped_count']) == (2, 0, 1)
+        assert result['target_counts']['count'].tolist() == [2, 0]
+
+    lines = ReportGenerator(str(tmp_path / 'out')).generate_target_report(results).read_text().splitlines()
+    assert lines[0] == 'sample_id,target,role,count,percentage'
+    assert lines[1:3] == ['s1,amp1,amplicon,2,66.66666666666666', 's1,amp2,amplicon,0,0.0']
+
+def test_amplicons_longer_than_the_default_histogram(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 1000, 1150, 1250, 1400])
+
+    config = {'max_dimer_length': 100, 'expected_length': 1200, 'length_tolerance': 100}
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1)
+    results = processor.process_samples(processor.find_sample_pairs(), config)
+    assert [(r['short_offtarget_count'], r['valid_amplicon_count'], r['long_offtarget_count'])
+            for r in results] == [(2, 2, 1)] * 3
@@ -0,0 +1,35 @@
+from benchmarks.synthetic import SyntheticSpec, generate_pairs, write_sample
+from benchmarks.run_benchmarks import compare
+from src.fastq_reader import FastqReader
+from src.primer_analyzer import PrimerAnalyzer
+
+PRIMERS = ["ACGTACGTACGT", "TGCATGCATGCA"]
+
+
+def test_synthetic_samples_are_deterministic(tmp_path):
+    spec = SyntheticSpec(n_reads=200, seed=3)
+    first = write_sample(tmp_path / "a", "s", spec, PRIMERS)
+    second = write_sample(tmp_path / "b", "s", spec, PRIMERS)
+    for read in ('R1', 'R2'):
+        assert first[read].read_bytes() == second[read].read_bytes()
+    r1 = list(FastqReader(first['R1']))
+    r2 = list(FastqReader(first['R2']))
+    assert len(r1) == len(r2) == 200
+    assert all(len(r.seq) == len(r.qual) <= spec.read_length for r in r1 + r2)
+
+
+def test_synthetic_dimer_fraction_is_detected():
+    spec = SyntheticSpec(n_reads=2000, dimer_fraction=0.1, seed=1)
+    r1, _ = generate_pairs(spec, PRIMERS)
+    analyzer = PrimerAnalyzer("tests/data/test_primers.fasta", 100)
+    dimers = analyzer.detect_primer_dimers_batch([seq for seq, _ in r1]).sum()
+    assert 0.08 * spec.n_reads < dimers < 0.12 * spec.n_reads
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {'results': {'small': {'merge': {'seconds': 1.0}, 'parse': {'seconds': 0.01}}}}
+    results = {'results': {'small': {'merge': {'seconds': 1.6}, 'parse': {'seconds': 0.03},
+                                     'report': {'seconds': 5.0}}}}
+    regressions = compare(results, baseline, tolerance=0.5)
+    assert len(regressions) == 1 and regressions[0].startswith('small/merge')
+    assert compare(results, baseline, tolerance=1.0) == []
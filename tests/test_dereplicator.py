@@ -0,0 +1,31 @@
+import random
+from collections import Counter
+from src.dereplicator import Dereplicator
+
+def test_dereplicator_counts_unique_sequences():
+    reads = ["ACGT", "TTTT", "ACGT", "GG", "ACGT"]
+    with Dereplicator() as derep:
+        derep.update(reads)
+        assert dict(derep.items()) == {"ACGT": 3, "TTTT": 1, "GG": 1}
+        assert derep.total_reads == 5
+
+def test_dereplicator_spills_and_merges(tmp_path):
+    rng = random.Random(3)
+    reads = [''.join(rng.choice("ACGT") for _ in range(6)) for _ in range(5000)]
+    with Dereplicator(memory_limit_mb=0.01, spill_dir=str(tmp_path)) as derep:
+        derep.update(reads, chunk_size=250)
+        assert derep._runs
+        items = list(derep.items())
+    assert dict(items) == Counter(reads)
+    assert len(items) == len(set(reads))
+    assert not list(tmp_path.iterdir())
+
+def test_dereplicator_spills_bytes_sequences(tmp_path):
+    rng = random.Random(5)
+    reads = [''.join(rng.choice("ACGT") for _ in range(6)).encode('ascii') for _ in range(2000)]
+    with Dereplicator(memory_limit_mb=0.01, spill_dir=str(tmp_path)) as derep:
+        derep.update(reads, chunk_size=100)
+        assert len(derep._runs) > 1
+        items = list(derep.items())
+    assert dict(items) == Counter(reads)
+    assert len(items) == len(set(reads))
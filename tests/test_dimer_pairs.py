@@ -0,0 +1,35 @@
+import numpy as np
+from src.dimer_pairs import DimerPairAccumulator, dimer_pair_table
+from src.report_generator import ReportGenerator
+
+def test_update_merge_and_matrix():
+    first, second = DimerPairAccumulator(), DimerPairAccumulator()
+    first.update(np.array([[0, 1], [0, 1], [2, 2]]), [30, 30, 90])
+    second.update(np.array([[0, 1], [1500, 0]]), [45, 30], counts=[3, 2])
+    merged = first.merge(second)
+
+    assert merged.total == 8
+    assert merged.as_array().tolist() == [[0, 1, 30, 2], [0, 1, 45, 3], [2, 2, 90, 1], [1500, 0, 30, 2]]
+    assert DimerPairAccumulator.from_array(merged.as_array()).as_array().tolist() == merged.as_array().tolist()
+
+    matrix = merged.matrix(max_length=60)
+    assert (matrix['forward'].tolist(), matrix['reverse'].tolist(), matrix['count'].tolist()) \
+        == ([0, 1500], [1, 0], [5, 2])
+    assert merged.matrix()['count'].sum() == merged.total
+
+def test_report_writes_csv_and_npz(tmp_path):
+    accumulator = DimerPairAccumulator()
+    accumulator.update(np.array([[0, 1], [1, 1], [1, 1]]), [40, 40, 40])
+    results = [{'sample_id': sample_id, 'dimer_pairs': {**accumulator.matrix(), 'primers': ['A', 'B', 'C']}}
+               for sample_id in ('s1', 's2')]
+    results.append({'sample_id': 's3'})
+
+    assert [(row['sample_id'], row['forward_primer'], row['reverse_primer'], row['count'])
+            for row in dimer_pair_table(results)] == [('s1', 'A', 'B', 1), ('s1', 'B', 'B', 2),
+                                                      ('s2', 'A', 'B', 1), ('s2', 'B', 'B', 2)]
+
+    csv_path, npz_path = ReportGenerator(str(tmp_path)).generate_dimer_pair_report(results)
+    assert csv_path.read_text().splitlines()[1] == 's1,B,B,2'
+    with np.load(npz_path) as data:
+        assert data['primers'].tolist() == ['A', 'B']
+        assert data['count'].sum() == 6
@@ -0,0 +1,58 @@
+import random
+from click.testing import CliRunner
+from src.cli import screen_dimers
+from src.dimer_screen import DimerScreen, screen_primers
+
+_PAIRS = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
+
+def _reference(a, b):
+    """Longest 3'-anchored complementary run and most complementary bases, by brute force."""
+    b_rc = ''.join(_PAIRS.get(c, 'N') for c in reversed(b))
+    three_prime = complementarity = 0
+    for offset in range(1 - len(b), len(a)):
+        paired = [a[k] == b_rc[k - offset] and a[k] in _PAIRS
+                  for k in range(max(0, offset), min(len(a), len(b) + offset))]
+        complementarity = max(complementarity, sum(paired))
+        runs = []
+        if offset >= 0:
+            runs.append(paired)
+        if len(a) <= len(b) + offset:
+            runs.append(paired[::-1])
+        for run in runs:
+            three_prime = max(three_prime, next((k for k, p in enumerate(run) if not p), len(run)))
+    return three_prime, complementarity
+
+def test_scores_match_brute_force():
+    rng = random.Random(24)
+    for _ in range(10):
+        primers = {f'p{i}': ''.join(rng.choice('ACGTN') for _ in range(rng.randint(1, 40)))
+                   for i in range(6)}
+        primers['self'] = 'ACGTACGTAAGCTT'
+        screen = DimerScreen.compute(primers)
+        for i, a in enumerate(primers.values()):
+            for j, b in enumerate(primers.values()):
+                assert (screen.three_prime[i, j], screen.complementarity[i, j]) == _reference(a, b)
+
+def test_cached_screen_and_observed_counts(tmp_path):
+    primers = {'F': 'ACGTTGCAAGGT', 'R': 'TTGACCAGTACG', 'X': 'GGGGGGCCCAAA'}
+    screen = screen_primers(primers, tmp_path)
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    assert (screen_primers(primers, tmp_path).three_prime == screen.three_prime).all()
+
+    rows = screen.table(min_three_prime=100, observed={('R', 'F'): 3, ('F', 'R'): 2, ('Q', 'F'): 9})
+    assert [(row['primer_a'], row['primer_b'], row['observed_dimer_reads']) for row in rows] == [('F', 'R', 5)]
+    runs = [row['three_prime_run'] for row in screen.table()]
+    assert len(runs) == 6 and runs == sorted(runs, reverse=True)
+
+def test_cli_writes_screen(tmp_path):
+    primer_file = tmp_path / 'primers.fasta'
+    primer_file.write_text(">F\nACGTTGCAAGGT\n>R\nTTGACCAGTACG\n")
+    (tmp_path / 'run').mkdir()
+    (tmp_path / 'run' / 'dimer_pairs.csv').write_text(
+        "sample_id,forward_primer,reverse_primer,count\ns1,F,F,7\n")
+    result = CliRunner().invoke(screen_dimers, ['--primers', str(primer_file), '--output', str(tmp_path / 'out'),
+                                                '--observed', str(tmp_path / 'run'), '--min-three-prime', '0'])
+    assert result.exit_code == 0
+    lines = (tmp_path / 'out' / 'dimer_screen.csv').read_text().splitlines()
+    assert lines[0] == 'primer_a,primer_b,three_prime_run,complementary_bases,observed_dimer_reads'
+    assert len(lines) == 4 and any(line.startswith('F,F,') and line.endswith(',7') for line in lines)
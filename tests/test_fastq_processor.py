@@ -16,4 +16,34 @@ def test_fastq_processor_invalid_files():
         "nonexistent_r2.fastq",
         30
     )
-    assert processor.validate_files() == False
\ No newline at end of file
+    assert processor.validate_files() == False
+
+
+def test_vectorized_quality_filter_matches_per_read(tmp_path):
+    import random
+    rng = random.Random(5)
+    complement = str.maketrans("ACGT", "TGCA")
+    records = {'R1': [], 'R2': []}
+    for i in range(300):
+        length = rng.randint(20, 60)
+        seq = ''.join(rng.choice("ACGT") for _ in range(length))
+        # R2 is the reverse complement so every pair merges to the R1 sequence
+        for read, read_seq in (('R1', seq), ('R2', seq.translate(complement)[::-1])):
+            qual = ''.join(chr(33 + (20 if rng.random() < 0.01 else rng.choice([30, 35, 40])))
+                           for _ in range(length))
+            records[read].append((read_seq, qual))
+    for read in records:
+        (tmp_path / f"s_{read}.fastq").write_text(
+            ''.join(f"@{i}\n{seq}\n+\n{qual}\n" for i, (seq, qual) in enumerate(records[read]))
+        )
+
+    processor = FastqProcessor(str(tmp_path / "s_R1.fastq"), str(tmp_path / "s_R2.fastq"), 30,
+                               batch_size=64)
+    expected = []
+    for (s1, q1), (s2, q2) in zip(records['R1'], records['R2']):
+        phred = [ord(c) - 33 for c in q1 + q2]
+        if min(ord(c) - 33 for c in q1) >= 30 and min(ord(c) - 33 for c in q2) >= 30:
+            expected.append((s1, sum(phred) / len(phred)))
+    assert list(processor.process_reads()) == expected
+    assert expected
+    assert processor.merge_stats == {'merged_pairs': len(expected), 'unmerged_pairs': 0}
@@ -0,0 +1,99 @@
+import gzip
+import pytest
+import threading
+from src.fastq_reader import FastqReader, FastqFormatError, prefetched
+
+FASTQ = (
+    "@read1 extra\nACGTACGT\n+\nIIIIIIII\n"
+    "@read2\nTTGCA\n+read2\n#####\n"
+    "@read3\nGGGG\n+\nIII#\n"
+)
+
+def test_native_reader_parses_plain_and_gzip(tmp_path):
+    plain = tmp_path / "reads.fastq"
+    plain.write_text(FASTQ)
+    gz = tmp_path / "reads.fastq.gz"
+    with gzip.open(gz, 'wt') as handle:
+        handle.write(FASTQ)
+
+    for path in (plain, gz):
+        records = list(FastqReader(path, block_size=7))
+        assert [r.name for r in records] == [b"read1", b"read2", b"read3"]
+        assert [r.seq for r in records] == [b"ACGTACGT", b"TTGCA", b"GGGG"]
+        assert records[2].qual == b"III#"
+
+def test_native_reader_handles_crlf_and_missing_final_newline(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_bytes(FASTQ.replace("\n", "\r\n").rstrip().encode())
+    assert [r.seq for r in FastqReader(path, block_size=5)] == [b"ACGTACGT", b"TTGCA", b"GGGG"]
+
+def test_native_reader_batches(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_text(FASTQ)
+    assert [len(b) for b in FastqReader(path).batches(2)] == [2, 1]
+
+def test_native_reader_rejects_malformed_file(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_text("@read1\nACGT\nACGT\n+\nIIIIIIII\n")
+    with pytest.raises(FastqFormatError):
+        list(FastqReader(path))
+
+def test_biopython_engine_matches_native(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_text(FASTQ + "@read4 1:N:0:ACGT\tlane=2\nAC\n+\nII\n@read5\tflowcell\nG\n+\nI\n")
+    native = list(FastqReader(path))
+    assert native == list(FastqReader(path, engine='biopython'))
+    assert [r.name for r in native] == [b"read1", b"read2", b"read3", b"read4", b"read5"]
+
+def test_both_engines_count_bytes_read(tmp_path):
+    gz = tmp_path / "reads.fastq.gz"
+    with gzip.open(gz, 'wt') as handle:
+        handle.write(FASTQ * 50)
+    for engine in ('native', 'biopython'):
+        reader = FastqReader(gz, engine=engine)
+        assert sum(map(len, reader.batches(7))) == 150
+        assert (reader.bytes_read, reader.compressed_bytes_read) == (len(FASTQ) * 50, gz.stat().st_size)
+
+def test_prefetching_reader_matches_inline_reader(tmp_path):
+    gz = tmp_path / "reads.fastq.gz"
+    with gzip.open(gz, 'wt') as handle:
+        handle.write(FASTQ * 50)
+    inline = FastqReader(gz, block_size=16)
+    threaded = FastqReader(gz, block_size=16, prefetch=2)
+    assert list(threaded.batches(7)) == list(inline.batches(7))
+    assert (threaded.bytes_read, threaded.compressed_bytes_read) == \
+        (inline.bytes_read, inline.compressed_bytes_read)
+
+    path = tmp_path / "bad.fastq"
+    path.write_text("@read1\nACGT\nIIII\n@read2\n")
+    with pytest.raises(FastqFormatError):
+        list(FastqReader(path, prefetch=2))
+
+def test_prefetched_propagates_errors_and_stops_when_closed():
+    def failing():
+        yield 1
+        raise OSError("disk gone")
+    with pytest.raises(OSError, match="disk gone"):
+        list(prefetched(failing(), 1))
+
+    produced = []
+    def endless():
+        while True:
+            produced.append(len(produced))
+            yield produced[-1]
+    items = prefetched(endless(), 2)
+    assert next(items) == 0
+    items.close()
+    # The producer is joined on close and stopped at most one item past the bounded queue
+    assert len(produced) <= 4
+    assert not any(t.name == 'prefetch' for t in threading.enumerate())
+
+def test_native_reader_chunks_are_whole_records(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_bytes(FASTQ.replace("\n", "\r\n").rstrip().encode())
+    reader = FastqReader(path, block_size=5)
+    chunks = list(reader.chunks(30))
+    assert len(chunks) > 1
+    assert sum(records for _, records in chunks) == 3
+    parsed = [record for text, records in chunks for record in reader.parse(text)]
+    assert [r.seq for r in parsed] == [b"ACGTACGT", b"TTGCA", b"GGGG"]
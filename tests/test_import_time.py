@@ -0,0 +1,24 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Cumulative import time of src.cli; importing the plotting stack alone costs more
+IMPORT_BUDGET_US = 800_000
+REPORT_MODULES = ('matplotlib', 'seaborn', 'pandas', 'Bio')
+
+def _run(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True,
+                          text=True, check=True)
+
+def test_cli_import_skips_report_libraries():
+    code = ("import sys, src.cli, src.batch_processor; "
+            "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))")
+    loaded = set(_run('-c', code).stdout.split())
+    assert loaded.isdisjoint(REPORT_MODULES)
+
+def test_cli_import_time_budget():
+    stderr = _run('-X', 'importtime', '-c', 'import src.cli').stderr
+    line = next(l for l in stderr.splitlines() if l.rstrip().endswith('| src.cli'))
+    cumulative = int(line.split('|')[1])
+    assert cumulative < IMPORT_BUDGET_US, f"src.cli import took {cumulative} us"
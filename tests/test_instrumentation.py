@@ -0,0 +1,34 @@
+from src import instrumentation
+from src.batch_processor import BatchProcessor
+from src.instrumentation import StageRecorder
+
+def test_recording_routes_stages_and_merges():
+    first, second = StageRecorder(), StageRecorder()
+    with instrumentation.recording(first):
+        with instrumentation.stage('parse', items=3):
+            pass
+        with instrumentation.recording(second):
+            with instrumentation.stage('parse') as span:
+                span.items = 4
+    with instrumentation.stage('outside'):
+        pass
+
+    assert 'outside' not in first.stages
+    merged = StageRecorder.from_dict(first.as_dict()).merge(second).as_dict()
+    assert merged['parse']['items'] == 7 and merged['parse']['calls'] == 2
+
+def test_batch_run_reports_stages_and_profiles(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [90] * 50)
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=2, batch_size=20,
+                               profile_dir=str(tmp_path / 'profiles'))
+    processor.process_samples(processor.find_sample_pairs(),
+                              {'max_dimer_length': 100, 'expected_length': 400, 'length_tolerance': 50})
+
+    performance = processor.run_stats['performance']
+    assert performance['stages']['parse']['items'] == 150
+    assert performance['stages']['quality_stats']['calls'] == 9
+    assert set(performance['samples']) == {'s1', 's2', 's3'}
+    profiles = sorted(p.name.split('_')[0] for p in (tmp_path / 'profiles').iterdir())
+    assert profiles[0] == 'main' and profiles[1:] and set(profiles[1:]) == {'worker'}
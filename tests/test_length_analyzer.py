@@ -8,3 +8,28 @@ def test_sequence_categorization():
     assert analyzer.categorize_sequence("A" * 300) == "short"
     assert analyzer.categorize_sequence("A" * 400) == "valid"
     assert analyzer.categorize_sequence("A" * 500) == "long"
+
+def test_length_accumulator_matches_per_sequence_categories():
+    from src.length_analyzer import LengthAccumulator
+    analyzer = LengthAnalyzer(400, 50)
+    sequences = ["A" * n for n in (10, 349, 350, 400, 450, 451, 2000)]
+
+    first = LengthAccumulator(max_length=1000)
+    first.update(sequences[:3])
+    second = LengthAccumulator(max_length=1000)
+    second.update([400, 450, 451, 2000], counts=[2, 1, 1, 1])
+    first.merge(second)
+
+    assert first.total == 8
+    assert first.overflow == 1
+    assert analyzer.analyze_histogram(first) == {'short': 2, 'valid': 4, 'long': 2}
+    assert first.count_at_most(100) == 1
+    assert first.percentile(50) == 400
+
+def test_length_accumulator_percentile_extremes():
+    from src.length_analyzer import LengthAccumulator
+    accumulator = LengthAccumulator(max_length=1000)
+    accumulator.update([120, 300, 300, 640])
+    assert accumulator.percentile(0) == 120
+    assert accumulator.percentile(50) == 300
+    assert accumulator.percentile(100) == 640
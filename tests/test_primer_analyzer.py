@@ -11,3 +11,25 @@ def test_primer_dimer_detection():
     # Test sequence without primer dimer
     normal_seq = "ATCGATCGATCGATCGATCG"
     assert analyzer.detect_primer_dimers(normal_seq) == False
+
+def test_primer_set_is_compiled_once_per_file_version(tmp_path):
+    primers = tmp_path / "primers.fasta"
+    primers.write_text(">F\nACGTACGTACGT\n>R\nTGCATGCATGCA\n")
+    first = PrimerAnalyzer(str(primers), 100)
+    second = PrimerAnalyzer(str(primers), 50)
+    assert first.matcher is second.matcher
+    assert first.primers == {'F': "ACGTACGTACGT", 'R': "TGCATGCATGCA"}
+
+    primers.write_text(">F\nACGTACGTACGT\n")
+    assert PrimerAnalyzer(str(primers), 100).matcher is not first.matcher
+
+def test_dimer_reports_forward_and_reverse_primer(tmp_path):
+    primers = tmp_path / "panel.fasta"
+    primers.write_text(">F1\nACGTTGCAAGGT\n>F2\nGATTACAGATTACC\n>R1\nTTGACCAGTACG\n")
+    analyzer = PrimerAnalyzer(str(primers), 100)
+    # F2 forward joined to reverse-complemented R1, a cross-primer dimer
+    dimer = "GATTACAGATTACC" + "CGTACTGGTCAA"
+    assert analyzer.primer_dimer_pair(dimer) == ("F2", "R1")
+    pairs = analyzer.primer_dimer_pairs_batch([dimer, "A" * 40, dimer])
+    assert pairs.tolist() == [[1, 2], [-1, -1], [1, 2]]
+    assert analyzer.detect_primer_dimers_batch([dimer, "A" * 40]).tolist() == [True, False]
@@ -0,0 +1,136 @@
+import random
+import time
+import numpy as np
+from Bio.Seq import Seq
+from src.primer_analyzer import PrimerAnalyzer
+from src.primer_matcher import CompiledPattern, PrimerMatcher, encode_matrix, reverse_complement
+
+def _reference_match(sequence, primer, max_errors):
+    return PrimerAnalyzer._find_primer_match(None, sequence, primer, max_errors)
+
+def test_reverse_complement_matches_biopython():
+    seq = "ACGTNRYKMSWBDHVacgtn"
+    assert reverse_complement(seq) == str(Seq(seq).reverse_complement())
+
+def test_compiled_pattern_matches_reference():
+    rng = random.Random(7)
+    for _ in range(2000):
+        primer = ''.join(rng.choice("ACGT") for _ in range(rng.randint(4, 12)))
+        read = ''.join(rng.choice("ACGTN") for _ in range(rng.randint(0, 40)))
+        if rng.random() < 0.5 and len(read) >= len(primer):
+            start = rng.randint(0, len(read) - len(primer))
+            mutated = [rng.choice("ACGT") if rng.random() < 0.2 else c for c in primer]
+            read = read[:start] + ''.join(mutated) + read[start + len(primer):]
+
+        matcher = PrimerMatcher({'p': primer})
+        pattern = CompiledPattern(primer)
+        for max_errors in (0, 1, 2, 3):
+            expected = _reference_match(read, primer, max_errors)
+            assert pattern.matches(matcher.encode(read), len(read), max_errors) == expected
+
+def _reference_pair(read, primers, max_errors):
+    """Best (forward, reverse-complemented) primer indices by brute force, or (-1, -1)."""
+    best = []
+    for orient in (lambda p: p, reverse_complement):
+        scores = [(min(sum(a != b for a, b in zip(read[i:i + len(p)], p))
+                       for i in range(len(read) - len(p) + 1)), index)
+                  for index, p in enumerate(map(orient, primers)) if len(read) >= len(p)]
+        hits = [score for score in scores if score[0] <= max_errors]
+        best.append(min(hits)[1] if hits else -1)
+    return tuple(best) if min(best) >= 0 else (-1, -1)
+
+def test_seed_index_matches_reference_on_panels():
+    rng = random.Random(11)
+    for _ in range(20):
+        panel = [''.join(rng.choice("ACGT") for _ in range(rng.randint(8, 24)))
+                 for _ in range(rng.randint(1, 12))]
+        matcher = PrimerMatcher({f"p{i}": p for i, p in enumerate(panel)})
+        reads = []
+        for _ in range(40):
+            parts = [''.join(rng.choice("ACGTN") for _ in range(rng.randint(0, 20)))]
+            for _ in range(rng.randint(0, 2)):
+                primer = rng.choice(panel)
+                primer = primer if rng.random() < 0.5 else reverse_complement(primer)
+                parts.append(''.join(rng.choice("ACGT") if rng.random() < 0.08 else c for c in primer))
+            parts.append(''.join(rng.choice("ACGT") for _ in range(rng.randint(0, 40))))
+            reads.append(''.join(parts))
+
+        for max_errors in (0, 1, 2, 3):
+            pairs = matcher.dimer_pairs_batch(reads, max_length=100, max_errors=max_errors, chunk_size=16)
+            expected = [_reference_pair(r, panel, max_errors) if len(r) <= 100 else (-1, -1)
+                        for r in reads]
+            assert list(map(tuple, pairs.tolist())) == expected
+            assert [matcher.dimer_indices(r, max_errors) if len(r) <= 100 else (-1, -1)
+                    for r in reads] == expected
+            assert matcher.has_dimer_batch(reads, 100, max_errors).tolist() == \
+                [pair[0] >= 0 for pair in expected]
+
+def test_seed_index_matches_find_primer_match():
+    rng = random.Random(5)
+    primers = [''.join(rng.choice("ACGT") for _ in range(rng.randint(6, 16))) for _ in range(8)]
+    patterns = [p for primer in primers for p in (primer, reverse_complement(primer))]
+    reads = []
+    for _ in range(200):
+        read = ''.join(rng.choice("ACGTN") for _ in range(rng.randint(0, 50)))
+        if read and rng.random() < 0.5:
+            mutated = ''.join(rng.choice("ACGT") if rng.random() < 0.15 else c for c in rng.choice(patterns))
+            start = rng.randint(0, len(read))
+            read = read[:start] + mutated + read[start:]
+        reads.append(read)
+
+    matcher = PrimerMatcher({f"p{i}": p for i, p in enumerate(primers)})
+    encoded = [read.encode('ascii') for read in reads]
+    lengths = np.array([len(read) for read in encoded], dtype=np.int64)
+    matrix = encode_matrix(encoded, lengths)
+    for max_errors in (0, 1, 2, 3):
+        hits, found, _ = matcher.index(max_errors).search(matrix, lengths)
+        expected = {(r, p) for r, read in enumerate(reads) for p, pattern in enumerate(patterns)
+                    if _reference_match(read, pattern, max_errors)}
+        assert set(zip(hits.tolist(), found.tolist())) == expected
+
+def test_per_read_detection_is_ten_times_faster_than_the_reference_scan(tmp_path):
+    rng = random.Random(3)
+    primers = {'F': ''.join(rng.choice("ACGT") for _ in range(20)),
+               'R': ''.join(rng.choice("ACGT") for _ in range(22))}
+    primer_file = tmp_path / 'primers.fasta'
+    primer_file.write_text(''.join(f">{name}\n{seq}\n" for name, seq in primers.items()))
+    analyzer = PrimerAnalyzer(str(primer_file), 100, cache_size=0)
+    reads = [''.join(rng.choice("ACGT") for _ in range(rng.randint(40, 100))) for _ in range(500)]
+    reads += [primers['F'] + 'ACGT' + reverse_complement(primers['R'])] * 50
+
+    def reference(read):
+        # The per-window scan used before the compiled matcher, under the any-pair dimer rule
+        return any(_reference_match(read, seq, 2) for seq in primers.values()) and \
+            any(_reference_match(read, reverse_complement(seq), 2) for seq in primers.values())
+
+    def best_time(detect):
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            calls = [detect(read) for read in reads]
+            times.append(time.perf_counter() - start)
+        return min(times), calls
+
+    reference_time, expected = best_time(reference)
+    compiled_time, calls = best_time(analyzer.detect_primer_dimers)
+    assert calls == expected
+    assert reference_time >= 10 * compiled_time
+
+def test_dimer_pair_names_forward_and_reverse_primer():
+    matcher = PrimerMatcher({'F': 'ACGTTGCAAGGT', 'R': 'TTGACCAGTACG'})
+    dimer = 'ACGTTGCAAGGT' + 'GG' + reverse_complement('TTGACCAGTACG')
+    assert matcher.dimer_pair(dimer, 2) == ('F', 'R')
+    assert matcher.dimer_pair('TTGACCAGTACG' + 'A' * 20, 2) is None
+
+def test_dimer_cache_counts_hits_and_evicts(tmp_path):
+    primer_file = tmp_path / 'primers.fasta'
+    primer_file.write_text(">F\nACGTTGCAAGGT\n")
+    analyzer = PrimerAnalyzer(str(primer_file), 100, cache_size=2)
+    dimer = 'ACGTTGCAAGGT' + 'ACCTTGCAACGT'
+
+    assert analyzer.detect_primer_dimers(dimer)
+    assert analyzer.detect_primer_dimers(dimer)
+    assert analyzer.detect_primer_dimers_batch([dimer, 'A' * 30, 'A' * 30, 'C' * 30]).tolist() == \
+        [True, False, False, False]
+    info = analyzer.cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (3, 3, 2)
@@ -0,0 +1,27 @@
+import json
+import os
+import pytest
+from src.batch_processor import BatchProcessor
+from src.report_generator import ReportGenerator
+
+CONFIG = {'max_dimer_length': 100, 'expected_length': 400, 'length_tolerance': 50}
+
+@pytest.mark.parametrize('engine', ['native', 'biopython'])
+def test_worker_reads_are_counted_in_parent(tmp_path, write_sample, engine):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [100] * 250)
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=2, batch_size=100)
+    results = processor.process_samples(processor.find_sample_pairs(), {**CONFIG, 'fastq_engine': engine})
+
+    throughput = processor.run_stats['throughput']
+    assert throughput['samples'] == 3
+    assert throughput['reads'] == 750
+    assert throughput['bytes_decompressed'] == 3 * sum(len(f"@{i}\n{'A' * 100}\n+\n{'I' * 100}\n") for i in range(250))
+    assert throughput['compressed_bytes'] == sum(
+        os.path.getsize(tmp_path / f"{s}_R1.fastq.gz") for s in ('s1', 's2', 's3'))
+    assert throughput['reads_per_s'] > 0
+
+    ReportGenerator(tmp_path / 'out').generate_detailed_report(results, CONFIG, processor.run_stats)
+    report = json.loads((tmp_path / 'out' / 'detailed_report.json').read_text())
+    assert report['throughput']['reads'] == 750
@@ -0,0 +1,44 @@
+import random
+from src.read_merger import ReadMerger, count_mismatches
+
+_COMPLEMENT = bytes.maketrans(b'ACGT', b'TGCA')
+
+def _pair(insert, read_length):
+    r1 = insert[:read_length]
+    r2 = insert[::-1].translate(_COMPLEMENT)[:read_length]
+    return r1, b'I' * len(r1), r2, b'I' * len(r2)
+
+def _random_seq(rng, length):
+    return ''.join(rng.choice("ACGT") for _ in range(length)).encode()
+
+def test_count_mismatches():
+    assert count_mismatches(b"ACGTACGT", b"ACGTACGT") == 0
+    assert count_mismatches(b"ACGTACGT", b"TCGTACGA") == 2
+    assert count_mismatches(b"", b"") == 0
+
+def test_merge_recovers_insert():
+    rng = random.Random(9)
+    merger = ReadMerger(min_overlap=10, max_mismatch_rate=0.1)
+    for insert_length in (60, 120, 250, 290):
+        insert = _random_seq(rng, insert_length)
+        merged = merger.merge(*_pair(insert, 150))
+        assert merged is not None
+        assert merged[0] == insert
+        assert len(merged[1]) == insert_length
+
+def test_merge_rejects_non_overlapping_pairs():
+    rng = random.Random(2)
+    insert = _random_seq(rng, 400)
+    assert ReadMerger().merge(*_pair(insert, 150)) is None
+
+def test_mismatch_resolved_by_quality():
+    rng = random.Random(4)
+    insert = _random_seq(rng, 200)
+    r1, q1, r2, q2 = _pair(insert, 150)
+    # R1 position 100 lies in the overlap; give R1 a low-quality wrong base there
+    wrong = b'A' if insert[100:101] != b'A' else b'C'
+    r1 = r1[:100] + wrong + r1[101:]
+    q1 = q1[:100] + b'#' + q1[101:]
+    seq, qual = ReadMerger().merge(r1, q1, r2, q2)
+    assert seq == insert
+    assert qual[100] == ord('I') - ord('#') + 33
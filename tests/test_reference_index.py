@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+from src.reference_index import ReferenceIndex, INDEX_SUFFIX
+
+_COMPLEMENT = bytes.maketrans(b'ACGT', b'TGCA')
+
+def _random(rng, n):
+    return np.frombuffer(b'ACGT', dtype=np.uint8)[rng.integers(0, 4, n)].tobytes().decode()
+
+def _reverse_complement(seq):
+    return seq.encode().translate(_COMPLEMENT)[::-1].decode()
+
+@pytest.fixture
+def reference(tmp_path):
+    rng = np.random.default_rng(25)
+    genome = _random(rng, 20000)
+    amplicons = {'ampA': genome[2000:2300], 'ampB': genome[9000:9300]}
+    (tmp_path / 'amplicons.fasta').write_text(''.join(f">{n}\n{s}\n" for n, s in amplicons.items()))
+    (tmp_path / 'genome.fasta').write_text(f">chr1\n{genome}\n>chr2\n{_random(rng, 3000)}\n")
+    config = {'reference_file': str(tmp_path / 'amplicons.fasta'),
+              'genome_reference_file': str(tmp_path / 'genome.fasta')}
+    return config, genome, amplicons, rng
+
+def test_reads_are_assigned_by_minimizer_votes(reference):
+    config, genome, amplicons, rng = reference
+    index = ReferenceIndex.for_config(config)
+    assert index.names == ['ampA', 'ampB', 'chr1', 'chr2']
+    mutated = amplicons['ampB'][:100] + ('A' if amplicons['ampB'][100] != 'A' else 'C') + amplicons['ampB'][101:250]
+    reads = [amplicons['ampA'][:250], _reverse_complement(amplicons['ampA'])[:250], mutated,
+             genome[15000:15250], _random(rng, 250), amplicons['ampA'][:20]]
+    assert index.classify_batch(reads).tolist() == [0, 0, 1, 2, -1, -1]
+    assert index.classify_batch([r.encode() for r in reads], chunk_size=2).tolist() == [0, 0, 1, 2, -1, -1]
+
+def test_index_is_persisted_and_rebuilt_when_references_change(reference, monkeypatch):
+    config, genome, amplicons, _ = reference
+    built = ReferenceIndex.for_config(config)
+    index_path = config['reference_file'] + INDEX_SUFFIX
+    assert os.path.exists(index_path)
+
+    ReferenceIndex._loaded.clear()
+    def fail(*args, **kwargs):
+        raise AssertionError("index rebuilt")
+    with monkeypatch.context() as patch:
+        patch.setattr(ReferenceIndex, 'build', fail)
+        loaded = ReferenceIndex.for_config(config)
+    assert loaded.names == built.names and np.array_equal(loaded.keys, built.keys)
+
+    with open(config['reference_file'], 'a') as handle:
+        handle.write(f">ampC\n{genome[12000:12300]}\n")
+    assert ReferenceIndex.for_config(config).names == ['ampA', 'ampB', 'ampC', 'chr1', 'chr2']
@@ -0,0 +1,51 @@
+import os
+from src.batch_processor import BatchProcessor
+from src.result_cache import ResultCache
+
+CONFIG = {'max_dimer_length': 100, 'expected_length': 400, 'length_tolerance': 50}
+
+def _run(tmp_path, config=CONFIG, force=False):
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1, force=force)
+    return {r['sample_id']: r for r in processor.process_samples(processor.find_sample_pairs(), config)}
+
+def test_only_new_or_changed_samples_are_reprocessed(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 400, 600])
+    first = _run(tmp_path)
+    assert all('peak_memory_mb' in r for r in first.values())
+
+    write_sample('s2', [80, 400, 400, 420])
+    os.utime(tmp_path / 's2_R1.fastq.gz', ns=(0, 0))
+    second = _run(tmp_path)
+    # Cached samples are re-evaluated from their summary instead of being read
+    assert 'peak_memory_mb' not in second['s1'] and 'peak_memory_mb' not in second['s3']
+    assert second['s2']['total_reads'] == 4 and second['s1']['total_reads'] == 3
+
+    assert all('peak_memory_mb' in r for r in _run(tmp_path, force=True).values())
+
+def test_key_tracks_only_summary_relevant_config(tmp_path, write_sample):
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, [80, 400, 600])
+    _run(tmp_path)
+
+    reevaluated = _run(tmp_path, {**CONFIG, 'expected_length': 600})
+    assert reevaluated['s1']['valid_amplicon_count'] == 1
+    assert 'peak_memory_mb' not in reevaluated['s1']
+
+    rescanned = _run(tmp_path, {**CONFIG, 'max_dimer_length': 500})
+    assert 'peak_memory_mb' in rescanned['s1']
+    assert rescanned['s1']['primer_dimer_count'] == 2
+
+def test_content_hash_detects_rewrite_with_same_stat(tmp_path, write_sample):
+    write_sample('s1', [80])
+    pair = BatchProcessor(str(tmp_path), str(tmp_path / 'out')).find_sample_pairs()[0]
+    plain_key = ResultCache(tmp_path / 'out').key(pair, CONFIG)
+    hashed_key = ResultCache(tmp_path / 'out', hash_content=True).key(pair, CONFIG)
+
+    stat = os.stat(pair.r1_path)
+    data = bytearray(pair.r1_path.read_bytes())
+    data[-1] ^= 1
+    pair.r1_path.write_bytes(bytes(data))
+    os.utime(pair.r1_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert ResultCache(tmp_path / 'out').key(pair, CONFIG) == plain_key
+    assert ResultCache(tmp_path / 'out', hash_content=True).key(pair, CONFIG) != hashed_key
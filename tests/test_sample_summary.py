@@ -0,0 +1,61 @@
+from src.batch_processor import BatchProcessor
+from src.sample_summary import SampleSummary, SUMMARY_DIR, SUMMARY_SUFFIX
+
+KEYS = ['total_reads', 'primer_dimer_count', 'short_offtarget_count',
+        'valid_amplicon_count', 'long_offtarget_count', 'reads_passing_quality']
+
+LENGTHS = [40, 80, 120, 300, 400, 420, 600]
+
+def _write_samples(write_sample):
+    quals = [('I' if i % 2 else '5') * length for i, length in enumerate(LENGTHS)]
+    for sample_id in ('s1', 's2', 's3'):
+        write_sample(sample_id, LENGTHS, quals)
+
+def test_reevaluation_matches_fresh_run(tmp_path, write_sample):
+    _write_samples(write_sample)
+    first = {'max_dimer_length': 100, 'dimer_scan_length': 150, 'expected_length': 400,
+             'length_tolerance': 50, 'quality_threshold': 30}
+    second = {'max_dimer_length': 130, 'expected_length': 300, 'length_tolerance': 120,
+              'quality_threshold': 20}
+
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1)
+    pairs = processor.find_sample_pairs()
+    processor.process_samples(pairs, first)
+    summaries = SampleSummary.load_all(str(tmp_path / 'out'))
+    assert len(summaries) == 3
+
+    processor.force = True
+    fresh = processor.process_samples(pairs, {**second, 'dimer_scan_length': 150})
+    reevaluated = {s.sample_id: s.evaluate(second) for s in summaries}
+    for result in fresh:
+        assert [reevaluated[result['sample_id']][k] for k in KEYS] == [result[k] for k in KEYS]
+
+def test_results_carry_histograms(tmp_path, write_sample):
+    _write_samples(write_sample)
+    config = {'max_dimer_length': 100, 'expected_length': 400, 'length_tolerance': 50,
+              'quality_threshold': 30}
+    processor = BatchProcessor(str(tmp_path), str(tmp_path / 'out'), max_workers=1)
+    results = processor.process_samples(processor.find_sample_pairs(), config)
+
+    histograms = results[0]['histograms']
+    assert histograms['length'].sum() == results[0]['total_reads'] == 7
+    assert histograms['length'][400] == 1
+    assert histograms['mean_quality'][40] == 3
+    assert histograms['mean_quality'][20] == 4
+
+def test_reevaluation_skips_samples_beyond_their_histogram(tmp_path, write_sample, caplog):
+    from src.cli import reevaluate_summaries
+    _write_samples(write_sample)
+    config = {'max_dimer_length': 100, 'expected_length': 400, 'length_tolerance': 50}
+    for output, histogram_max_length in (('wide', 1200), ('out', 1000)):
+        processor = BatchProcessor(str(tmp_path), str(tmp_path / output), max_workers=1)
+        processor.process_samples(processor.find_sample_pairs(),
+                                  {**config, 'histogram_max_length': histogram_max_length})
+    # Only s1 has a histogram covering the new valid range
+    name = f"s1{SUMMARY_SUFFIX}"
+    (tmp_path / 'out' / SUMMARY_DIR / name).write_bytes((tmp_path / 'wide' / SUMMARY_DIR / name).read_bytes())
+
+    results = reevaluate_summaries(str(tmp_path / 'out'), {**config, 'expected_length': 1000,
+                                                           'length_tolerance': 100})
+    assert [r['sample_id'] for r in results] == ['s1']
+    assert "Error re-evaluating sample s2" in caplog.text and "Error re-evaluating sample s3" in caplog.text
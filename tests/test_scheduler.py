@@ -0,0 +1,37 @@
+from src.scheduler import (SampleScheduler, estimate_memory_mb, max_batches_in_flight, BATCH_MEMORY_FACTOR, SPLIT_CHUNK_MB,
+                           SPLIT_MEMORY_MB, WORKER_BASE_MB)
+
+def test_samples_start_largest_first(write_sample):
+    samples = [write_sample(name, ['ACGT' * 25] * n, compresslevel=0)
+               for name, n in (('small', 10), ('large', 500), ('mid', 100))]
+    scheduler = SampleScheduler(samples, max_workers=1, batch_size=1000)
+    order = []
+    while scheduler.pending:
+        admitted = scheduler.admit()
+        assert len(admitted) == 1
+        order.append(admitted[0].sample_id)
+        scheduler.release(admitted[0])
+    assert order == ['large', 'mid', 'small']
+
+def test_memory_budget_limits_concurrency(write_sample):
+    samples = [write_sample(f"s{i}", ['ACGT' * 25] * 100, compresslevel=0) for i in range(4)]
+    assert SampleScheduler(samples, 4, batch_size=1000).estimates == {}
+    estimate = estimate_memory_mb(samples[0], batch_size=1000)
+    assert estimate > WORKER_BASE_MB
+
+    scheduler = SampleScheduler(samples, max_workers=4, batch_size=1000,
+                                max_memory_mb=2.5 * estimate)
+    first = scheduler.admit()
+    assert len(first) == 2 and scheduler.admit() == []
+    scheduler.release(first[0])
+    assert len(scheduler.admit()) == 1
+
+    # A sample over budget on its own still runs once nothing else does
+    alone = SampleScheduler(samples[:2], max_workers=4, batch_size=1000, max_memory_mb=1)
+    assert len(alone.admit()) == 1
+
+def test_batches_in_flight_are_bounded_without_a_budget():
+    assert max_batches_in_flight(1024 * 1024, max_workers=4) == 8
+    assert max_batches_in_flight(SPLIT_CHUNK_MB * 1024 * 1024, max_workers=64) \
+        == SPLIT_MEMORY_MB // (SPLIT_CHUNK_MB * BATCH_MEMORY_FACTOR)
+    assert max_batches_in_flight(SPLIT_CHUNK_MB * 1024 * 1024, max_workers=4, max_memory_mb=1) == 1
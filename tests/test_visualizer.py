@@ -0,0 +1,36 @@
+import numpy as np
+from src.visualizer import Visualizer
+
+def _results(n):
+    histogram = np.zeros(1002, dtype=np.int64)
+    histogram[[80, 400, 1001]] = [5, 20, 1]
+    quality = np.zeros(94, dtype=np.int64)
+    quality[[20, 35]] = [4, 22]
+    return [{'sample_id': f's{i}', 'total_reads': 26, 'primer_dimer_count': 5,
+             'primer_dimer_percentage': 19.2, 'short_offtarget_count': 5,
+             'long_offtarget_count': 1, 'valid_amplicon_count': 20,
+             'histograms': {'length': histogram, 'mean_quality': quality}}
+            for i in range(n)]
+
+def test_grid_is_paginated(tmp_path):
+    visualizer = Visualizer(tmp_path, dpi=50, plot_format='svg', grid_page_size=2, workers=1)
+    paths = visualizer.create_visualizations(_results(5))
+    names = sorted(path.name for path in paths)
+    assert names[:3] == ['length_distributions_grid_001.svg', 'length_distributions_grid_002.svg',
+                         'length_distributions_grid_003.svg']
+    assert all(path.exists() for path in paths) and len(paths) == 7
+
+def test_parallel_rendering_and_none_format(tmp_path):
+    paths = Visualizer(tmp_path / 'png', dpi=50, workers=2).create_visualizations(_results(2))
+    assert sorted(p.name for p in paths) == sorted(p.name for p in (tmp_path / 'png').iterdir())
+    assert Visualizer(tmp_path / 'none', plot_format='none').create_visualizations(_results(2)) == []
+
+def test_dimer_pair_heatmap_is_limited_to_top_primers(tmp_path):
+    results = _results(2)
+    names = [f'P{i}' for i in range(60)]
+    results[0]['dimer_pairs'] = {'primers': names, 'forward': np.arange(60), 'reverse': np.arange(60)[::-1],
+                                 'count': np.arange(1, 61)}
+    visualizer = Visualizer(tmp_path, dpi=50, plot_format='svg', workers=1)
+    assert visualizer.plot_dimer_pair_heatmap(results, max_primers=10).exists()
+    assert 'dimer_pair_heatmap.svg' in [p.name for p in visualizer.create_visualizations(results)]
+    assert 'dimer_pair_heatmap.svg' not in [p.name for p in visualizer.create_visualizations(_results(1))]